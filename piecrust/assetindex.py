@@ -0,0 +1,63 @@
+import os
+import os.path
+import logging
+from piecrust import ASSET_DIR_SUFFIX, osutil
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_assets_dirname(name):
+    return name.endswith(ASSET_DIR_SUFFIX)
+
+
+class AssetIndex(object):
+    """ The files in the pages' asset folders, for the whole site.
+
+        Sources fill it while they scan for pages, so that most pages don't
+        need to check the file-system for an asset folder. Asset folders
+        the sources didn't list are listed the first time they're needed,
+        and then remembered.
+    """
+    def __init__(self):
+        self._scanned_dirs = set()
+        self._asset_dirs = {}
+
+    def addScannedDirectory(self, dirpath, dirnames):
+        """ Records what asset folders exist in the given directory, given
+            the names of all its sub-directories.
+        """
+        dirpath = os.path.normpath(dirpath)
+        self._scanned_dirs.add(dirpath)
+        for d in dirnames:
+            if is_assets_dirname(d):
+                self._asset_dirs.setdefault(os.path.join(dirpath, d), None)
+
+    def addAssetsDirectory(self, assets_dir, filenames):
+        """ Records the files in the given asset folder, and returns them
+            sorted by name.
+        """
+        assets_dir = os.path.normpath(assets_dir)
+        filenames = sorted(filenames)
+        self._asset_dirs[assets_dir] = filenames
+        return filenames
+
+    def getAssets(self, assets_dir):
+        """ Returns the names of the files in the given asset folder, or an
+            empty list if there's no such folder.
+        """
+        assets_dir = os.path.normpath(assets_dir)
+        filenames = self._asset_dirs.get(assets_dir)
+        if filenames is not None:
+            return filenames
+        if (assets_dir not in self._asset_dirs and
+                os.path.dirname(assets_dir) in self._scanned_dirs):
+            return []
+
+        filenames = []
+        if os.path.isdir(assets_dir):
+            logger.debug("Listing assets in: %s" % assets_dir)
+            for fn in osutil.listdir(assets_dir):
+                if os.path.isfile(os.path.join(assets_dir, fn)):
+                    filenames.append(fn)
+        return self.addAssetsDirectory(assets_dir, filenames)
@@ -1,17 +1,27 @@
+import json
 import time
+import shutil
+import functools
 import os.path
 import hashlib
 import logging
 from piecrust.baking.records import (
-        BakeRecordEntry, TransitionalBakeRecord, TaxonomyInfo)
+        BakeRecordEntry, TransitionalBakeRecord, TaxonomyInfo,
+        _get_transition_key)
+from piecrust.baking.scheduler import BakeScheduler, WaitFor
 from piecrust.baking.worker import (
-        save_factory,
+        save_factory, load_factory,
         JOB_LOAD, JOB_RENDER_FIRST, JOB_BAKE)
 from piecrust.chefutil import (
         format_timed_scope, format_timed)
-from piecrust.routing import create_route_metadata
+from piecrust.hashutil import (
+        uses_content_hash, get_file_hash_info, is_same_content)
+from piecrust.rendering import PASS_FORMATTING
 from piecrust.sources.base import (
         REALM_NAMES, REALM_USER, REALM_THEME)
+from piecrust.sources.pageindex import (
+        get_indexed_setting_names, make_index_entry, save_page_index)
+from piecrust.workerpool import order_by_cost
 
 
 logger = logging.getLogger(__name__)
@@ -20,13 +30,21 @@ logger = logging.getLogger(__name__)
 class Baker(object):
     def __init__(self, app, out_dir, force=False,
                  applied_config_variant=None,
-                 applied_config_values=None):
+                 applied_config_values=None,
+                 processor_pipeline=None):
         assert app and out_dir
         self.app = app
         self.out_dir = out_dir
         self.force = force
         self.applied_config_variant = applied_config_variant
         self.applied_config_values = applied_config_values
+        self.processor_pipeline = processor_pipeline
+        self.processor_record = None
+        self.dirty_templates = set()
+        self.use_content_hash = uses_content_hash(app)
+        self._override_index_path = None
+        self._override_index_version = 0
+        self._page_index_entries = {}
 
         # Remember what taxonomy pages we should skip
         # (we'll bake them repeatedly later with each taxonomy term)
@@ -63,6 +81,9 @@ class Baker(object):
         record_cache = self.app.cache.getCache('baker')
         record_id = hashlib.md5(self.out_dir.encode('utf8')).hexdigest()
         record_name = record_id + '.record'
+        self._override_index_path = record_cache.getCachePath(
+                record_id + '.overrides')
+        self._override_index_version = 0
         previous_record_path = None
         if not self.force and record_cache.has(record_name):
             with format_timed_scope(logger, "loaded previous bake record",
@@ -70,6 +91,7 @@ class Baker(object):
                 previous_record_path = record_cache.getCachePath(record_name)
                 record.loadPrevious(previous_record_path)
         record.current.success = True
+        record.current.template_files = self._getTemplateFiles()
 
         # Figure out if we need to clean the cache because important things
         # have changed.
@@ -78,7 +100,8 @@ class Baker(object):
             previous_record_path = None
 
         # Pre-create all caches.
-        for cache_name in ['app', 'baker', 'pages', 'renders']:
+        for cache_name in ['app', 'baker', 'pages', 'renders', 'templates',
+                           'formatting']:
             self.app.cache.getCache(cache_name)
 
         # Gather all sources by realm -- we're going to bake each realm
@@ -94,15 +117,17 @@ class Baker(object):
         pool = self._createWorkerPool(previous_record_path)
 
         # Bake the realms.
-        realm_list = [REALM_USER, REALM_THEME]
-        for realm in realm_list:
-            srclist = sources_by_realm.get(realm)
-            if srclist is not None:
-                self._bakeRealm(record, pool, realm, srclist)
+        self._bakeRealms(record, pool, sources_by_realm)
 
         # Bake taxonomies.
         self._bakeTaxonomies(record, pool)
 
+        # Run the asset pipeline on the same workers, if we have one. This
+        # saves us from having to start a second set of worker processes,
+        # each with their own app to initialize.
+        if self.processor_pipeline is not None:
+            self.processor_record = self.processor_pipeline.run(pool=pool)
+
         # All done with the workers. Close the pool and get timing reports.
         reports = pool.close()
         record.current.timers = {}
@@ -120,8 +145,11 @@ class Baker(object):
 
         # Delete files from the output.
         self._handleDeletetions(record)
+        if os.path.exists(self._override_index_path):
+            os.remove(self._override_index_path)
 
-        # Backup previous records.
+        # Backup previous records. The last one is copied instead of moved
+        # because the bake record only writes the entries that changed.
         for i in range(8, -1, -1):
             suffix = '' if i == 0 else '.%d' % i
             record_path = record_cache.getCachePath(
@@ -131,7 +159,10 @@ class Baker(object):
                         '%s.%s.record' % (record_id, i + 1))
                 if os.path.exists(record_path_next):
                     os.remove(record_path_next)
-                os.rename(record_path, record_path_next)
+                if i == 0:
+                    shutil.copyfile(record_path, record_path_next)
+                else:
+                    os.rename(record_path, record_path_next)
 
         # Save the bake record.
         with format_timed_scope(logger, "saved bake record.",
@@ -161,21 +192,22 @@ class Baker(object):
             # We have no valid previous bake record.
             reason = "need bake record regeneration"
         else:
-            # Check if any template has changed since the last bake. Since
-            # there could be some advanced conditional logic going on, we'd
-            # better just force a bake from scratch if that's the case.
-            max_time = 0
-            for d in self.app.templates_dirs:
-                for dpath, _, filenames in os.walk(d):
-                    for fn in filenames:
-                        full_fn = os.path.join(dpath, fn)
-                        max_time = max(max_time, os.path.getmtime(full_fn))
-            if max_time >= record.previous.bake_time:
-                reason = "templates modified"
+            # Check if any template has changed since the last bake. We'll
+            # only re-bake the pages that used those templates.
+            self.dirty_templates = self._getDirtyTemplates(record)
+            if self.dirty_templates:
+                logger.debug("Templates modified since last bake: %s" %
+                             self.dirty_templates)
+                self._invalidateSegmentsUsingTemplates(record)
 
         if reason is not None:
-            # We have to bake everything from scratch.
-            self.app.cache.clearCaches(except_names=['app'])
+            # We have to bake everything from scratch. Formatted texts are
+            # cached along with the formatters' configuration, so we keep
+            # them unless we were asked to start over.
+            except_names = ['app']
+            if not self.force:
+                except_names.append('formatting')
+            self.app.cache.clearCaches(except_names=except_names)
             self.force = True
             record.incremental_count = 0
             record.clearPrevious()
@@ -190,131 +222,319 @@ class Baker(object):
                     colored=False))
             return True
 
-    def _bakeRealm(self, record, pool, realm, srclist):
+    def _getTemplateFiles(self):
+        # Get the file each template name resolves to. Earlier templates
+        # directories take precedence, like in the template engines.
+        template_files = {}
+        for d in self.app.templates_dirs:
+            for dpath, _, filenames in os.walk(d):
+                for fn in filenames:
+                    full_fn = os.path.join(dpath, fn)
+                    name = os.path.relpath(full_fn, d).replace('\\', '/')
+                    template_files.setdefault(name, full_fn)
+        return template_files
+
+    def _getDirtyTemplates(self, record):
+        # A template is dirty if its file was modified since the last bake,
+        # or if its name now resolves to a different file (or no file at
+        # all), because it was added to, or removed from, a templates
+        # directory.
+        dirty = set()
+        prev_files = record.previous.template_files
+        cur_files = record.current.template_files
+        for name, path in cur_files.items():
+            if (prev_files.get(name) != path or
+                    os.path.getmtime(path) >= record.previous.bake_time):
+                dirty.add(name)
+        for name in prev_files.keys():
+            if name not in cur_files:
+                dirty.add(name)
+        return dirty
+
+    def _invalidateSegmentsUsingTemplates(self, record):
+        # Pages render the segments of the pages they list, which come from
+        # the cache, so we need to remove the cached segments that used
+        # modified templates before any worker gets to render anything.
+        repo = self.app.env.rendered_segments_repository
+        for entry in record.previous.entries:
+            for sub in entry.subs:
+                if sub.render_info is None:
+                    continue
+                pinfo = sub.render_info.get(PASS_FORMATTING)
+                if pinfo is None:
+                    continue
+                if (pinfo.used_templates is None or
+                        not pinfo.used_templates.isdisjoint(
+                            self.dirty_templates)):
+                    repo.invalidate(sub.out_uri, remove_from_fs=True)
+
+    def _bakeRealms(self, record, pool, sources_by_realm):
+        # Each page goes through its load, render-first and bake jobs as
+        # soon as what it needs is ready, instead of waiting for all the
+        # other pages to be done with each step. A page gets baked once
+        # all the pages from the sources it used last time have been loaded
+        # and rendered, since we then know whether any of them changed.
         start_time = time.perf_counter()
-        try:
-            record.current.baked_count[realm] = 0
+        index_build_time = time.time()
+        scheduler = BakeScheduler(pool, _get_result_key,
+                                  self._getJobResultKey)
 
-            all_factories = []
-            for source in srclist:
-                factories = source.getPageFactories()
-                all_factories += [f for f in factories
-                                  if f.path not in self.taxonomy_pages]
-
-            self._loadRealmPages(record, pool, all_factories)
-            self._renderRealmPages(record, pool, all_factories)
-            self._bakeRealmPages(record, pool, realm, all_factories)
-        finally:
-            page_count = record.current.baked_count[realm]
-            logger.info(format_timed(
-                    start_time,
-                    "baked %d %s pages." %
-                    (page_count, REALM_NAMES[realm].lower())))
+        realm_factories = []
+        for realm in [REALM_USER, REALM_THEME]:
+            srclist = sources_by_realm.get(realm)
+            if srclist is None:
+                continue
 
-    def _loadRealmPages(self, record, pool, factories):
-        def _handler(res):
-            # Create the record entry for this page.
-            # This will also update the `dirty_source_names` for the record
-            # as we add page files whose last modification times are later
-            # than the last bake.
-            record_entry = BakeRecordEntry(res['source_name'], res['path'])
-            record_entry.config = res['config']
-            if res['errors']:
-                record_entry.errors += res['errors']
-                record.current.success = False
-                self._logErrors(res['path'], res['errors'])
-            record.addEntry(record_entry)
+            record.current.baked_count[realm] = 0
+            factories = []
+            for source in srclist:
+                factories += [f for f in source.getPageFactories()
+                              if f.path not in self.taxonomy_pages]
+            realm_factories.append((realm, factories))
 
-        logger.debug("Loading %d realm pages..." % len(factories))
-        with format_timed_scope(logger,
-                                "loaded %d pages" % len(factories),
-                                level=logging.DEBUG, colored=False,
-                                timer_env=self.app.env,
-                                timer_category='LoadJob'):
-            jobs = []
             for fac in factories:
-                job = {
-                        'type': JOB_LOAD,
-                        'job': save_factory(fac)}
-                jobs.append(job)
-            ar = pool.queueJobs(jobs, handler=_handler)
-            ar.wait()
-
-    def _renderRealmPages(self, record, pool, factories):
-        def _handler(res):
-            entry = record.getCurrentEntry(res['path'])
-            if res['errors']:
-                entry.errors += res['errors']
-                record.current.success = False
-                self._logErrors(res['path'], res['errors'])
-
-        logger.debug("Rendering %d realm pages..." % len(factories))
-        with format_timed_scope(logger,
-                                "prepared %d pages" % len(factories),
-                                level=logging.DEBUG, colored=False,
-                                timer_env=self.app.env,
-                                timer_category='RenderFirstSubJob'):
-            jobs = []
+                scheduler.addJob(
+                        ('load', fac.path),
+                        functools.partial(self._makeLoadJob, fac),
+                        functools.partial(self._handleLoadResult, record),
+                        error_handler=functools.partial(
+                            self._handleJobError, record, fac),
+                        group='LoadJob',
+                        result_key=_get_transition_key(fac.path))
+                scheduler.addJob(
+                        ('render', fac.path),
+                        functools.partial(self._makeRenderFirstJob,
+                                          record, fac),
+                        functools.partial(self._handleRenderFirstResult,
+                                          record),
+                        error_handler=functools.partial(
+                            self._handleJobError, record, fac),
+                        deps=[('load', fac.path)],
+                        group='RenderFirstSubJob',
+                        result_key=_get_transition_key(fac.path))
+
+        # Add one node per source that's done when all its pages have been
+        # loaded and rendered. That's also when we can save the source's
+        # page index for the workers to use.
+        source_keys = []
+        for source in self.app.sources:
+            deps = []
+            for realm, factories in realm_factories:
+                deps += [('render', f.path) for f in factories
+                         if f.source.name == source.name]
+            scheduler.addJob(
+                    ('source', source.name),
+                    functools.partial(self._writePageIndex, source,
+                                      index_build_time),
+                    deps=deps)
+            source_keys.append(('source', source.name))
+
+        # Pages from a realm can be overriden by pages from the previous
+        # realms, so we need to wait for those to be baked first.
+        prev_realm_key = None
+        for i, (realm, factories) in enumerate(realm_factories):
+            bake_keys = []
             for fac in factories:
-                record_entry = record.getCurrentEntry(fac.path)
-                if record_entry.errors:
-                    logger.debug("Ignoring %s because it had previous "
-                                 "errors." % fac.ref_spec)
-                    continue
-
-                # Make sure the source and the route exist for this page,
-                # otherwise we add errors to the record entry and we'll skip
-                # this page for the rest of the bake.
-                source = self.app.getSource(fac.source.name)
-                if source is None:
-                    record_entry.errors.append(
-                            "Can't get source for page: %s" % fac.ref_spec)
-                    logger.error(record_entry.errors[-1])
-                    continue
+                deps = [('render', fac.path)]
+                deps += self._getUsedSourceKeys(record, fac, source_keys)
+                if prev_realm_key is not None:
+                    deps.append(prev_realm_key)
+                scheduler.addJob(
+                        ('bake', fac.path),
+                        functools.partial(self._makeRealmBakeJob,
+                                          scheduler, record, fac,
+                                          source_keys),
+                        functools.partial(self._handleRealmBakeResult,
+                                          record, realm),
+                        error_handler=functools.partial(
+                            self._handleJobError, record, fac),
+                        deps=deps,
+                        cost=self._getBakeJobCost(record, fac.path),
+                        group='BakeJob',
+                        result_key=_get_transition_key(fac.path))
+                bake_keys.append(('bake', fac.path))
+
+            realm_key = ('realm', realm)
+            scheduler.addJob(
+                    realm_key,
+                    functools.partial(self._onRealmBaked, record, realm,
+                                      start_time,
+                                      i + 1 < len(realm_factories)),
+                    deps=bake_keys)
+            prev_realm_key = realm_key
+
+        scheduler.run()
+
+        for name in ['LoadJob', 'RenderFirstSubJob', 'BakeJob']:
+            self.app.env.stepTimer(name, scheduler.getGroupDuration(name))
+
+    def _getUsedSourceKeys(self, record, fac, source_keys):
+        # Wait on all the sources this page used last time. If we don't
+        # know, wait on all of them.
+        prev_entry = record.getPreviousEntry(fac.path)
+        if (prev_entry is None or not prev_entry.subs or
+                any([o.render_info is None for o in prev_entry.subs])):
+            return list(source_keys)
+        return [('source', sn) for sn in prev_entry.getAllUsedSourceNames()
+                if ('source', sn) in source_keys]
+
+    def _getJobResultKey(self, job):
+        if job['type'] == JOB_BAKE:
+            fac = load_factory(self.app, job['job']['factory_info'])
+            return _get_transition_key(fac.path,
+                                       job['job']['taxonomy_info'])
+        fac = load_factory(self.app, job['job'])
+        return _get_transition_key(fac.path)
+
+    def _handleJobError(self, record, fac, ex):
+        # The job crashed in the worker. Record the error on the page's
+        # entry so that the following jobs for this page are skipped.
+        record_entry = record.getCurrentEntry(fac.path)
+        if record_entry is None:
+            record_entry = BakeRecordEntry(fac.source.name, fac.path)
+            record.addEntry(record_entry)
+        errors = [str(ex)]
+        record_entry.errors += errors
+        record.current.success = False
+        self._logErrors(fac.path, errors)
+
+    def _onRealmBaked(self, record, realm, start_time, has_next_realm):
+        page_count = record.current.baked_count[realm]
+        logger.info(format_timed(
+                start_time,
+                "baked %d %s pages." %
+                (page_count, REALM_NAMES[realm].lower())))
+
+        # Let the next realm's pages know which URLs were taken.
+        if has_next_realm:
+            self._writeOverrideIndex(record)
+
+    def _makeLoadJob(self, fac):
+        return {
+                'type': JOB_LOAD,
+                'job': save_factory(fac)}
+
+    def _handleLoadResult(self, record, res):
+        # Create the record entry for this page.
+        # This will also update the `dirty_source_names` for the record
+        # as we add page files whose last modification times are later
+        # than the last bake.
+        record_entry = BakeRecordEntry(res['source_name'], res['path'])
+        record_entry.config = res['config']
+        record_entry.content_hash_info = res['content_hash_info']
+        if res['index_entry'] is not None:
+            self._page_index_entries[res['path']] = res['index_entry']
+        if res['errors']:
+            record_entry.errors += res['errors']
+            record.current.success = False
+            self._logErrors(res['path'], res['errors'])
+        record.addEntry(record_entry)
+
+    def _writePageIndex(self, source, build_time):
+        # All of this source's pages have been loaded, so we can save its
+        # page index instead of having each worker build it again.
+        setting_names = get_indexed_setting_names(self.app)
+        entries = []
+        for fac in source.getPageFactories():
+            entry = self._page_index_entries.get(fac.path)
+            if entry is not None:
+                entries.append(entry)
+                continue
 
-                route = self.app.getRoute(fac.source.name, fac.metadata,
-                                          skip_taxonomies=True)
-                if route is None:
-                    record_entry.errors.append(
-                            "Can't get route for page: %s" % fac.ref_spec)
-                    logger.error(record_entry.errors[-1])
-                    continue
+            if fac.path not in self.taxonomy_pages:
+                # This page failed to load. Let the workers deal with it.
+                logger.debug("Not saving page index for source '%s' because "
+                             "of page: %s" % (source.name, fac.ref_spec))
+                return None
 
-                # All good, queue the job.
-                job = {
-                        'type': JOB_RENDER_FIRST,
-                        'job': save_factory(fac)}
-                jobs.append(job)
+            # Taxonomy pages are not loaded by the workers.
+            try:
+                entries.append(make_index_entry(fac.buildPage(),
+                                                setting_names))
+            except Exception as ex:
+                logger.debug("Not saving page index for source '%s': %s" %
+                             (source.name, ex))
+                return None
+
+        save_page_index(source, entries, build_time)
+        return None
+
+    def _makeRenderFirstJob(self, record, fac):
+        record_entry = record.getCurrentEntry(fac.path)
+        if record_entry.errors:
+            logger.debug("Ignoring %s because it had previous "
+                         "errors." % fac.ref_spec)
+            return None
 
-            ar = pool.queueJobs(jobs, handler=_handler)
-            ar.wait()
+        # Make sure the source and the route exist for this page,
+        # otherwise we add errors to the record entry and we'll skip
+        # this page for the rest of the bake.
+        source = self.app.getSource(fac.source.name)
+        if source is None:
+            record_entry.errors.append(
+                    "Can't get source for page: %s" % fac.ref_spec)
+            logger.error(record_entry.errors[-1])
+            return None
 
-    def _bakeRealmPages(self, record, pool, realm, factories):
-        def _handler(res):
-            entry = record.getCurrentEntry(res['path'], res['taxonomy_info'])
-            entry.subs = res['sub_entries']
-            if res['errors']:
-                entry.errors += res['errors']
-                self._logErrors(res['path'], res['errors'])
-            if entry.has_any_error:
-                record.current.success = False
-            if entry.subs and entry.was_any_sub_baked:
-                record.current.baked_count[realm] += 1
-
-        logger.debug("Baking %d realm pages..." % len(factories))
-        with format_timed_scope(logger,
-                                "baked %d pages" % len(factories),
-                                level=logging.DEBUG, colored=False,
-                                timer_env=self.app.env,
-                                timer_category='BakeJob'):
-            jobs = []
-            for fac in factories:
-                job = self._makeBakeJob(record, fac)
-                if job is not None:
-                    jobs.append(job)
+        route = self.app.getRoute(fac.source.name, fac.metadata,
+                                  skip_taxonomies=True)
+        if route is None:
+            record_entry.errors.append(
+                    "Can't get route for page: %s" % fac.ref_spec)
+            logger.error(record_entry.errors[-1])
+            return None
 
-            ar = pool.queueJobs(jobs, handler=_handler)
-            ar.wait()
+        # Pages whose contents didn't change since last time already have
+        # their segments cached, unless something they use changed, in
+        # which case the bake job will render them anyway.
+        if self.use_content_hash:
+            prev_entry = record.getPreviousEntry(fac.path)
+            if (prev_entry is not None and not prev_entry.has_any_error and
+                    is_same_content(record_entry.content_hash_info,
+                                    prev_entry.content_hash_info)):
+                logger.debug("Skipping first render of %s because it "
+                             "didn't change." % fac.ref_spec)
+                return None
+
+        # All good, queue the job.
+        return {
+                'type': JOB_RENDER_FIRST,
+                'job': save_factory(fac)}
+
+    def _handleRenderFirstResult(self, record, res):
+        entry = record.getCurrentEntry(res['path'])
+        if res['errors']:
+            entry.errors += res['errors']
+            record.current.success = False
+            self._logErrors(res['path'], res['errors'])
+
+    def _makeRealmBakeJob(self, scheduler, record, fac, source_keys):
+        # If the page changed, or uses templates that changed, it may now
+        # use sources it didn't use before, so we need to wait on all of
+        # them.
+        pair = record.getPreviousAndCurrentEntries(fac.path)
+        prev_entry, cur_entry = pair
+        if (cur_entry.flags & BakeRecordEntry.FLAG_SOURCE_MODIFIED or
+                (prev_entry is not None and self.dirty_templates and
+                    prev_entry.usesAnyTemplate(self.dirty_templates))):
+            waits = [k for k in source_keys if not scheduler.isDone(k)]
+            if waits:
+                return WaitFor(waits)
+        return self._makeBakeJob(record, fac)
+
+    def _handleRealmBakeResult(self, record, realm, res):
+        entry = record.getCurrentEntry(res['path'], res['taxonomy_info'])
+        entry.subs = res['sub_entries']
+        if res['overriden_by']:
+            entry.flags |= BakeRecordEntry.FLAG_OVERRIDEN
+        self._recordBakeDuration(record, entry, res)
+        if res['errors']:
+            entry.errors += res['errors']
+            self._logErrors(res['path'], res['errors'])
+        if entry.has_any_error:
+            record.current.success = False
+        if entry.subs and entry.was_any_sub_baked:
+            record.current.baked_count[realm] += 1
 
     def _bakeTaxonomies(self, record, pool):
         logger.debug("Baking taxonomy pages...")
@@ -391,19 +611,34 @@ class Baker(object):
             if not tt_info.dirty_terms.isdisjoint(set(terms)):
                 tt_info.dirty_terms.add(terms)
 
+        # Re-bake the terms whose pages used templates that changed.
+        if self.dirty_templates:
+            logger.debug("Gathering terms with modified templates")
+            for prev_entry, cur_entry in record.transitions.values():
+                if (prev_entry and prev_entry.taxonomy_info and
+                        prev_entry.usesAnyTemplate(self.dirty_templates)):
+                    ti = prev_entry.taxonomy_info
+                    tt_info = buckets[ti.source_name][ti.taxonomy_name]
+                    if ti.term in tt_info.all_terms:
+                        tt_info.dirty_terms.add(ti.term)
+
         return buckets
 
     def _bakeTaxonomyBuckets(self, record, pool, buckets):
         def _handler(res):
             entry = record.getCurrentEntry(res['path'], res['taxonomy_info'])
             entry.subs = res['sub_entries']
+            if res['overriden_by']:
+                entry.flags |= BakeRecordEntry.FLAG_OVERRIDEN
+            self._recordBakeDuration(record, entry, res)
             if res['errors']:
                 entry.errors += res['errors']
+                self._logErrors(res['path'], res['errors'])
             if entry.has_any_error:
                 record.current.success = False
 
-        # Start baking those terms.
-        jobs = []
+        # Figure out all the terms to bake.
+        to_bake = []
         for source_name, source_taxonomies in buckets.items():
             for tax_name, tt_info in source_taxonomies.items():
                 terms = tt_info.dirty_terms
@@ -435,13 +670,35 @@ class Baker(object):
 
                     cur_entry = BakeRecordEntry(
                             fac.source.name, fac.path, tax_info)
+                    if self.use_content_hash:
+                        prev_entry = record.getPreviousEntry(
+                                fac.path, tax_info)
+                        cur_entry.content_hash_info = get_file_hash_info(
+                                fac.path,
+                                prev_entry.content_hash_info
+                                if prev_entry else None)
                     record.addEntry(cur_entry)
+                    to_bake.append((fac, tax_info))
+
+        # Taxonomy pages can be overriden by any page from any realm.
+        self._writeOverrideIndex(record)
+
+        # Start baking those terms, the most expensive ones first. The jobs
+        # themselves are only created as the workers get to them.
+        costs = [self._getBakeJobCost(record, fac.path, tax_info)
+                 for fac, tax_info in to_bake]
+        to_bake, _ = order_by_cost(to_bake, costs)
+        job_count = 0
+
+        def _make_jobs():
+            nonlocal job_count
+            for fac, tax_info in to_bake:
+                job = self._makeBakeJob(record, fac, tax_info)
+                if job is not None:
+                    job_count += 1
+                    yield job
 
-                    job = self._makeBakeJob(record, fac, tax_info)
-                    if job is not None:
-                        jobs.append(job)
-
-        ar = pool.queueJobs(jobs, handler=_handler)
+        ar = pool.queueJobs(_make_jobs(), handler=_handler)
         ar.wait()
 
         # Now we create bake entries for all the terms that were *not* dirty.
@@ -463,13 +720,10 @@ class Baker(object):
                     logger.debug("Taxonomy term '%s:%s' isn't used anymore." %
                                  (ti.taxonomy_name, ti.term))
 
-        return len(jobs)
+        return job_count
 
     def _makeBakeJob(self, record, fac, tax_info=None):
-        # Get the previous (if any) and current entry for this page.
-        pair = record.getPreviousAndCurrentEntries(fac.path, tax_info)
-        assert pair is not None
-        prev_entry, cur_entry = pair
+        cur_entry = record.getCurrentEntry(fac.path, tax_info)
         assert cur_entry is not None
 
         # Ignore if there were errors in the previous passes.
@@ -478,49 +732,63 @@ class Baker(object):
                          "errors." % fac.ref_spec)
             return None
 
-        # Build the route metadata and find the appropriate route.
-        page = fac.buildPage()
-        route_metadata = create_route_metadata(page)
-        if tax_info is not None:
-            tax = self.app.getTaxonomy(tax_info.taxonomy_name)
-            route = self.app.getTaxonomyRoute(tax_info.taxonomy_name,
-                                              tax_info.source_name)
-
-            slugified_term = route.slugifyTaxonomyTerm(tax_info.term)
-            route_metadata[tax.term_name] = slugified_term
-        else:
-            route = self.app.getRoute(fac.source.name, route_metadata,
-                                      skip_taxonomies=True)
-        assert route is not None
-
-        # Figure out if this page is overriden by another previously
-        # baked page. This happens for example when the user has
-        # made a page that has the same page/URL as a theme page.
-        uri = route.getUri(route_metadata)
-        override_entry = record.getOverrideEntry(page.path, uri)
-        if override_entry is not None:
-            override_source = self.app.getSource(
-                    override_entry.source_name)
-            if override_source.realm == fac.source.realm:
-                cur_entry.errors.append(
-                        "Page '%s' maps to URL '%s' but is overriden "
-                        "by page '%s'." %
-                        (fac.ref_spec, uri, override_entry.path))
-                logger.error(cur_entry.errors[-1])
-            cur_entry.flags |= BakeRecordEntry.FLAG_OVERRIDEN
-            return None
-
+        # The worker will build the page, find its route, and check that
+        # it's not overriden by a page we baked before.
         job = {
                 'type': JOB_BAKE,
                 'job': {
                         'factory_info': save_factory(fac),
                         'taxonomy_info': tax_info,
-                        'route_metadata': route_metadata,
-                        'dirty_source_names': record.dirty_source_names
+                        'dirty_source_names': record.dirty_source_names,
+                        'content_hash_info': cur_entry.content_hash_info,
+                        'override_index': self._override_index_version
                         }
                 }
         return job
 
+    def _writeOverrideIndex(self, record):
+        # Pages can be overriden by other pages that were baked before them
+        # to the same URL, like when the user makes a page with the same
+        # URL as a theme page. The workers check this against an index of
+        # all the URLs baked so far, which is re-written at each step of the
+        # bake where it matters.
+        realms = {s.name: s.realm for s in self.app.sources}
+        index = {}
+        for prev_entry, cur_entry in record.transitions.values():
+            if cur_entry is None or not cur_entry.subs:
+                continue
+            realm = realms.get(cur_entry.source_name)
+            for o in cur_entry.subs:
+                index.setdefault(o.out_uri, (cur_entry.path, realm))
+
+        tmp_path = self._override_index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as fp:
+            json.dump(index, fp)
+        os.replace(tmp_path, self._override_index_path)
+        self._override_index_version += 1
+
+    def _getBakeJobCost(self, record, path, tax_info=None):
+        # Use how long it took to bake this page last time as an estimate
+        # of how long it will take this time. This lets the worker pool
+        # start with the slowest pages (big archives, taxonomy listings,
+        # etc.) instead of finding them in the last batch.
+        prev_entry = record.getPreviousEntry(path, tax_info)
+        if prev_entry is not None:
+            return prev_entry.bake_duration
+        return None
+
+    def _recordBakeDuration(self, record, entry, res):
+        # Only remember the bake duration if the page was actually baked,
+        # otherwise we'd only measure how long it took to figure out that
+        # it didn't need to be baked.
+        if entry.was_any_sub_baked:
+            entry.bake_duration = res['duration']
+        else:
+            prev_entry = record.getPreviousEntry(entry.path,
+                                                 entry.taxonomy_info)
+            if prev_entry is not None:
+                entry.bake_duration = prev_entry.bake_duration
+
     def _handleDeletetions(self, record):
         logger.debug("Handling deletions...")
         for path, reason in record.getDeletions():
@@ -546,12 +814,19 @@ class Baker(object):
         worker_count = self.app.config.get('baker/workers')
         batch_size = self.app.config.get('baker/batch_size')
 
+        processing_ctx = None
+        if self.processor_pipeline is not None:
+            processing_ctx = self.processor_pipeline.createWorkerContext()
+
         ctx = BakeWorkerContext(
                 self.app.root_dir, self.app.cache.base_dir, self.out_dir,
                 previous_record_path=previous_record_path,
+                override_index_path=self._override_index_path,
                 config_variant=self.applied_config_variant,
                 config_values=self.applied_config_values,
-                force=self.force, debug=self.app.debug)
+                force=self.force, debug=self.app.debug,
+                processing_ctx=processing_ctx,
+                dirty_templates=self.dirty_templates)
         pool = WorkerPool(
                 worker_count=worker_count,
                 batch_size=batch_size,
@@ -560,6 +835,10 @@ class Baker(object):
         return pool
 
 
+def _get_result_key(res):
+    return _get_transition_key(res['path'], res.get('taxonomy_info'))
+
+
 class _TaxonomyTermsInfo(object):
     def __init__(self):
         self.dirty_terms = set()
@@ -1,7 +1,13 @@
+import os
 import copy
+import pickle
 import os.path
+import sqlite3
 import hashlib
 import logging
+import collections
+import urllib.parse
+from piecrust.hashutil import is_same_content
 from piecrust.records import Record, TransitionalRecord
 
 
@@ -21,16 +27,177 @@ def _get_transition_key(path, taxonomy_info=None):
 
 
 class BakeRecord(Record):
-    RECORD_VERSION = 14
+    """ The bake record.
+
+        Unlike other records, it's saved as an SQLite database where each
+        entry is stored separately, indexed by its transition key. This
+        lets the bake workers look up previous entries without loading the
+        whole record (see `BakeRecordIndex`), and lets us only write the
+        entries that changed since the last bake.
+    """
+    RECORD_VERSION = 18
 
     def __init__(self):
         super(BakeRecord, self).__init__()
         self.out_dir = None
         self.bake_time = None
+        self.template_files = {}
         self.baked_count = {}
         self.timers = None
         self.success = True
 
+    def save(self, path):
+        path_dir = os.path.dirname(path)
+        if not os.path.isdir(path_dir):
+            os.makedirs(path_dir, 0o755)
+
+        try:
+            conn = _open_record_db(path)
+        except sqlite3.DatabaseError:
+            # This is probably a record from an older version of PieCrust,
+            # which was a simple pickle file.
+            logger.debug("Replacing invalid bake record: %s" % path)
+            os.remove(path)
+            conn = _open_record_db(path)
+
+        try:
+            with conn:
+                self._saveToDb(conn)
+        finally:
+            conn.close()
+
+    def _saveToDb(self, conn):
+        existing = {}
+        for key, position, digest in conn.execute(
+                'SELECT key, position, digest FROM entries'):
+            existing[key] = (position, digest)
+
+        written = 0
+        for i, e in enumerate(self.entries):
+            key = _get_transition_key(e.path, e.taxonomy_info)
+            digest = _get_entry_digest(e)
+            if existing.pop(key, None) == (i, digest):
+                continue
+            data = pickle.dumps(e, pickle.HIGHEST_PROTOCOL)
+            conn.execute(
+                    'INSERT OR REPLACE INTO entries '
+                    '(key, position, digest, data) VALUES (?, ?, ?, ?)',
+                    (key, i, digest, data))
+            written += 1
+
+        for key in existing.keys():
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+        state = self.__getstate__()
+        state['entries'] = []
+        conn.execute(
+                'INSERT OR REPLACE INTO header (id, data) VALUES (0, ?)',
+                (pickle.dumps(state, pickle.HIGHEST_PROTOCOL),))
+
+        logger.debug("Wrote %d bake record entries, removed %d." %
+                     (written, len(existing)))
+
+    @staticmethod
+    def load(path):
+        logger.debug("Loading bake record from: %s" % path)
+        if not os.path.isfile(path):
+            raise Exception("No bake record found at: %s" % path)
+
+        conn = _open_record_db(path, read_only=True)
+        try:
+            row = conn.execute(
+                    'SELECT data FROM header WHERE id = 0').fetchone()
+            if row is None:
+                raise Exception("Bake record has no header: %s" % path)
+            record = BakeRecord.__new__(BakeRecord)
+            record.__setstate__(pickle.loads(row[0]))
+            record.entries = [
+                    pickle.loads(data) for data, in conn.execute(
+                        'SELECT data FROM entries ORDER BY position')]
+        finally:
+            conn.close()
+        return record
+
+
+def _get_entry_digest(entry):
+    # Entries contain sets, whose pickled data changes from one run to the
+    # next, so we hash a canonical form of the entry instead.
+    canonical = repr(_make_canonical(entry))
+    return hashlib.md5(canonical.encode('utf8')).hexdigest()
+
+
+def _make_canonical(value):
+    if isinstance(value, (set, frozenset)):
+        return ('set', tuple(sorted(map(_make_canonical, value), key=repr)))
+    if isinstance(value, collections.OrderedDict):
+        return tuple((_make_canonical(k), _make_canonical(v))
+                     for k, v in value.items())
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted(
+                ((_make_canonical(k), _make_canonical(v))
+                 for k, v in value.items()),
+                key=repr)))
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_make_canonical, value))
+    if hasattr(value, '__dict__'):
+        return (type(value).__name__, _make_canonical(vars(value)))
+    return value
+
+
+class BakeRecordIndex(object):
+    """ A read-only view on a saved bake record that loads entries on
+        demand, given their transition key.
+
+        The database file is memory-mapped, so all the bake workers share
+        the same physical pages (through the OS' page cache) instead of
+        each having their own copy of the record in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._conn = _open_record_db(path, read_only=True)
+        self._conn.execute('PRAGMA mmap_size = %d' % os.path.getsize(path))
+
+    def get(self, key, default=None):
+        row = self._conn.execute(
+                'SELECT data FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def close(self):
+        self._conn.close()
+
+
+_RECORD_DB_SCHEMA_VERSION = 1
+
+
+def _open_record_db(path, read_only=False):
+    if read_only:
+        uri = 'file:%s?mode=ro' % urllib.parse.quote(
+                os.path.abspath(path))
+        return sqlite3.connect(uri, uri=True)
+
+    conn = sqlite3.connect(path)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != _RECORD_DB_SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS header')
+            conn.execute('DROP TABLE IF EXISTS entries')
+            conn.execute(
+                    'CREATE TABLE header ('
+                    'id INTEGER PRIMARY KEY, data BLOB)')
+            conn.execute(
+                    'CREATE TABLE entries ('
+                    'key TEXT PRIMARY KEY, position INTEGER, '
+                    'digest TEXT, data BLOB)')
+            conn.execute('PRAGMA user_version = %d' %
+                         _RECORD_DB_SCHEMA_VERSION)
+            conn.commit()
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
 
 class SubPageBakeInfo(object):
     FLAG_NONE = 0
@@ -39,6 +206,7 @@ class SubPageBakeInfo(object):
     FLAG_FORCED_BY_NO_PREVIOUS = 2**2
     FLAG_FORCED_BY_PREVIOUS_ERRORS = 2**3
     FLAG_FORMATTING_INVALIDATED = 2**4
+    FLAG_FORCED_BY_TEMPLATES = 2**5
 
     def __init__(self, out_uri, out_path):
         self.out_uri = out_uri
@@ -83,6 +251,14 @@ class BakeRecordEntry(object):
 
         The `taxonomy_info` attribute should be a tuple of the form:
         (taxonomy name, term, source name)
+
+        The `bake_duration` attribute is how long it took, in seconds, to
+        bake this page the last time it was actually baked. It's used to
+        schedule the most expensive pages first on the next bake.
+
+        The `content_hash_info` attribute is a `(mtime, size, hash)` tuple
+        for the page's file, when the baker detects changes by content
+        (see `piecrust.hashutil`).
     """
     FLAG_NONE = 0
     FLAG_NEW = 2**0
@@ -97,6 +273,8 @@ class BakeRecordEntry(object):
         self.config = None
         self.errors = []
         self.subs = []
+        self.bake_duration = None
+        self.content_hash_info = None
 
     @property
     def path_mtime(self):
@@ -147,6 +325,16 @@ class BakeRecordEntry(object):
                     res |= pinfo.used_source_names
         return res
 
+    def usesAnyTemplate(self, template_names):
+        for o in self.subs:
+            if o.render_info is not None:
+                for p, pinfo in o.render_info.items():
+                    if (pinfo.used_templates is None or
+                            not pinfo.used_templates.isdisjoint(
+                                template_names)):
+                        return True
+        return False
+
     def getAllUsedTaxonomyTerms(self):
         res = set()
         for o in self.subs:
@@ -163,12 +351,20 @@ class TransitionalBakeRecord(TransitionalRecord):
         self.dirty_source_names = set()
 
     def addEntry(self, entry):
-        if (self.previous.bake_time and
-                entry.path_mtime >= self.previous.bake_time):
+        if self.previous.bake_time and self._isEntrySourceModified(entry):
             entry.flags |= BakeRecordEntry.FLAG_SOURCE_MODIFIED
             self.dirty_source_names.add(entry.source_name)
         super(TransitionalBakeRecord, self).addEntry(entry)
 
+    def _isEntrySourceModified(self, entry):
+        if entry.content_hash_info is not None:
+            prev_entry = self.getPreviousEntry(entry.path,
+                                               entry.taxonomy_info)
+            return (prev_entry is None or
+                    not is_same_content(entry.content_hash_info,
+                                        prev_entry.content_hash_info))
+        return entry.path_mtime >= self.previous.bake_time
+
     def getTransitionKey(self, entry):
         return _get_transition_key(entry.path, entry.taxonomy_info)
 
@@ -177,15 +373,6 @@ class TransitionalBakeRecord(TransitionalRecord):
         pair = self.transitions.get(key)
         return pair
 
-    def getOverrideEntry(self, path, uri):
-        for pair in self.transitions.values():
-            cur = pair[1]
-            if cur and cur.path != path:
-                for o in cur.subs:
-                    if o.out_uri == uri:
-                        return cur
-        return None
-
     def getPreviousEntry(self, path, taxonomy_info=None):
         pair = self.getPreviousAndCurrentEntries(path, taxonomy_info)
         if pair is not None:
@@ -1,102 +1,210 @@
+import time
+import queue
 import logging
-import threading
+import collections
 
 
 logger = logging.getLogger(__name__)
 
 
+class WaitFor(object):
+    """ Returned by a job's `make_job` function when it turns out that the
+        job needs to wait on some more jobs before it can be created.
+    """
+    def __init__(self, keys):
+        self.keys = list(keys)
+
+
+class _JobNode(object):
+    def __init__(self, key, make_job, handler, error_handler, deps, cost,
+                 group, result_key):
+        self.key = key
+        self.make_job = make_job
+        self.handler = handler
+        self.error_handler = error_handler
+        self.deps = list(deps) if deps is not None else []
+        self.cost = cost
+        self.group = group
+        self.result_key = result_key
+        self.pending = 0
+        self.dependents = []
+        self.is_done = False
+
+
 class BakeScheduler(object):
-    _EMPTY = object()
-    _WAIT = object()
-
-    def __init__(self, record, jobs=None):
-        self.record = record
-        self.jobs = list(jobs) if jobs is not None else []
-        self._active_jobs = []
-        self._lock = threading.Lock()
-        self._added_event = threading.Event()
-        self._done_event = threading.Event()
-
-    def addJob(self, job):
-        logger.debug("Queuing job '%s:%s'." % (
-                job.factory.source.name, job.factory.rel_path))
-        with self._lock:
-            self.jobs.append(job)
-        self._added_event.set()
-
-    def onJobFinished(self, job):
-        logger.debug("Removing job '%s:%s'." % (
-                job.factory.source.name, job.factory.rel_path))
-        with self._lock:
-            self._active_jobs.remove(job)
-        self._done_event.set()
-
-    def getNextJob(self, wait_timeout=None, empty_timeout=None):
-        self._added_event.clear()
-        self._done_event.clear()
-        job = self._doGetNextJob()
-        while job in (self._EMPTY, self._WAIT):
-            if job == self._EMPTY:
-                if empty_timeout is None:
-                    return None
-                logger.debug("Waiting for a new job to be added...")
-                res = self._added_event.wait(empty_timeout)
-            elif job == self._WAIT:
-                if wait_timeout is None:
-                    return None
-                logger.debug("Waiting for a job to be finished...")
-                res = self._done_event.wait(wait_timeout)
-            if not res:
-                logger.debug("Timed-out. No job found.")
-                return None
-            job = self._doGetNextJob()
-        return job
-
-    def _doGetNextJob(self):
-        with self._lock:
-            if len(self.jobs) == 0:
-                return self._EMPTY
-
-            job = self.jobs.pop(0)
-            first_job = job
+    """ Runs jobs on a worker pool as soon as the jobs they depend on are
+        done, instead of running the bake in phases that each wait for all
+        of their jobs to be done before the next phase can start.
+
+        Jobs are added with `addJob`, and `run` then dispatches them until
+        they're all done. Jobs are only created, and their results handled,
+        on the thread that called `run`, so that callers don't need to
+        worry about locking the bake record.
+
+        A job that fails is still considered done, so that the jobs that
+        depend on it get to run, and to find out about the failure.
+    """
+    def __init__(self, pool, get_result_key, get_job_key=None):
+        self.pool = pool
+        self.get_result_key = get_result_key
+        self.get_job_key = get_job_key
+        self._nodes = {}
+        self._running = {}
+        self._running_count = 0
+        self._results = queue.Queue()
+        self._group_times = {}
+
+    def addJob(self, key, make_job=None, handler=None, *, deps=None,
+               cost=None, group=None, result_key=None, error_handler=None):
+        """ Adds a job to the graph.
+
+            `make_job` is called once all the jobs whose keys are in `deps`
+            are done. It returns the job to send to the workers, or `None`
+            if there's nothing to do, or a `WaitFor` instance if the job
+            should wait on more jobs first. Nodes without `make_job` are
+            useful to wait on a whole group of jobs.
+
+            `handler` gets called with the job's result. The result is
+            matched to the job with `result_key`, which should be the same
+            as what `get_result_key` returns for that result.
+
+            `error_handler` gets called with the exception raised by the
+            job, if it failed. The failed job is matched with `get_job_key`,
+            which is given the job and should return its `result_key`.
+        """
+        if key in self._nodes:
+            raise Exception("Job '%s' was already added." % (key,))
+        self._nodes[key] = _JobNode(key, make_job, handler, error_handler,
+                                    deps, cost, group, result_key)
+
+    def hasJob(self, key):
+        return key in self._nodes
+
+    def isDone(self, key):
+        return self._nodes[key].is_done
+
+    def getGroupDuration(self, group):
+        times = self._group_times.get(group)
+        if times is None or times[1] is None:
+            return 0
+        return times[1] - times[0]
+
+    def run(self):
+        ready = collections.deque()
+        for node in self._nodes.values():
+            for d in node.deps:
+                self._addDependency(node, d)
+            if node.pending == 0:
+                ready.append(node)
+
+        stream = self.pool.openJobStream(handler=self._onResult,
+                                         error_handler=self._onError)
+        try:
             while True:
-                ready, wait_on_src = self._isJobReady(job)
-                if ready:
+                jobs = []
+                costs = []
+                while ready:
+                    node = ready.popleft()
+                    job = self._makeJob(node)
+                    if job is None:
+                        self._onNodeDone(node, ready)
+                    elif isinstance(job, WaitFor):
+                        for k in job.keys:
+                            self._addDependency(node, k)
+                        if node.pending == 0:
+                            ready.append(node)
+                    else:
+                        self._setRunning(node)
+                        jobs.append(job)
+                        costs.append(node.cost)
+                if jobs:
+                    stream.addJobs(jobs, costs)
+
+                if self._running_count == 0:
                     break
 
-                logger.debug("Job '%s:%s' isn't ready yet: waiting on pages "
-                             "from source '%s' to finish baking." %
-                             (job.factory.source.name,
-                                 job.factory.rel_path, wait_on_src))
-                self.jobs.append(job)
-                job = self.jobs.pop(0)
-                if job == first_job:
-                    # None of the jobs are ready... we need to wait.
-                    self.jobs.append(job)
-                    return self._WAIT
-
-            logger.debug(
-                    "Job '%s:%s' is ready to go, moving to active queue." %
-                    (job.factory.source.name, job.factory.rel_path))
-            self._active_jobs.append(job)
-            return job
-
-    def _isJobReady(self, job):
-        e = self.record.getPreviousEntry(
-                job.factory.source.name,
-                job.factory.rel_path,
-                taxonomy_info=job.record_entry.taxonomy_info)
-        if not e:
-            return (True, None)
-        used_source_names = e.getAllUsedSourceNames()
-        for sn in used_source_names:
-            if sn == job.factory.source.name:
-                continue
-            if any(filter(lambda j: j.factory.source.name == sn,
-                          self.jobs)):
-                return (False, sn)
-            if any(filter(lambda j: j.factory.source.name == sn,
-                          self._active_jobs)):
-                return (False, sn)
-        return (True, None)
+                # Wait for a result, and then grab any other result that
+                # came in meanwhile so we can send new jobs in batches.
+                results = [self._results.get()]
+                while True:
+                    try:
+                        results.append(self._results.get_nowait())
+                    except queue.Empty:
+                        break
+                for success, res in results:
+                    self._running_count -= 1
+                    if success:
+                        self._handleResult(res, ready)
+                    else:
+                        self._handleError(res, ready)
+        finally:
+            stream.close()
+            stream.wait()
+
+        not_done = [n.key for n in self._nodes.values() if not n.is_done]
+        if not_done:
+            raise Exception("%d bake jobs couldn't run because some other "
+                            "jobs failed: %s" % (len(not_done), not_done))
+
+    def _addDependency(self, node, key):
+        dep = self._nodes.get(key)
+        if dep is None:
+            raise Exception("Job '%s' depends on unknown job '%s'." %
+                            (node.key, key))
+        if not dep.is_done:
+            node.pending += 1
+            dep.dependents.append(node)
+
+    def _makeJob(self, node):
+        if node.make_job is None:
+            return None
+        return node.make_job()
+
+    def _setRunning(self, node):
+        if node.result_key in self._running:
+            raise Exception("Job '%s' has the same result key as running "
+                            "job '%s'." %
+                            (node.key, self._running[node.result_key].key))
+        self._running[node.result_key] = node
+        self._running_count += 1
+        if node.group is not None:
+            self._group_times.setdefault(
+                    node.group, [time.perf_counter(), None])
+
+    def _handleResult(self, res, ready):
+        node = self._running.pop(self.get_result_key(res))
+        if node.handler is not None:
+            node.handler(res)
+        if node.group is not None:
+            self._group_times[node.group][1] = time.perf_counter()
+        self._onNodeDone(node, ready)
+
+    def _handleError(self, err, ready):
+        job, ex = err
+        node = None
+        if self.get_job_key is not None:
+            node = self._running.pop(self.get_job_key(job), None)
+        if node is None or node.error_handler is None:
+            logger.error(ex)
+        else:
+            node.error_handler(ex)
+        if node is not None:
+            if node.group is not None:
+                self._group_times[node.group][1] = time.perf_counter()
+            self._onNodeDone(node, ready)
+
+    def _onNodeDone(self, node, ready):
+        node.is_done = True
+        for d in node.dependents:
+            d.pending -= 1
+            if d.pending == 0:
+                ready.append(d)
+        node.dependents = []
+
+    def _onResult(self, res):
+        # This is called on the worker pool's result thread, so we just
+        # hand the result over to the thread running the scheduler.
+        self._results.put((True, res))
 
+    def _onError(self, err):
+        self._results.put((False, err))
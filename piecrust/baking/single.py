@@ -5,6 +5,7 @@ import logging
 import urllib.parse
 from piecrust import ASSET_DIR_SUFFIX
 from piecrust.baking.records import SubPageBakeInfo
+from piecrust.hashutil import is_same_content
 from piecrust.rendering import (
         QualifiedPage, PageRenderingContext, render_page,
         PASS_FORMATTING)
@@ -19,11 +20,13 @@ class BakingError(Exception):
 
 
 class PageBaker(object):
-    def __init__(self, app, out_dir, force=False, copy_assets=True):
+    def __init__(self, app, out_dir, force=False, copy_assets=True,
+                 dirty_templates=None):
         self.app = app
         self.out_dir = out_dir
         self.force = force
         self.copy_assets = copy_assets
+        self.dirty_templates = dirty_templates or set()
         self.site_root = app.config.get('site/root')
         self.pretty_urls = app.config.get('site/pretty_urls')
 
@@ -43,7 +46,7 @@ class PageBaker(object):
         return os.path.normpath(os.path.join(*bake_path))
 
     def bake(self, qualified_page, prev_entry, dirty_source_names,
-             tax_info=None):
+             tax_info=None, content_hash_info=None):
         # Start baking the sub-pages.
         cur_sub = 1
         has_more_subs = True
@@ -69,20 +72,29 @@ class PageBaker(object):
 
             # Figure out if we need to invalidate or force anything.
             force_this_sub, invalidate_formatting = _compute_force_flags(
-                    prev_sub_entry, sub_entry, dirty_source_names)
+                    prev_sub_entry, sub_entry, dirty_source_names,
+                    self.dirty_templates)
             force_this_sub = force_this_sub or self.force
 
             # Check for up-to-date outputs.
             do_bake = True
             if not force_this_sub:
-                try:
-                    in_path_time = qualified_page.path_mtime
-                    out_path_time = os.path.getmtime(out_path)
-                    if out_path_time >= in_path_time:
+                if content_hash_info is not None:
+                    # Compare the page's contents with last time, instead
+                    # of its modification time.
+                    if (os.path.isfile(out_path) and is_same_content(
+                            content_hash_info,
+                            prev_entry.content_hash_info)):
                         do_bake = False
-                except OSError:
-                    # File doesn't exist, we'll need to bake.
-                    pass
+                else:
+                    try:
+                        in_path_time = qualified_page.path_mtime
+                        out_path_time = os.path.getmtime(out_path)
+                        if out_path_time >= in_path_time:
+                            do_bake = False
+                    except OSError:
+                        # File doesn't exist, we'll need to bake.
+                        pass
 
             # If this page didn't bake because it's already up-to-date.
             # Keep trying for as many subs as we know this page has.
@@ -139,12 +151,14 @@ class PageBaker(object):
 
                 page_pathname, _ = os.path.splitext(qualified_page.path)
                 in_assets_dir = page_pathname + ASSET_DIR_SUFFIX
-                for fn in os.listdir(in_assets_dir):
+                asset_index = self.app.env.asset_index
+                for fn in asset_index.getAssets(in_assets_dir):
                     full_fn = os.path.join(in_assets_dir, fn)
-                    if os.path.isfile(full_fn):
-                        dest_ap = os.path.join(out_assets_dir, fn)
-                        logger.debug("  %s -> %s" % (full_fn, dest_ap))
-                        shutil.copy(full_fn, dest_ap)
+                    dest_ap = os.path.join(out_assets_dir, fn)
+                    if not self.force and _is_same_file(full_fn, dest_ap):
+                        continue
+                    logger.debug("  %s -> %s" % (full_fn, dest_ap))
+                    shutil.copy2(full_fn, dest_ap)
 
             # Figure out if we have more work.
             has_more_subs = False
@@ -170,7 +184,8 @@ class PageBaker(object):
         return rp
 
 
-def _compute_force_flags(prev_sub_entry, sub_entry, dirty_source_names):
+def _compute_force_flags(prev_sub_entry, sub_entry, dirty_source_names,
+                         dirty_templates=None):
     # Figure out what to do with this page.
     force_this_sub = False
     invalidate_formatting = False
@@ -200,6 +215,23 @@ def _compute_force_flags(prev_sub_entry, sub_entry, dirty_source_names):
                         "since sources were using during that pass."
                         % sub_uri)
                 invalidate_formatting = True
+
+        # Same thing for templates that were modified since the last bake.
+        if dirty_templates:
+            dirty_for_this, invalidated_render_passes = (
+                    _get_dirty_templates_and_render_passes(
+                        prev_sub_entry, dirty_templates))
+            if len(invalidated_render_passes) > 0:
+                logger.debug(
+                        "'%s' is known to use templates %s, which have "
+                        "changed. Will force bake this page." %
+                        (sub_uri, dirty_for_this or 'unknown'))
+                sub_entry.flags |= \
+                    SubPageBakeInfo.FLAG_FORCED_BY_TEMPLATES
+                force_this_sub = True
+
+                if PASS_FORMATTING in invalidated_render_passes:
+                    invalidate_formatting = True
     elif (prev_sub_entry and
             prev_sub_entry.errors):
         # Previous bake failed. We'll have to bake it again.
@@ -234,6 +266,23 @@ def _get_dirty_source_names_and_render_passes(sub_entry, dirty_source_names):
     return dirty_for_this, invalidated_render_passes
 
 
+def _get_dirty_templates_and_render_passes(sub_entry, dirty_templates):
+    dirty_for_this = set()
+    invalidated_render_passes = set()
+    assert sub_entry.render_info is not None
+    for p, pinfo in sub_entry.render_info.items():
+        if pinfo.used_templates is None:
+            # We don't know what templates were used, so we have to assume
+            # the changed ones were.
+            invalidated_render_passes.add(p)
+            continue
+        used_dirty = pinfo.used_templates & dirty_templates
+        if used_dirty:
+            invalidated_render_passes.add(p)
+            dirty_for_this |= used_dirty
+    return dirty_for_this, invalidated_render_passes
+
+
 def _ensure_dir_exists(path):
     try:
         os.makedirs(path, mode=0o755, exist_ok=True)
@@ -245,3 +294,14 @@ def _ensure_dir_exists(path):
         # just after this when we try to write files.
         pass
 
+
+def _is_same_file(src_path, dest_path):
+    # Assets are copied with their modification time, so an output file
+    # with the same size and modification time is an earlier copy.
+    try:
+        dest_st = os.stat(dest_path)
+    except OSError:
+        return False
+    src_st = os.stat(src_path)
+    return (src_st.st_size == dest_st.st_size and
+            src_st.st_mtime == dest_st.st_mtime)
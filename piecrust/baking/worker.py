@@ -1,13 +1,20 @@
+import json
 import time
 import logging
 from piecrust.app import PieCrust, apply_variant_and_values
-from piecrust.baking.records import BakeRecord, _get_transition_key
+from piecrust.baking.records import BakeRecordIndex, _get_transition_key
 from piecrust.baking.single import PageBaker, BakingError
 from piecrust.environment import AbortedSourceUseError
+from piecrust.hashutil import (
+        uses_content_hash, get_file_hash_info, is_same_content)
+from piecrust.page import refresh_page_cache
+from piecrust.processing.worker import ProcessingWorker
 from piecrust.rendering import (
         QualifiedPage, PageRenderingContext, render_page_segments)
 from piecrust.routing import create_route_metadata
 from piecrust.sources.base import PageFactory
+from piecrust.sources.pageindex import (
+        get_indexed_setting_names, make_index_entry)
 from piecrust.workerpool import IWorker
 
 
@@ -16,19 +23,22 @@ logger = logging.getLogger(__name__)
 
 class BakeWorkerContext(object):
     def __init__(self, root_dir, sub_cache_dir, out_dir,
-                 previous_record_path=None,
+                 previous_record_path=None, override_index_path=None,
                  config_variant=None, config_values=None,
-                 force=False, debug=False):
+                 force=False, debug=False, processing_ctx=None,
+                 dirty_templates=None):
         self.root_dir = root_dir
         self.sub_cache_dir = sub_cache_dir
         self.out_dir = out_dir
         self.previous_record_path = previous_record_path
+        self.override_index_path = override_index_path
         self.config_variant = config_variant
         self.config_values = config_values
         self.force = force
         self.debug = debug
+        self.processing_ctx = processing_ctx
+        self.dirty_templates = dirty_templates
         self.app = None
-        self.previous_record = None
         self.previous_record_index = None
 
 
@@ -52,20 +62,29 @@ class BakeWorker(IWorker):
                                  self.ctx.config_values)
         self.ctx.app = app
 
-        # Load previous record
+        # Open the previous record. We'll only load the entries we need.
         if self.ctx.previous_record_path:
-            self.ctx.previous_record = BakeRecord.load(
+            self.ctx.previous_record_index = BakeRecordIndex(
                     self.ctx.previous_record_path)
-            self.ctx.previous_record_index = {}
-            for e in self.ctx.previous_record.entries:
-                key = _get_transition_key(e.path, e.taxonomy_info)
-                self.ctx.previous_record_index[key] = e
 
         # Create the job handlers.
         job_handlers = {
                 JOB_LOAD: LoadJobHandler(self.ctx),
                 JOB_RENDER_FIRST: RenderFirstSubJobHandler(self.ctx),
                 JOB_BAKE: BakeJobHandler(self.ctx)}
+
+        # Also host the asset pipeline if we were asked to, so that it can
+        # re-use the app we just created instead of having a separate set
+        # of worker processes create their own.
+        if self.ctx.processing_ctx is not None:
+            proc_worker = ProcessingWorker(self.ctx.processing_ctx)
+            proc_worker.wid = self.wid
+            proc_worker.setupPipeline(app)
+            job_handlers[JOB_PROCESS] = ProcessingJobHandler(
+                    self.ctx, proc_worker)
+            job_handlers[JOB_PROCESS_END] = ProcessingEndJobHandler(
+                    self.ctx, proc_worker)
+
         for jt, jh in job_handlers.items():
             app.env.registerTimer(type(jh).__name__)
         self.job_handlers = job_handlers
@@ -78,6 +97,11 @@ class BakeWorker(IWorker):
             return handler.handleJob(job['job'])
 
     def getReport(self):
+        for jh in self.job_handlers.values():
+            jh.shutdown()
+        if self.ctx.previous_record_index is not None:
+            self.ctx.previous_record_index.close()
+
         self.ctx.app.env.stepTimerSince("BakeWorker_%d_Total" % self.wid,
                                         self.work_start_time)
         return {
@@ -85,7 +109,8 @@ class BakeWorker(IWorker):
                 'data': self.ctx.app.env._timers}
 
 
-JOB_LOAD, JOB_RENDER_FIRST, JOB_BAKE = range(0, 3)
+JOB_LOAD, JOB_RENDER_FIRST, JOB_BAKE, JOB_PROCESS, JOB_PROCESS_END = \
+        range(0, 5)
 
 
 class JobHandler(object):
@@ -99,6 +124,9 @@ class JobHandler(object):
     def handleJob(self, job):
         raise NotImplementedError()
 
+    def shutdown(self):
+        pass
+
 
 def _get_errors(ex):
     errors = []
@@ -121,6 +149,11 @@ def load_factory(app, info):
 
 
 class LoadJobHandler(JobHandler):
+    def __init__(self, ctx):
+        super(LoadJobHandler, self).__init__(ctx)
+        self.use_content_hash = uses_content_hash(ctx.app)
+        self.indexed_setting_names = get_indexed_setting_names(ctx.app)
+
     def handleJob(self, job):
         # Just make sure the page has been cached.
         fac = load_factory(self.app, job)
@@ -129,11 +162,20 @@ class LoadJobHandler(JobHandler):
                 'source_name': fac.source.name,
                 'path': fac.path,
                 'config': None,
+                'index_entry': None,
+                'content_hash_info': None,
                 'errors': None}
         try:
+            # Get the page's hash first, so that we can tell the caches
+            # that a page that was only touched didn't change.
+            if self.use_content_hash:
+                result['content_hash_info'] = self._getContentHashInfo(
+                        fac.path)
             page = fac.buildPage()
             page._load()
             result['config'] = page.config.getAll()
+            result['index_entry'] = make_index_entry(
+                    page, self.indexed_setting_names)
         except Exception as ex:
             logger.debug("Got loading error. Sending it to master.")
             result['errors'] = _get_errors(ex)
@@ -141,6 +183,27 @@ class LoadJobHandler(JobHandler):
                 logger.exception(ex)
         return result
 
+    def _getContentHashInfo(self, path):
+        prev_entry = None
+        prev_hash_info = None
+        if self.ctx.previous_record_index is not None:
+            key = _get_transition_key(path)
+            prev_entry = self.ctx.previous_record_index.get(key)
+            if prev_entry is not None:
+                prev_hash_info = prev_entry.content_hash_info
+
+        hash_info = get_file_hash_info(path, prev_hash_info)
+        if (is_same_content(hash_info, prev_hash_info) and
+                hash_info[0] != prev_hash_info[0]):
+            # The file was touched but its contents didn't change, so
+            # whatever we cached for it last time is still good.
+            old_mtime, new_mtime = prev_hash_info[0], hash_info[0]
+            refresh_page_cache(self.app, path, old_mtime, new_mtime)
+            repo = self.app.env.rendered_segments_repository
+            for sub in prev_entry.subs:
+                repo.touchFs(sub.out_uri, old_mtime, new_mtime)
+        return hash_info
+
 
 class RenderFirstSubJobHandler(JobHandler):
     def handleJob(self, job):
@@ -181,31 +244,73 @@ class RenderFirstSubJobHandler(JobHandler):
 class BakeJobHandler(JobHandler):
     def __init__(self, ctx):
         super(BakeJobHandler, self).__init__(ctx)
-        self.page_baker = PageBaker(ctx.app, ctx.out_dir, ctx.force)
+        self.page_baker = PageBaker(ctx.app, ctx.out_dir, ctx.force,
+                                    dirty_templates=ctx.dirty_templates)
+        self._override_index = {}
+        self._override_index_version = 0
 
     def handleJob(self, job):
         # Actually bake the page and all its sub-pages to the output folder.
         fac = load_factory(self.app, job['factory_info'])
-
-        route_metadata = job['route_metadata']
         tax_info = job['taxonomy_info']
-        if tax_info is not None:
-            route = self.app.getTaxonomyRoute(tax_info.taxonomy_name,
-                                              tax_info.source_name)
-        else:
-            route = self.app.getRoute(fac.source.name, route_metadata,
-                                      skip_taxonomies=True)
-        assert route is not None
-
-        page = fac.buildPage()
-        qp = QualifiedPage(page, route, route_metadata)
 
         result = {
                 'path': fac.path,
                 'taxonomy_info': tax_info,
                 'sub_entries': None,
-                'errors': None}
+                'overriden_by': None,
+                'errors': None,
+                'duration': 0}
+
+        # Build the route metadata and find the appropriate route.
+        try:
+            page = fac.buildPage()
+            route_metadata = create_route_metadata(page)
+            if tax_info is not None:
+                tax = self.app.getTaxonomy(tax_info.taxonomy_name)
+                route = self.app.getTaxonomyRoute(tax_info.taxonomy_name,
+                                                  tax_info.source_name)
+                if route is None:
+                    raise Exception(
+                            "Can't find a route for taxonomy '%s' in "
+                            "source '%s'." % (tax_info.taxonomy_name,
+                                              tax_info.source_name))
+
+                slugified_term = route.slugifyTaxonomyTerm(tax_info.term)
+                route_metadata[tax.term_name] = slugified_term
+            else:
+                route = self.app.getRoute(fac.source.name, route_metadata,
+                                          skip_taxonomies=True)
+                if route is None:
+                    raise Exception("Can't find a route for page '%s'." %
+                                    fac.ref_spec)
+
+            uri = route.getUri(route_metadata)
+        except Exception as ex:
+            logger.debug("Got error preparing page. Sending it to master.")
+            result['errors'] = _get_errors(ex)
+            result['sub_entries'] = []
+            if self.ctx.debug:
+                logger.exception(ex)
+            return result
+
+        # Figure out if this page is overriden by another previously
+        # baked page. This happens for example when the user has
+        # made a page that has the same page/URL as a theme page.
+        override = self._getOverrideIndex(job['override_index']).get(uri)
+        if override is not None and override[0] != fac.path:
+            override_path, override_realm = override
+            if override_realm == fac.source.realm:
+                result['errors'] = [
+                        "Page '%s' maps to URL '%s' but is overriden "
+                        "by page '%s'." % (fac.ref_spec, uri, override_path)]
+            result['overriden_by'] = override_path
+            result['sub_entries'] = []
+            return result
+
+        qp = QualifiedPage(page, route, route_metadata)
         dirty_source_names = job['dirty_source_names']
+        content_hash_info = job.get('content_hash_info')
 
         previous_entry = None
         if self.ctx.previous_record_index is not None:
@@ -213,9 +318,11 @@ class BakeJobHandler(JobHandler):
             previous_entry = self.ctx.previous_record_index.get(key)
 
         logger.debug("Baking page: %s" % fac.ref_spec)
+        start_time = time.perf_counter()
         try:
             sub_entries = self.page_baker.bake(
-                    qp, previous_entry, dirty_source_names, tax_info)
+                    qp, previous_entry, dirty_source_names, tax_info,
+                    content_hash_info=content_hash_info)
             result['sub_entries'] = sub_entries
 
         except BakingError as ex:
@@ -224,5 +331,38 @@ class BakeJobHandler(JobHandler):
             if self.ctx.debug:
                 logger.exception(ex)
 
+        result['duration'] = time.perf_counter() - start_time
         return result
 
+    def _getOverrideIndex(self, version):
+        # The master re-writes the index when it changes, and tells us what
+        # version we should be using.
+        if version != self._override_index_version:
+            with open(self.ctx.override_index_path, 'r',
+                      encoding='utf8') as fp:
+                self._override_index = json.load(fp)
+            self._override_index_version = version
+        return self._override_index
+
+
+class ProcessingJobHandler(JobHandler):
+    def __init__(self, ctx, proc_worker):
+        super(ProcessingJobHandler, self).__init__(ctx)
+        self.proc_worker = proc_worker
+
+    def handleJob(self, job):
+        return self.proc_worker.process(job)
+
+    def shutdown(self):
+        self.proc_worker.endPipeline()
+
+
+class ProcessingEndJobHandler(JobHandler):
+    def __init__(self, ctx, proc_worker):
+        super(ProcessingEndJobHandler, self).__init__(ctx)
+        self.proc_worker = proc_worker
+
+    def handleJob(self, job):
+        # Run the post-processors now, instead of when the worker shuts
+        # down, so that they're done before the main process' ones.
+        self.proc_worker.endPipeline()
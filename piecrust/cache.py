@@ -3,6 +3,7 @@ import os.path
 import json
 import shutil
 import codecs
+import sqlite3
 import hashlib
 import logging
 import collections
@@ -16,6 +17,7 @@ class ExtensibleCache(object):
     def __init__(self, base_dir):
         self.base_dir = base_dir
         self.caches = {}
+        self.packed_caches = {}
 
     @property
     def enabled(self):
@@ -32,6 +34,17 @@ class ExtensibleCache(object):
             self.caches[name] = c
         return c
 
+    def getPackedCache(self, name):
+        c = self.packed_caches.get(name)
+        if c is None:
+            c_dir = os.path.join(self.base_dir, name)
+            if not os.path.isdir(c_dir):
+                os.makedirs(c_dir, 0o755)
+
+            c = PackedCache(os.path.join(c_dir, 'cache.db'))
+            self.packed_caches[name] = c
+        return c
+
     def getCacheDir(self, name):
         return os.path.join(self.base_dir, name)
 
@@ -42,6 +55,10 @@ class ExtensibleCache(object):
         return [dn for dn in dirnames if dn not in except_names]
 
     def clearCache(self, name):
+        packed_cache = self.packed_caches.pop(name, None)
+        if packed_cache is not None:
+            packed_cache.close()
+
         cache_dir = self.getCacheDir(name)
         if os.path.isdir(cache_dir):
             logger.debug("Cleaning cache: %s" % cache_dir)
@@ -99,12 +116,121 @@ class SimpleCache(object):
         with codecs.open(cache_path, 'w', 'utf-8') as fp:
             fp.write(content)
 
+    def touch(self, path, time):
+        cache_path = self.getCachePath(path)
+        logger.debug("Touching cache: %s" % cache_path)
+        os.utime(cache_path, (time, time))
+
+    def remove(self, path):
+        cache_path = self.getCachePath(path)
+        logger.debug("Removing cache: %s" % cache_path)
+        try:
+            os.remove(cache_path)
+        except FileNotFoundError:
+            pass
+
     def getCachePath(self, path):
         if path.startswith('.'):
             path = '__index__' + path
         return os.path.join(self.base_dir, path)
 
 
+class PackedCache(object):
+    """ A cache that stores all its items in one SQLite database, along
+        with the modification time of whatever they were built from.
+
+        The times of all the items are loaded in memory the first time
+        they're needed, so that checking whether an item is valid doesn't
+        need to touch the file-system. Items written by other processes
+        since then are looked up in the database on demand.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._pid = None
+        self._times = None
+
+    def isValid(self, path, time):
+        cache_time = self.getCacheTime(path)
+        if cache_time is None:
+            return False
+        if isinstance(time, list):
+            for t in time:
+                if cache_time < t:
+                    return False
+            return True
+        return cache_time >= time
+
+    def getCacheTime(self, path):
+        times = self._getTimes()
+        cache_time = times.get(path)
+        if cache_time is None:
+            # Maybe another process added it since we loaded our index.
+            row = self._getConnection().execute(
+                    'SELECT time FROM items WHERE key = ?',
+                    (path,)).fetchone()
+            if row is not None:
+                cache_time = row[0]
+                times[path] = cache_time
+        return cache_time
+
+    def has(self, path):
+        return self.getCacheTime(path) is not None
+
+    def read(self, path):
+        logger.debug("Reading packed cache: %s" % path)
+        row = self._getConnection().execute(
+                'SELECT content FROM items WHERE key = ?',
+                (path,)).fetchone()
+        if row is None:
+            raise Exception("No such cache item: %s" % path)
+        return row[0]
+
+    def write(self, path, content, time):
+        logger.debug("Writing packed cache: %s" % path)
+        self._getConnection().execute(
+                'INSERT OR REPLACE INTO items (key, time, content) '
+                'VALUES (?, ?, ?)',
+                (path, time, content))
+        self._getTimes()[path] = time
+
+    def touch(self, path, time):
+        logger.debug("Touching packed cache: %s" % path)
+        self._getConnection().execute(
+                'UPDATE items SET time = ? WHERE key = ?',
+                (time, path))
+        self._getTimes()[path] = time
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._times = None
+
+    def _getTimes(self):
+        if self._times is None:
+            cur = self._getConnection().execute(
+                    'SELECT key, time FROM items')
+            self._times = dict(cur)
+        return self._times
+
+    def _getConnection(self):
+        # Connections can't be shared with forked worker processes, so
+        # each process opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30,
+                                         isolation_level=None)
+            self._pid = os.getpid()
+            self._times = None
+            # This is only a cache, so we don't need it to survive crashes.
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = OFF')
+            self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS items ('
+                    'key TEXT PRIMARY KEY, time REAL, content TEXT)')
+        return self._conn
+
+
 class NullCache(object):
     def isValid(self, path, time):
         return False
@@ -118,7 +244,13 @@ class NullCache(object):
     def read(self, path):
         raise Exception("Null cache has no data.")
 
-    def write(self, path, content):
+    def write(self, path, content, time=None):
+        pass
+
+    def touch(self, path, time):
+        pass
+
+    def remove(self, path):
         pass
 
     def getCachePath(self, path):
@@ -136,6 +268,9 @@ class NullExtensibleCache(object):
     def getCache(self, name):
         return self.null_cache
 
+    def getPackedCache(self, name):
+        return self.null_cache
+
     def getCacheDir(self, name):
         raise NotImplementedError()
 
@@ -167,13 +302,29 @@ class MemCache(object):
     def last_access_hit(self):
         return self._last_access_hit
 
-    def invalidate(self, key):
+    def invalidate(self, key, *, remove_from_fs=False):
+        """ Invalidates the given item. The file-system cache item is
+            only ignored by this process, unless `remove_from_fs` is set,
+            in which case it's removed for other processes too.
+        """
         logger.debug("Invalidating cache item '%s'." % key)
         self.cache.invalidate(key)
         if self.fs_cache:
             logger.debug("Invalidating FS cache item '%s'." % key)
             fs_key = _make_fs_cache_key(key)
             self._invalidated_fs_items.add(fs_key)
+            if remove_from_fs:
+                self.fs_cache.remove(fs_key)
+
+    def touchFs(self, key, old_time, new_time):
+        """ Marks the file-system cache item as built from something
+            modified at `new_time`, if it was valid for `old_time`.
+        """
+        if self.fs_cache:
+            fs_key = _make_fs_cache_key(key)
+            if (fs_key not in self._invalidated_fs_items and
+                    self.fs_cache.isValid(fs_key, old_time)):
+                self.fs_cache.touch(fs_key, new_time)
 
     def put(self, key, item, save_to_fs=True):
         self.cache.put(key, item)
@@ -66,13 +66,20 @@ class BakeCommand(ChefCommand):
         ctx.timers = {}
         start_time = time.perf_counter()
         try:
-            # Bake the site sources.
+            pipeline = None
+            if not ctx.args.html_only:
+                pipeline = ProcessorPipeline(
+                        ctx.app, out_dir,
+                        force=ctx.args.force)
+
+            # Bake the site sources, along with the assets so that they
+            # share the same worker processes.
             if not ctx.args.assets_only:
-                success = success & self._bakeSources(ctx, out_dir)
+                success = success & self._bakeSources(ctx, out_dir, pipeline)
 
-            # Bake the assets.
-            if not ctx.args.html_only:
-                success = success & self._bakeAssets(ctx, out_dir)
+            # Bake only the assets.
+            elif pipeline is not None:
+                success = success & self._bakeAssets(ctx, pipeline)
 
             # Show merged timers.
             if ctx.args.show_timers:
@@ -91,7 +98,7 @@ class BakeCommand(ChefCommand):
                 logger.error(str(ex))
             return 1
 
-    def _bakeSources(self, ctx, out_dir):
+    def _bakeSources(self, ctx, out_dir, pipeline=None):
         if ctx.args.workers > 0:
             ctx.app.config.set('baker/workers', ctx.args.workers)
         if ctx.args.batch_size > 0:
@@ -100,16 +107,20 @@ class BakeCommand(ChefCommand):
                 ctx.app, out_dir,
                 force=ctx.args.force,
                 applied_config_variant=ctx.config_variant,
-                applied_config_values=ctx.config_values)
+                applied_config_values=ctx.config_values,
+                processor_pipeline=pipeline)
         record = baker.bake()
         _merge_timers(record.timers, ctx.timers)
-        return record.success
+        success = record.success
 
-    def _bakeAssets(self, ctx, out_dir):
-        proc = ProcessorPipeline(
-                ctx.app, out_dir,
-                force=ctx.args.force)
-        record = proc.run()
+        proc_record = baker.processor_record
+        if proc_record is not None:
+            _merge_timers(proc_record.timers, ctx.timers)
+            success = success & proc_record.success
+        return success
+
+    def _bakeAssets(self, ctx, pipeline):
+        record = pipeline.run()
         _merge_timers(record.timers, ctx.timers)
         return record.success
 
@@ -119,7 +130,7 @@ def _merge_timers(source, target):
         return
 
     for name, val in source.items():
-        if isinstance(val, float):
+        if isinstance(val, (float, int)):
             if name not in target:
                 target[name] = 0
             target[name] += val
@@ -132,8 +143,11 @@ def _merge_timers(source, target):
 def _show_timers(timers, indent=''):
     sub_timer_names = []
     for name in sorted(timers.keys()):
-        if isinstance(timers[name], float):
-            val_str = '%8.1f s' % timers[name]
+        if isinstance(timers[name], (float, int)):
+            if isinstance(timers[name], float):
+                val_str = '%8.1f s' % timers[name]
+            else:
+                val_str = '%10d' % timers[name]
             logger.info(
                     "%s[%s%s%s] %s" %
                     (indent, Fore.GREEN, val_str, Fore.RESET, name))
@@ -262,7 +276,9 @@ class ShowRecordCommand(ChefCommand):
                             SubPageBakeInfo.FLAG_FORCED_BY_PREVIOUS_ERRORS:
                                 'forced by previous errors',
                             SubPageBakeInfo.FLAG_FORMATTING_INVALIDATED:
-                                'formatting invalidated'})
+                                'formatting invalidated',
+                            SubPageBakeInfo.FLAG_FORCED_BY_TEMPLATES:
+                                'forced by modified templates'})
 
                 logging.info("   - ")
                 logging.info("     URL:    %s" % sub.out_uri)
@@ -291,6 +307,11 @@ class ShowRecordCommand(ChefCommand):
                                             ['%s=%s (%s)' % (tn, t, sn)
                                              for sn, tn, t in
                                              ri.used_taxonomy_terms]))
+                        if ri.used_templates is None:
+                            logging.info("       used templates: unknown")
+                        else:
+                            logging.info("       used templates: %s" %
+                                         _join(sorted(ri.used_templates)))
                 else:
                     logging.info("     no render info")
 
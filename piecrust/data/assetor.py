@@ -72,17 +72,14 @@ class Assetor(object):
         self._cache = {}
         name, ext = os.path.splitext(self._page.path)
         assets_dir = name + ASSET_DIR_SUFFIX
-        if not os.path.isdir(assets_dir):
+        filenames = self._page.app.env.asset_index.getAssets(assets_dir)
+        if not filenames:
             return
 
         rel_assets_dir = os.path.relpath(assets_dir, self._page.app.root_dir)
         base_url = build_base_url(self._page.app, self._uri, rel_assets_dir)
-        for fn in os.listdir(assets_dir):
+        for fn in filenames:
             full_fn = os.path.join(assets_dir, fn)
-            if not os.path.isfile(full_fn):
-                raise Exception("Skipping: %s" % full_fn)
-                continue
-
             name, ext = os.path.splitext(fn)
             if name in self._cache:
                 raise UnsupportedAssetsError(
@@ -1,17 +1,51 @@
 import logging
+import repoze.lru
 
 
 logger = logging.getLogger(__name__)
 
 
 def page_value_accessor(page, name):
+    # Look the setting up in the source's page index first, so that
+    # filtering pages doesn't need to load all of them.
+    index = page.source.getPageIndex()
+    if index.isIndexed(name):
+        entry = index.getEntry(page.rel_path)
+        if entry is not None:
+            return entry.getValue(name)
     return page.config.get(name)
 
 
+_config_filters = repoze.lru.LRUCache(256)
+
+
+def get_config_filter(config, value_accessor=None):
+    """ Returns a filter built from the given configuration. Filters are
+        cached by configuration, so that the same filter used by many pages
+        is only parsed and compiled once.
+    """
+    try:
+        key = (_freeze_value(config), value_accessor)
+    except TypeError:
+        key = None
+
+    if key is not None:
+        fil = _config_filters.get(key)
+        if fil is not None:
+            return fil
+
+    fil = PaginationFilter(value_accessor=value_accessor)
+    fil.addClausesFromConfig(config)
+    if key is not None:
+        _config_filters.put(key, fil)
+    return fil
+
+
 class PaginationFilter(object):
     def __init__(self, value_accessor=None):
         self.root_clause = None
         self.value_accessor = value_accessor or self._default_value_accessor
+        self._predicate = None
 
     @property
     def is_empty(self):
@@ -20,15 +54,37 @@ class PaginationFilter(object):
     def addClause(self, clause):
         self._ensureRootClause()
         self.root_clause.addClause(clause)
+        self._predicate = None
 
     def addClausesFromConfig(self, config):
         self._ensureRootClause()
         self._addClausesFromConfigRecursive(config, self.root_clause)
+        self._predicate = None
 
     def pageMatches(self, page):
         if self.root_clause is None:
             return True
-        return self.root_clause.pageMatches(self, page)
+        # Turn the clauses into one function the first time we need it,
+        # so we don't walk the clause tree for each page.
+        if self._predicate is None:
+            self._predicate = self.root_clause.compile(self)
+        return self._predicate(page)
+
+    def getSignature(self):
+        """ Returns a value that's the same for filters that match the
+            same pages, or `None` if that can't be known.
+        """
+        if self.root_clause is None:
+            return ()
+        return self.root_clause.getSignature()
+
+    def getIndexMatches(self, index):
+        """ Returns the entries from the given page index that may match
+            this filter, or `None` if the index can't help.
+        """
+        if self.root_clause is None:
+            return None
+        return self.root_clause.getIndexMatches(self, index)
 
     def _ensureRootClause(self):
         if self.root_clause is None:
@@ -96,6 +152,18 @@ class IFilterClause(object):
     def pageMatches(self, fil, page):
         raise NotImplementedError()
 
+    def compile(self, fil):
+        """ Returns a function that takes a page and returns whether it
+            matches this clause.
+        """
+        return lambda page: self.pageMatches(fil, page)
+
+    def getIndexMatches(self, fil, index):
+        return None
+
+    def getSignature(self):
+        return None
+
 
 class NotClause(IFilterClause):
     def __init__(self):
@@ -113,6 +181,21 @@ class NotClause(IFilterClause):
                             "clause.")
         return not self.child.pageMatches(fil, page)
 
+    def compile(self, fil):
+        if self.child is None:
+            raise Exception("'NOT' filtering clauses must have one child "
+                            "clause.")
+        child = self.child.compile(fil)
+        return lambda page: not child(page)
+
+    def getSignature(self):
+        if self.child is None:
+            return None
+        child_sig = self.child.getSignature()
+        if child_sig is None:
+            return None
+        return ('not', child_sig)
+
 
 class BooleanClause(IFilterClause):
     def __init__(self):
@@ -121,6 +204,12 @@ class BooleanClause(IFilterClause):
     def addClause(self, clause):
         self.clauses.append(clause)
 
+    def getSignature(self):
+        sigs = [c.getSignature() for c in self.clauses]
+        if any([s is None for s in sigs]):
+            return None
+        return (type(self).__name__,) + tuple(sigs)
+
 
 class AndBooleanClause(BooleanClause):
     def pageMatches(self, fil, page):
@@ -129,6 +218,33 @@ class AndBooleanClause(BooleanClause):
                 return False
         return True
 
+    def compile(self, fil):
+        preds = [c.compile(fil) for c in self.clauses]
+        if len(preds) == 1:
+            return preds[0]
+
+        def _matches(page):
+            for p in preds:
+                if not p(page):
+                    return False
+            return True
+        return _matches
+
+    def getIndexMatches(self, fil, index):
+        # Pages must match all the child clauses, so they must be in all
+        # the lists of matches we can get.
+        matches = None
+        for c in self.clauses:
+            cur_matches = c.getIndexMatches(fil, index)
+            if cur_matches is None:
+                continue
+            if matches is None:
+                matches = cur_matches
+            else:
+                cur_matches = set(cur_matches)
+                matches = [e for e in matches if e in cur_matches]
+        return matches
+
 
 class OrBooleanClause(BooleanClause):
     def pageMatches(self, fil, page):
@@ -137,6 +253,18 @@ class OrBooleanClause(BooleanClause):
                 return True
         return False
 
+    def compile(self, fil):
+        preds = [c.compile(fil) for c in self.clauses]
+        if len(preds) == 1:
+            return preds[0]
+
+        def _matches(page):
+            for p in preds:
+                if p(page):
+                    return True
+            return False
+        return _matches
+
 
 class SettingFilterClause(IFilterClause):
     def __init__(self, name, value, coercer=None):
@@ -148,6 +276,13 @@ class SettingFilterClause(IFilterClause):
         raise Exception("Setting filter clauses can't have child clauses. "
                         "Use a boolean filter clause instead.")
 
+    def getSignature(self):
+        try:
+            value = _freeze_value(self.value)
+        except TypeError:
+            return None
+        return (type(self).__name__, self.name, value, self.coercer)
+
 
 class HasFilterClause(SettingFilterClause):
     def pageMatches(self, fil, page):
@@ -160,6 +295,23 @@ class HasFilterClause(SettingFilterClause):
 
         return self.value in actual_value
 
+    def compile(self, fil):
+        accessor = fil.value_accessor
+        name = self.name
+        value = self.value
+        coercer = self.coercer
+        if coercer:
+            def _matches(page):
+                actual_value = accessor(page, name)
+                if actual_value is None or not isinstance(actual_value, list):
+                    return False
+                return value in map(coercer, actual_value)
+        else:
+            def _matches(page):
+                actual_value = accessor(page, name)
+                return isinstance(actual_value, list) and value in actual_value
+        return _matches
+
 
 class IsFilterClause(SettingFilterClause):
     def pageMatches(self, fil, page):
@@ -168,3 +320,22 @@ class IsFilterClause(SettingFilterClause):
             actual_value = self.coercer(actual_value)
         return actual_value == self.value
 
+    def compile(self, fil):
+        accessor = fil.value_accessor
+        name = self.name
+        value = self.value
+        coercer = self.coercer
+        if coercer:
+            return lambda page: coercer(accessor(page, name)) == value
+        return lambda page: accessor(page, name) == value
+
+
+def _freeze_value(value):
+    # Returns a hashable version of a setting value, or raises `TypeError`.
+    if isinstance(value, list):
+        return ('list',) + tuple(map(_freeze_value, value))
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted(
+                [(k, _freeze_value(v)) for k, v in value.items()]))
+    hash(value)
+    return value
@@ -1,7 +1,8 @@
 import logging
-from piecrust.data.filters import PaginationFilter
+from piecrust.data.filters import get_config_filter
 from piecrust.environment import AbortedSourceUseError
 from piecrust.events import Event
+from piecrust.page import Page
 from piecrust.sources.base import PageSource
 from piecrust.sources.interfaces import IPaginationSource
 
@@ -9,8 +10,96 @@ from piecrust.sources.interfaces import IPaginationSource
 logger = logging.getLogger(__name__)
 
 
+class PageSequence(object):
+    """ A list of items, along with a map of where each item is in it.
+    """
+    def __init__(self, items):
+        self.items = items
+        self._indices = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def indexOf(self, item):
+        # Pages are matched by their ref spec, since the same page could
+        # have been built more than once.
+        try:
+            if self._indices is None:
+                indices = {}
+                for i, it in enumerate(self.items):
+                    indices.setdefault(_get_item_key(it), i)
+                self._indices = indices
+            return self._indices.get(_get_item_key(item), -1)
+        except TypeError:
+            # Some items can't be hashed.
+            try:
+                return self.items.index(item)
+            except ValueError:
+                return -1
+
+
+def _get_item_key(item):
+    if isinstance(item, Page):
+        return item.ref_spec
+    return item
+
+
+def get_iterator_signature(it):
+    """ Returns a value that identifies which items the given iterator
+        returns, and in what order, among the iterators on the same source.
+        Returns `None` if that can't be known.
+    """
+    get_sig = getattr(it, 'getSignature', None)
+    if get_sig is None:
+        return None
+    return get_sig()
+
+
+def sort_iterator_items(it, sort_signature, key=None, reverse=False,
+                        sort_func=None):
+    """ Sorts the items returned by the given iterator. If the iterator
+        goes over a page source, the result is cached on that source, so
+        that other iterators sorting the same items the same way don't need
+        to sort them again.
+
+        If `sort_func` is given, it's called with the iterator to do the
+        sorting instead of `sorted`.
+    """
+    if sort_func is None:
+        def sort_func(i):
+            return sorted(i, key=key, reverse=reverse)
+
+    cache = None
+    root_it = it
+    while getattr(root_it, 'it', None) is not None:
+        root_it = root_it.it
+    source = getattr(root_it, 'source', None)
+    if isinstance(source, PageSource):
+        cache = source.sorted_items_cache
+
+    signature = None
+    if cache is not None:
+        signature = get_iterator_signature(it)
+    if signature is None:
+        return sort_func(it)
+
+    cache_key = (signature, sort_signature, reverse)
+    items = cache.get(cache_key)
+    if items is None:
+        items = sort_func(it)
+        cache[cache_key] = items
+    return items
+
+
+def _get_inner_signature(it, *values):
+    inner_sig = get_iterator_signature(it)
+    if inner_sig is None or any([v is None for v in values]):
+        return None
+    return values + (inner_sig,)
+
+
 class SliceIterator(object):
-    def __init__(self, it, offset=0, limit=-1):
+    def __init__(self, it, offset=0, limit=-1, sequence_cache=None):
         self.it = it
         self.offset = offset
         self.limit = limit
@@ -19,11 +108,13 @@ class SliceIterator(object):
         self.inner_count = -1
         self.next_page = None
         self.prev_page = None
+        self.sequence_cache = sequence_cache
         self._cache = None
 
     def __iter__(self):
         if self._cache is None:
-            inner_list = list(self.it)
+            seq = self._getSequence()
+            inner_list = seq.items
             self.inner_count = len(inner_list)
 
             if self.limit > 0:
@@ -34,10 +125,7 @@ class SliceIterator(object):
                 self._cache = inner_list[self.offset:]
 
             if self.current_page:
-                try:
-                    idx = inner_list.index(self.current_page)
-                except ValueError:
-                    idx = -1
+                idx = seq.indexOf(self.current_page)
                 if idx >= 0:
                     if idx < self.inner_count - 1:
                         self.next_page = inner_list[idx + 1]
@@ -46,6 +134,22 @@ class SliceIterator(object):
 
         return iter(self._cache)
 
+    def getSignature(self):
+        return _get_inner_signature(self.it, 'slice', self.offset,
+                                    self.limit)
+
+    def _getSequence(self):
+        # If we were given a cache, the items we're slicing were already
+        # listed by another iterator for the same items, like for another
+        # sub-page of the same page.
+        if self.sequence_cache is None:
+            return PageSequence(list(self.it))
+        seq = self.sequence_cache.get('sequence')
+        if seq is None:
+            seq = PageSequence(list(self.it))
+            self.sequence_cache['sequence'] = seq
+        return seq
+
 
 class SettingFilterIterator(object):
     def __init__(self, it, fil_conf, setting_accessor=None):
@@ -55,14 +159,20 @@ class SettingFilterIterator(object):
         self.setting_accessor = setting_accessor
 
     def __iter__(self):
-        if self._fil is None:
-            self._fil = PaginationFilter(value_accessor=self.setting_accessor)
-            self._fil.addClausesFromConfig(self.fil_conf)
-
+        self._ensureFilter()
         for i in self.it:
             if self._fil.pageMatches(i):
                 yield i
 
+    def getSignature(self):
+        self._ensureFilter()
+        return _get_inner_signature(self.it, 'filter',
+                                    self._fil.getSignature())
+
+    def _ensureFilter(self):
+        if self._fil is None:
+            self._fil = get_config_filter(self.fil_conf, self.setting_accessor)
+
 
 class NaturalSortIterator(object):
     def __init__(self, it, reverse=False):
@@ -70,7 +180,11 @@ class NaturalSortIterator(object):
         self.reverse = reverse
 
     def __iter__(self):
-        return iter(sorted(self.it, reverse=self.reverse))
+        return iter(sort_iterator_items(self.it, 'natural',
+                                        reverse=self.reverse))
+
+    def getSignature(self):
+        return _get_inner_signature(self.it, 'natural', self.reverse)
 
 
 class SettingSortIterator(object):
@@ -81,8 +195,13 @@ class SettingSortIterator(object):
         self.value_accessor = value_accessor or self._default_value_accessor
 
     def __iter__(self):
-        return iter(sorted(self.it, key=self._key_getter,
-                           reverse=self.reverse))
+        return iter(sort_iterator_items(self.it, ('setting', self.name),
+                                        key=self._key_getter,
+                                        reverse=self.reverse))
+
+    def getSignature(self):
+        return _get_inner_signature(self.it, 'setting', self.name,
+                                    self.reverse)
 
     def _key_getter(self, item):
         key = self.value_accessor(item, self.name)
@@ -104,10 +223,20 @@ class PaginationFilterIterator(object):
         self._fil = fil
 
     def __iter__(self):
-        for page in self.it:
+        # Source iterators can skip the pages that their source's index
+        # says can't match.
+        pages = self.it
+        iter_matching = getattr(self.it, 'iterMatching', None)
+        if iter_matching is not None:
+            pages = iter_matching(self._fil)
+        for page in pages:
             if self._fil.pageMatches(page):
                 yield page
 
+    def getSignature(self):
+        return _get_inner_signature(self.it, 'filter',
+                                    self._fil.getSignature())
+
 
 class PageIterator(object):
     debug_render = []
@@ -115,7 +244,7 @@ class PageIterator(object):
     debug_render_not_empty = True
 
     def __init__(self, source, current_page=None, pagination_filter=None,
-            offset=0, limit=-1, locked=False):
+            offset=0, limit=-1, locked=False, sequence_cache=None):
         self._source = source
         self._current_page = current_page
         self._locked = False
@@ -139,6 +268,7 @@ class PageIterator(object):
 
         if offset > 0 or limit > 0:
             self.slice(offset, limit)
+            self._pagination_slicer.sequence_cache = sequence_cache
 
         self._locked = locked
 
@@ -233,7 +233,8 @@ class Linker(object):
         if self._parent is None:
             parent_name = self._source.getBasename(self._dir_path)
             parent_dir_path = self._source.getDirpath(self._dir_path)
-            for is_dir, name, data in self._source.listPath(parent_dir_path):
+            for is_dir, name, data in list_source_path(self._source,
+                                                       parent_dir_path):
                 if not is_dir and name == parent_name:
                     parent_page = data.buildPage()
                     item = _LinkedPage(parent_page)
@@ -291,7 +292,7 @@ class Linker(object):
         if not is_listable:
             raise Exception("Source '%s' can't be listed." % self._source.name)
 
-        items = list(self._source.listPath(self._dir_path))
+        items = list_source_path(self._source, self._dir_path)
         self._items = collections.OrderedDict()
         for is_dir, name, data in items:
             # If `is_dir` is true, `data` will be the directory's source
@@ -324,6 +325,19 @@ class Linker(object):
                 self._items[name] = item
 
 
+def list_source_path(source, dir_path):
+    """ Returns the items of the given directory in a listable source.
+        Listings are cached on the source, so that the linkers of all the
+        pages in that source share them.
+    """
+    dir_path = dir_path.strip('\\/')
+    items = source.listing_cache.get(dir_path)
+    if items is None:
+        items = list(source.listPath(dir_path))
+        source.listing_cache[dir_path] = items
+    return items
+
+
 def filter_page_items(item):
     return not isinstance(item, Linker)
 
@@ -66,6 +66,7 @@ class PaginationData(LazyPageConfigData):
                 ctx = PageRenderingContext(qp)
                 render_result = render_page_segments(ctx)
                 segs = render_result.segments
+                self._addUsedTemplates(render_result.render_pass_info)
             except Exception as e:
                 raise Exception(
                         "Error rendering segments for '%s'" % uri) from e
@@ -86,3 +87,12 @@ class PaginationData(LazyPageConfigData):
 
         return segs[name]
 
+
+    def _addUsedTemplates(self, render_pass_info):
+        # The page we're rendering now shows the segments we just rendered,
+        # so it depends on the templates they used too.
+        cpi = self._page.app.env.exec_info_stack.current_page_info
+        if cpi is not None:
+            pass_info = cpi.render_ctx.current_pass_info
+            if pass_info is not None:
+                pass_info.addUsedTemplates(render_pass_info)
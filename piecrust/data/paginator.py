@@ -3,6 +3,7 @@ import logging
 from werkzeug.utils import cached_property
 from piecrust.data.filters import PaginationFilter, page_value_accessor
 from piecrust.data.iterators import PageIterator
+from piecrust.sources.base import PageSource
 from piecrust.sources.interfaces import IPaginationSource
 
 
@@ -199,9 +200,21 @@ class Paginator(object):
                 current_page=current_page,
                 pagination_filter=pag_filter,
                 offset=offset, limit=self.items_per_page,
-                locked=True)
+                locked=True, sequence_cache=self._getSequenceCache())
         self._iterator._iter_event += self._onIteration
 
+    def _getSequenceCache(self):
+        # All the sub-pages of a page paginate the same items, so they can
+        # share the list of those items once it's been filtered and sorted.
+        # We only do this for page sources, since other things we paginate
+        # are built again for each sub-page and could change.
+        if not isinstance(self._source, PageSource):
+            return None
+        caches = getattr(self._parent_page, 'pagination_sequences', None)
+        if caches is None:
+            return None
+        return caches.setdefault(self._source.name, {})
+
     def _getPaginationFilter(self):
         f = PaginationFilter(value_accessor=page_value_accessor)
 
@@ -105,18 +105,18 @@ class BlogDataProvider(DataProvider, collections.abc.Mapping):
 
         self._yearly = []
         yearly_index = {}
-        for post in self._source.getPages():
-            year = post.datetime.strftime('%Y')
+        for entry in self._source.getPageIndex().entries:
+            year = entry.datetime.strftime('%Y')
 
             posts_this_year = yearly_index.get(year)
             if posts_this_year is None:
                 timestamp = time.mktime(
-                        (post.datetime.year, 1, 1, 0, 0, 0, 0, 0, -1))
+                        (entry.datetime.year, 1, 1, 0, 0, 0, 0, 0, -1))
                 posts_this_year = BlogArchiveEntry(self._page, year, timestamp)
                 self._yearly.append(posts_this_year)
                 yearly_index[year] = posts_this_year
 
-            posts_this_year._data_source.append(post)
+            posts_this_year._data_source.append(entry.buildPage())
         self._yearly = sorted(self._yearly,
                 key=lambda e: e.timestamp,
                 reverse=True)
@@ -128,20 +128,20 @@ class BlogDataProvider(DataProvider, collections.abc.Mapping):
             return self._monthly
 
         self._monthly = []
-        for post in self._source.getPages():
-            month = post.datetime.strftime('%B %Y')
+        monthly_index = {}
+        for entry in self._source.getPageIndex().entries:
+            month = entry.datetime.strftime('%B %Y')
 
-            posts_this_month = next(
-                    filter(lambda m: m.name == month, self._monthly),
-                    None)
+            posts_this_month = monthly_index.get(month)
             if posts_this_month is None:
                 timestamp = time.mktime(
-                        (post.datetime.year, post.datetime.month, 1,
+                        (entry.datetime.year, entry.datetime.month, 1,
                             0, 0, 0, 0, 0, -1))
                 posts_this_month = BlogArchiveEntry(self._page, month, timestamp)
                 self._monthly.append(posts_this_month)
+                monthly_index[month] = posts_this_month
 
-            posts_this_month._data_source.append(post)
+            posts_this_month._data_source.append(entry.buildPage())
         self._monthly = sorted(self._monthly,
                 key=lambda e: e.timestamp,
                 reverse=True)
@@ -156,12 +156,13 @@ class BlogDataProvider(DataProvider, collections.abc.Mapping):
         setting_name = tax_info.setting_name
 
         posts_by_tax_value = {}
-        for post in self._source.getPages():
-            tax_values = post.config.get(setting_name)
+        for entry in self._source.getPageIndex().entries:
+            tax_values = entry.getValue(setting_name)
             if tax_values is None:
                 continue
             if not isinstance(tax_values, list):
                 tax_values = [tax_values]
+            post = entry.buildPage()
             for val in tax_values:
                 posts_by_tax_value.setdefault(val, [])
                 posts_by_tax_value[val].append(post)
@@ -1,6 +1,7 @@
 import time
 import logging
 import contextlib
+from piecrust.assetindex import AssetIndex
 from piecrust.cache import MemCache
 
 
@@ -61,6 +62,7 @@ class Environment(object):
         self.base_asset_url_format = '%uri%'
         self.page_repository = MemCache()
         self.rendered_segments_repository = MemCache()
+        self.asset_index = AssetIndex()
         self.fs_caches = {
                 'renders': self.rendered_segments_repository}
         self.fs_cache_only_for_main_page = False
@@ -88,6 +90,7 @@ class Environment(object):
         self.exec_info_stack.clear()
         self.was_cache_cleaned = False
         self.base_asset_url_format = '%uri%'
+        self.asset_index = AssetIndex()
 
         self._onSubCacheDirChanged(app)
 
@@ -95,7 +98,17 @@ class Environment(object):
         if raise_if_registered and category in self._timers:
             raise Exception("Timer '%s' has already been registered." %
                             category)
-        self._timers[category] = 0
+        self._timers[category] = 0.0
+
+    def registerCounter(self, category, *, raise_if_registered=True):
+        # Counters are reported along with the timers, but as integers.
+        if raise_if_registered and category in self._timers:
+            raise Exception("Counter '%s' has already been registered." %
+                            category)
+        self._timers.setdefault(category, 0)
+
+    def stepCounter(self, category, value=1):
+        self._timers[category] += value
 
     @contextlib.contextmanager
     def timerScope(self, category):
@@ -1,5 +1,8 @@
+import io
 import sys
 import json
+import importlib
+import pickle as _stdpickle
 import datetime
 import collections
 
@@ -219,3 +222,88 @@ def _unpickle_object(state):
 
     return obj
 
+
+# Binary codec
+#
+# This uses the standard library's binary pickle protocol, which is
+# implemented in C, but with a private pickler that writes the classes that
+# get sent back and forth between the main process and the workers the most
+# as a small number instead of their module and class names. We don't use
+# `copyreg` extension codes for this because they would change how every
+# other pickle in the process is written, like the bake record's.
+
+# The order of this list matters, so new classes should be added at the end.
+_registered_classes = [
+        ('datetime', 'date'),
+        ('datetime', 'datetime'),
+        ('datetime', 'time'),
+        ('piecrust.baking.records', 'TaxonomyInfo'),
+        ('piecrust.baking.records', 'SubPageBakeInfo'),
+        ('piecrust.rendering', 'RenderPassInfo'),
+        ('piecrust.processing.worker', 'ProcessingWorkerJob'),
+        ('piecrust.processing.worker', 'ProcessingWorkerResult'),
+        ]
+
+_registered_class_defs = None
+_registered_class_codes = None
+
+
+def _ensure_registered_classes():
+    global _registered_class_defs, _registered_class_codes
+    if _registered_class_defs is not None:
+        return
+
+    class_defs = []
+    for mod_name, class_name in _registered_classes:
+        mod = importlib.import_module(mod_name)
+        class_defs.append(getattr(mod, class_name))
+    _registered_class_codes = {c: i for i, c in enumerate(class_defs)}
+    _registered_class_defs = class_defs
+
+
+class _BinaryPickler(_stdpickle.Pickler):
+    def persistent_id(self, obj):
+        code = _registered_class_codes.get(type(obj))
+        if code is None:
+            return None
+        if type(obj).__module__ == 'datetime':
+            return (code, obj.__reduce__()[1])
+        return (code, obj.__dict__)
+
+
+class _BinaryUnpickler(_stdpickle.Unpickler):
+    def persistent_load(self, pid):
+        code, state = pid
+        class_def = _registered_class_defs[code]
+        if class_def.__module__ == 'datetime':
+            return class_def(*state)
+        obj = class_def.__new__(class_def)
+        obj.__dict__.update(state)
+        return obj
+
+
+def pickle_binary(obj):
+    _ensure_registered_classes()
+    buf = io.BytesIO()
+    _BinaryPickler(buf, protocol=4).dump(obj)
+    return buf.getvalue()
+
+
+def unpickle_binary(data):
+    _ensure_registered_classes()
+    return _BinaryUnpickler(io.BytesIO(data)).load()
+
+
+_codecs = {
+        'json': (pickle, unpickle),
+        'binary': (pickle_binary, unpickle_binary)}
+
+
+def get_codec(name):
+    """ Returns a `(pickle, unpickle)` pair of functions for the given
+        codec name, which can be `json` or `binary`.
+    """
+    try:
+        return _codecs[name]
+    except KeyError:
+        raise Exception("Unknown pickling codec: %s" % name)
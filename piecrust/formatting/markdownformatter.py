@@ -1,7 +1,24 @@
+import json
+import time
+import hashlib
+import logging
+import markdown
 from markdown import Markdown
 from piecrust.formatting.base import Formatter
 
 
+logger = logging.getLogger(__name__)
+
+
+MARKDOWN_ENGINES = ['python-markdown', 'cmark']
+
+# The Python-Markdown extensions that cmark can stand in for, with the
+# cmark-gfm extension they need, if any.
+CMARK_EXTENSIONS = {
+        'fenced_code': None,
+        'tables': 'table'}
+
+
 class MarkdownFormatter(Formatter):
     FORMAT_NAMES = ['markdown', 'mdown', 'md']
     OUTPUT_FORMAT = 'html'
@@ -9,11 +26,24 @@ class MarkdownFormatter(Formatter):
     def __init__(self):
         super(MarkdownFormatter, self).__init__()
         self._formatter = None
+        self._config_hash = None
 
     def render(self, format_name, txt):
         assert format_name in self.FORMAT_NAMES
         self._ensureInitialized()
-        return self._formatter.reset().convert(txt)
+
+        # Formatted texts are cached by contents, along with the
+        # formatter's configuration, so that the bake workers and the
+        # server share them, and they survive layout and config changes.
+        cache = self.app.cache.getPackedCache('formatting')
+        cache_key = hashlib.md5(
+                (self._config_hash + txt).encode('utf8')).hexdigest()
+        if cache.has(cache_key):
+            return cache.read(cache_key)
+
+        output = self._formatter.render(txt)
+        cache.write(cache_key, output, time.time())
+        return output
 
     def _ensureInitialized(self):
         if self._formatter is not None:
@@ -35,6 +65,92 @@ class MarkdownFormatter(Formatter):
 
         extension_configs = config.get('extension_configs', {})
 
-        self._formatter = Markdown(extensions=extensions,
-                                   extension_configs=extension_configs)
+        engine = config.get('engine', 'python-markdown')
+        self._formatter = create_markdown_engine(engine, extensions,
+                                                 extension_configs)
+        self._config_hash = hashlib.md5(json.dumps(
+                {'engine': self._formatter.ENGINE_NAME,
+                 'version': self._formatter.getVersion(),
+                 'extensions': extensions,
+                 'extension_configs': extension_configs},
+                sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+
+def create_markdown_engine(engine, extensions, extension_configs):
+    """ Creates the given Markdown engine. If it's not available, or it
+        doesn't support the given extensions, Python-Markdown is used
+        instead.
+    """
+    if engine not in MARKDOWN_ENGINES:
+        raise Exception("Unknown Markdown engine '%s'. Valid values "
+                        "are: %s" % (engine, ', '.join(MARKDOWN_ENGINES)))
+
+    if engine == 'cmark':
+        cmark_extensions = _get_cmark_extensions(extensions,
+                                                 extension_configs)
+        if cmark_extensions is not None:
+            try:
+                return CmarkEngine(cmark_extensions)
+            except ImportError:
+                logger.debug("The `cmarkgfm` package isn't installed, "
+                             "using Python-Markdown instead.")
+
+    return PythonMarkdownEngine(extensions, extension_configs)
+
+
+def _get_cmark_extensions(extensions, extension_configs):
+    if extension_configs:
+        logger.debug("cmark doesn't support Markdown extension settings, "
+                     "using Python-Markdown instead.")
+        return None
+
+    cmark_extensions = []
+    for e in extensions:
+        name = e.rsplit('.', 1)[-1]
+        if name not in CMARK_EXTENSIONS:
+            logger.debug("cmark doesn't support Markdown extension '%s', "
+                         "using Python-Markdown instead." % e)
+            return None
+        cmark_ext = CMARK_EXTENSIONS[name]
+        if cmark_ext is not None:
+            cmark_extensions.append(cmark_ext)
+    return cmark_extensions
+
+
+class PythonMarkdownEngine(object):
+    ENGINE_NAME = 'python-markdown'
+
+    def __init__(self, extensions, extension_configs):
+        self._markdown = Markdown(extensions=extensions,
+                                  extension_configs=extension_configs)
+
+    def getVersion(self):
+        return markdown.version
+
+    def render(self, txt):
+        return self._markdown.reset().convert(txt)
+
+
+class CmarkEngine(object):
+    """ Formats Markdown with cmark-gfm, a much faster CommonMark
+        implementation written in C.
+    """
+    ENGINE_NAME = 'cmark'
+
+    def __init__(self, extensions):
+        import cmarkgfm
+        from cmarkgfm.cmark import Options
+
+        self._cmarkgfm = cmarkgfm
+        self._extensions = extensions
+        # Like Python-Markdown, let raw HTML through.
+        self._options = getattr(Options, 'CMARK_OPT_UNSAFE', 0)
+
+    def getVersion(self):
+        return getattr(self._cmarkgfm, '__version__', '')
 
+    def render(self, txt):
+        output = self._cmarkgfm.markdown_to_html_with_extensions(
+                txt, options=self._options, extensions=self._extensions)
+        # Python-Markdown doesn't end its output with a new line.
+        return output.rstrip('\n')
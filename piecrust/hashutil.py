@@ -0,0 +1,47 @@
+import os
+import hashlib
+
+
+CHANGE_DETECTION_MODES = ['mtime', 'hash']
+
+
+def uses_content_hash(app):
+    """ Returns whether the baker and the asset pipeline should detect
+        changed files by looking at their contents instead of only their
+        modification times.
+    """
+    mode = app.config.get('baker/change_detection', 'mtime')
+    if mode not in CHANGE_DETECTION_MODES:
+        raise Exception("Unknown change detection mode '%s'. Valid values "
+                        "are: %s" % (mode, ', '.join(CHANGE_DETECTION_MODES)))
+    return mode == 'hash'
+
+
+def get_file_hash(path):
+    h = hashlib.md5()
+    with open(path, 'rb') as fp:
+        while True:
+            chunk = fp.read(65536)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_file_hash_info(path, previous=None):
+    """ Returns a `(mtime, size, hash)` tuple for the given file.
+
+        If `previous` is a tuple returned by an earlier call for the same
+        file, and the file's modification time and size didn't change since
+        then, it is returned as-is, without reading the file.
+    """
+    st = os.stat(path)
+    if (previous is not None and
+            previous[0] == st.st_mtime and previous[1] == st.st_size):
+        return previous
+    return (st.st_mtime, st.st_size, get_file_hash(path))
+
+
+def is_same_content(hash_info, other_hash_info):
+    return (hash_info is not None and other_hash_info is not None and
+            hash_info[2] == other_hash_info[2])
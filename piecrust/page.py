@@ -43,6 +43,7 @@ class Page(IRouteMetadataProvider):
         self.source_metadata = source_metadata
         self.rel_path = rel_path
         self._config = None
+        self._content_offset = 0
         self._raw_content = None
         self._flags = FLAG_NONE
         self._datetime = None
@@ -76,6 +77,12 @@ class Page(IRouteMetadataProvider):
     @property
     def raw_content(self):
         self._load()
+        if self._raw_content is None:
+            self._raw_content = load_page_segments(
+                    self.app, self.path, self._content_offset,
+                    self.path_mtime,
+                    engine_name=self._config.get('template_engine'),
+                    format_name=self._config.get('format'))
         return self._raw_content
 
     @property
@@ -129,13 +136,15 @@ class Page(IRouteMetadataProvider):
         if self._config is not None:
             return
 
-        config, content, was_cache_valid = load_page(self.app, self.path,
-                                                     self.path_mtime)
+        # Only load the page's configuration for now. Its contents will be
+        # loaded the first time they're needed.
+        config, offset, was_cache_valid = load_page(self.app, self.path,
+                                                    self.path_mtime)
         if 'config' in self.source_metadata:
             config.merge(self.source_metadata['config'])
 
         self._config = config
-        self._raw_content = content
+        self._content_offset = offset
         if was_cache_valid:
             self._flags |= FLAG_RAW_CACHE_VALID
 
@@ -211,6 +220,9 @@ class ContentSegmentPart(object):
         self.fmt = fmt
         self.offset = offset
         self.line = line
+        # The formatted contents of static parts, i.e. parts without any
+        # template markup.
+        self.formatted = None
 
     def __str__(self):
         return '%s [%s]' % (self.content, self.fmt or '<default>')
@@ -223,6 +235,7 @@ def json_load_segments(data):
         for p_data in seg_data:
             part = ContentSegmentPart(p_data['c'], p_data['f'], p_data['o'],
                                       p_data['l'])
+            part.formatted = p_data.get('h')
             seg.parts.append(part)
         segments[key] = seg
     return segments
@@ -235,12 +248,18 @@ def json_save_segments(segments):
         for part in seg.parts:
             p_data = {'c': part.content, 'f': part.fmt, 'o': part.offset,
                       'l': part.line}
+            if part.formatted is not None:
+                p_data['h'] = part.formatted
             seg_data.append(p_data)
         data[key] = seg_data
     return data
 
 
 def load_page(app, path, path_mtime=None):
+    """ Loads a page's configuration, and returns it along with the offset
+        of the page's contents in the file, and whether it came from the
+        cache. The page's contents are loaded with `load_page_segments`.
+    """
     try:
         with app.env.timerScope('PageLoad'):
             return _do_load_page(app, path, path_mtime)
@@ -252,10 +271,47 @@ def load_page(app, path, path_mtime=None):
         raise PageLoadingError(path, e).with_traceback(traceback)
 
 
+def load_page_segments(app, path, offset, path_mtime=None,
+                       engine_name=None, format_name=None):
+    """ Loads a page's contents. Parts of the contents that don't need to
+        be rendered by the given template engine are formatted right away,
+        and cached that way.
+    """
+    try:
+        with app.env.timerScope('PageLoad'):
+            return _do_load_page_segments(app, path, offset, path_mtime,
+                                          engine_name, format_name)
+    except Exception as e:
+        logger.exception(
+                "Error loading page contents: %s" %
+                os.path.relpath(path, app.root_dir))
+        _, __, traceback = sys.exc_info()
+        raise PageLoadingError(path, e).with_traceback(traceback)
+
+
+def refresh_page_cache(app, path, old_mtime, new_mtime):
+    """ Marks the cached configuration and contents of the given page as
+        loaded from a file modified at `new_mtime`, if they were valid for
+        `old_mtime`. This is for when the file was touched without its
+        contents changing.
+    """
+    cache = app.cache.getPackedCache('pages')
+    cache_key = _get_cache_key(path)
+    for cache_path in [cache_key + '.header', cache_key + '.content']:
+        if cache.isValid(cache_path, old_mtime):
+            cache.touch(cache_path, new_mtime)
+
+
+def _get_cache_key(path):
+    return hashlib.md5(path.encode('utf8')).hexdigest()
+
+
 def _do_load_page(app, path, path_mtime):
-    # Check the cache first.
-    cache = app.cache.getCache('pages')
-    cache_path = hashlib.md5(path.encode('utf8')).hexdigest() + '.json'
+    # Check the cache first. The configuration is cached separately from
+    # the contents, so we don't have to decode the contents of pages that
+    # we only need the configuration of (like when listing blog posts).
+    cache = app.cache.getPackedCache('pages')
+    cache_path = _get_cache_key(path) + '.header'
     page_time = path_mtime or os.path.getmtime(path)
     if cache.isValid(cache_path, page_time):
         cache_data = json.loads(
@@ -264,10 +320,10 @@ def _do_load_page(app, path, path_mtime):
         config = PageConfiguration(
                 values=cache_data['config'],
                 validate=False)
-        content = json_load_segments(cache_data['content'])
-        return config, content, True
+        return config, cache_data['offset'], True
 
-    # Nope, load the page from the source file.
+    # Nope, load the page from the source file. We still need to find
+    # the names of its content segments, but we don't parse them.
     logger.debug("Loading page configuration from: %s" % path)
     with open(path, 'r', encoding='utf-8') as fp:
         raw = fp.read()
@@ -279,16 +335,46 @@ def _do_load_page(app, path, path_mtime):
         header['format'] = auto_formats.get(ext, None)
 
     config = PageConfiguration(header)
-    content = parse_segments(raw, offset)
-    config.set('segments', list(content.keys()))
+    config.set('segments', get_segment_names(raw, offset))
 
     # Save to the cache.
     cache_data = {
             'config': config.getAll(),
-            'content': json_save_segments(content)}
-    cache.write(cache_path, json.dumps(cache_data))
+            'offset': offset}
+    cache.write(cache_path, json.dumps(cache_data), page_time)
 
-    return config, content, False
+    return config, offset, False
+
+
+def _do_load_page_segments(app, path, offset, path_mtime, engine_name,
+                           format_name):
+    cache = app.cache.getPackedCache('pages')
+    cache_path = _get_cache_key(path) + '.content'
+    page_time = path_mtime or os.path.getmtime(path)
+    if cache.isValid(cache_path, page_time):
+        return json_load_segments(json.loads(cache.read(cache_path)))
+
+    logger.debug("Loading page contents from: %s" % path)
+    with open(path, 'r', encoding='utf-8') as fp:
+        raw = fp.read()
+    content = parse_segments(raw, offset)
+    _format_static_parts(app, content, engine_name, format_name)
+
+    cache.write(cache_path, json.dumps(json_save_segments(content)),
+                page_time)
+
+    return content
+
+
+def _format_static_parts(app, segments, engine_name, format_name):
+    from piecrust.rendering import get_template_engine, format_text
+
+    engine = get_template_engine(app, engine_name)
+    for seg in segments.values():
+        for part in seg.parts:
+            if not engine.needsRender(part.content):
+                part.formatted = format_text(app, part.fmt or format_name,
+                                             part.content)
 
 
 segment_pattern = re.compile(
@@ -299,6 +385,24 @@ part_pattern = re.compile(
         re.M)
 
 
+def get_segment_names(raw, offset=0):
+    """ Returns the names of the segments `parse_segments` would return,
+        without actually parsing them.
+    """
+    matches = list(segment_pattern.finditer(raw, offset))
+    if len(matches) == 0:
+        return ['content']
+
+    names = []
+    if matches[0].start() > 0:
+        names.append('content')
+    for m in matches:
+        name = m.group('name')
+        if name not in names:
+            names.append(name)
+    return names
+
+
 def _count_lines(s):
     return len(s.split('\n'))
 
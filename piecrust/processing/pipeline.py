@@ -6,6 +6,7 @@ import hashlib
 import logging
 import multiprocessing
 from piecrust.chefutil import format_timed, format_timed_scope
+from piecrust.hashutil import uses_content_hash
 from piecrust.processing.base import PipelineContext
 from piecrust.processing.records import (
         ProcessorPipelineRecordEntry, TransitionalProcessorPipelineRecord,
@@ -19,8 +20,7 @@ logger = logging.getLogger(__name__)
 
 
 class _ProcessingContext(object):
-    def __init__(self, jobs, record, base_dir, mount_info):
-        self.jobs = jobs
+    def __init__(self, record, base_dir, mount_info):
         self.record = record
         self.base_dir = base_dir
         self.mount_info = mount_info
@@ -55,6 +55,7 @@ class ProcessorPipeline(object):
                 '.git*', '.hg*', '.svn']
         self.ignore_patterns = make_re(ignores)
         self.force_patterns = make_re(baker_params.get('force', []))
+        self.use_content_hash = uses_content_hash(app)
 
         # Those things are mostly for unit-testing.
         #
@@ -71,7 +72,8 @@ class ProcessorPipeline(object):
         self.ignore_patterns += make_re(patterns)
 
     def run(self, src_dir_or_file=None, *,
-            delete=True, previous_record=None, save_record=True):
+            delete=True, previous_record=None, save_record=True,
+            pool=None):
         start_time = time.perf_counter()
 
         # Get the list of processors for this run.
@@ -125,6 +127,7 @@ class ProcessorPipeline(object):
             entry.flags = res.flags
             entry.proc_tree = res.proc_tree
             entry.rel_outputs = res.rel_outputs
+            entry.content_hashes = res.content_hashes
             if entry.flags & FLAG_PROCESSED:
                 record.current.processed_count += 1
             if res.errors:
@@ -136,26 +139,43 @@ class ProcessorPipeline(object):
                 for e in entry.errors:
                     logger.error("  " + e)
 
-        jobs = []
-        self._process(src_dir_or_file, record, jobs)
-        pool = self._createWorkerPool()
+        # Jobs are created as we walk the asset directories, and handed to
+        # the workers as they make room for them.
+        jobs = self._process(src_dir_or_file, record)
+        if pool is None:
+            own_pool = True
+            pool = self._createWorkerPool()
+        else:
+            # We're running on somebody else's workers (like the baker's),
+            # so we need to tell them what kind of job this is. They will
+            # also be the ones closing the pool and reporting timers.
+            from piecrust.baking.worker import JOB_PROCESS, JOB_PROCESS_END
+            own_pool = False
+            jobs = ({'type': JOB_PROCESS, 'job': j} for j in jobs)
         ar = pool.queueJobs(jobs, handler=_handler)
         ar.wait()
 
+        # Invoke the workers' post-processors before ours, like what
+        # happens when we close our own pool.
+        if not own_pool:
+            ar = pool.broadcastJob({'type': JOB_PROCESS_END, 'job': None})
+            ar.wait()
+
         # Shutdown the workers and get timing information from them.
-        reports = pool.close()
-        record.current.timers = {}
-        for i in range(len(reports)):
-            timers = reports[i]
-            if timers is None:
-                continue
-
-            worker_name = 'PipelineWorker_%d' % i
-            record.current.timers[worker_name] = {}
-            for name, val in timers['data'].items():
-                main_val = record.current.timers.setdefault(name, 0)
-                record.current.timers[name] = main_val + val
-                record.current.timers[worker_name][name] = val
+        if own_pool:
+            reports = pool.close()
+            record.current.timers = {}
+            for i in range(len(reports)):
+                timers = reports[i]
+                if timers is None:
+                    continue
+
+                worker_name = 'PipelineWorker_%d' % i
+                record.current.timers[worker_name] = {}
+                for name, val in timers['data'].items():
+                    main_val = record.current.timers.setdefault(name, 0)
+                    record.current.timers[name] = main_val + val
+                    record.current.timers[worker_name][name] = val
 
         # Invoke post-processors.
         pipeline_ctx.record = record.current
@@ -189,7 +209,7 @@ class ProcessorPipeline(object):
 
         return record.detach()
 
-    def _process(self, src_dir_or_file, record, jobs):
+    def _process(self, src_dir_or_file, record):
         if src_dir_or_file is not None:
             # Process only the given path.
             # Find out what mount point this is in.
@@ -204,20 +224,20 @@ class ProcessorPipeline(object):
                                 "mount point: %s" %
                                 (src_dir_or_file, known_roots))
 
-            ctx = _ProcessingContext(jobs, record, base_dir, mount_info)
+            ctx = _ProcessingContext(record, base_dir, mount_info)
             logger.debug("Initiating processing pipeline on: %s" %
                          src_dir_or_file)
             if os.path.isdir(src_dir_or_file):
-                self._processDirectory(ctx, src_dir_or_file)
+                yield from self._processDirectory(ctx, src_dir_or_file)
             elif os.path.isfile(src_dir_or_file):
-                self._processFile(ctx, src_dir_or_file)
+                yield self._processFile(ctx, src_dir_or_file)
 
         else:
             # Process everything.
             for path, info in self.mounts.items():
-                ctx = _ProcessingContext(jobs, record, path, info)
+                ctx = _ProcessingContext(record, path, info)
                 logger.debug("Initiating processing pipeline on: %s" % path)
-                self._processDirectory(ctx, path)
+                yield from self._processDirectory(ctx, path)
 
     def _processDirectory(self, ctx, start_dir):
         for dirpath, dirnames, filenames in os.walk(start_dir):
@@ -229,7 +249,7 @@ class ProcessorPipeline(object):
             for filename in filenames:
                 if re_matchany(filename, self.ignore_patterns, rel_dirpath):
                     continue
-                self._processFile(ctx, os.path.join(dirpath, filename))
+                yield self._processFile(ctx, os.path.join(dirpath, filename))
 
     def _processFile(self, ctx, path):
         # TODO: handle overrides between mount-points.
@@ -241,14 +261,17 @@ class ProcessorPipeline(object):
         force_this = (self.force or previous_entry is None or
                       not previous_entry.was_processed_successfully)
 
+        prev_hashes = None
+        if self.use_content_hash and previous_entry is not None:
+            prev_hashes = previous_entry.content_hashes
+
         job = ProcessingWorkerJob(ctx.base_dir, ctx.mount_info, path,
-                                  force=force_this)
-        ctx.jobs.append(job)
+                                  force=force_this,
+                                  previous_content_hashes=prev_hashes)
+        return job
 
-    def _createWorkerPool(self):
-        from piecrust.workerpool import WorkerPool
-        from piecrust.processing.worker import (
-                ProcessingWorkerContext, ProcessingWorker)
+    def createWorkerContext(self):
+        from piecrust.processing.worker import ProcessingWorkerContext
 
         ctx = ProcessingWorkerContext(
                 self.app.root_dir, self.out_dir, self.tmp_dir,
@@ -258,7 +281,13 @@ class ProcessorPipeline(object):
             ctx.additional_processors = [
                     proc_fac()
                     for proc_fac in self.additional_processors_factories]
+        return ctx
+
+    def _createWorkerPool(self):
+        from piecrust.workerpool import WorkerPool
+        from piecrust.processing.worker import ProcessingWorker
 
+        ctx = self.createWorkerContext()
         pool = WorkerPool(
                 worker_class=ProcessingWorker,
                 initargs=(ctx,))
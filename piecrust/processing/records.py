@@ -4,7 +4,7 @@ from piecrust.records import Record, TransitionalRecord
 
 
 class ProcessorPipelineRecord(Record):
-    RECORD_VERSION = 5
+    RECORD_VERSION = 6
 
     def __init__(self):
         super(ProcessorPipelineRecord, self).__init__()
@@ -33,6 +33,7 @@ class ProcessorPipelineRecordEntry(object):
         self.flags = FLAG_NONE
         self.rel_outputs = []
         self.proc_tree = None
+        self.content_hashes = None
         self.errors = []
 
     @property
@@ -3,6 +3,7 @@ import time
 import os.path
 import logging
 from piecrust.chefutil import format_timed
+from piecrust.hashutil import get_file_hash_info, is_same_content
 
 
 logger = logging.getLogger(__name__)
@@ -119,12 +120,19 @@ class ProcessingTreeBuilder(object):
 
 
 class ProcessingTreeRunner(object):
-    def __init__(self, base_dir, tmp_dir, out_dir):
+    def __init__(self, base_dir, tmp_dir, out_dir, *,
+                 use_content_hash=False, previous_content_hashes=None):
         self.base_dir = base_dir
         self.tmp_dir = tmp_dir
         self.out_dir = out_dir
+        self.use_content_hash = use_content_hash
+        self.previous_content_hashes = previous_content_hashes
+        self.content_hashes = None
 
     def processSubTree(self, tree_root):
+        if self.use_content_hash:
+            self._computeContentHashes(tree_root)
+
         did_process = False
         walk_stack = [tree_root]
         while len(walk_stack) > 0:
@@ -230,11 +238,20 @@ class ProcessingTreeRunner(object):
         else:
             # Get paths and modification times for the outputs.
             message = None
+            compare_hashes = (node.level == 0 and
+                              self.content_hashes is not None)
+            if compare_hashes and not self._areContentHashesUnchanged():
+                message = "Input '%s' or its dependencies changed." % (
+                        node.path)
             for o in node.outputs:
+                if message is not None:
+                    break
                 full_out_path = self._getNodePath(o)
                 if not os.path.isfile(full_out_path):
                     message = "Output '%s' doesn't exist." % o.path
                     break
+                if compare_hashes:
+                    continue
                 o_mtime = os.path.getmtime(full_out_path)
                 if o_mtime < in_mtime[1]:
                     message = "Input '%s' is newer than output '%s'." % (
@@ -252,6 +269,35 @@ class ProcessingTreeRunner(object):
                                   "Computed node dirtyness: %s" % state,
                                   indent_level=node.level, colored=False))
 
+    def _computeContentHashes(self, tree_root):
+        # Hash the input file and its dependencies, re-using the previous
+        # hashes for files that didn't change size or modification time.
+        prev_hashes = self.previous_content_hashes or {}
+        full_path = self._getNodePath(tree_root)
+        paths = [full_path]
+        proc = tree_root.getProcessor()
+        try:
+            if not proc.is_bypassing_structured_processing:
+                deps = proc.getDependencies(full_path)
+                if deps is not None and deps != FORCE_BUILD:
+                    paths += list(deps)
+            self.content_hashes = {
+                    p: get_file_hash_info(p, prev_hashes.get(p))
+                    for p in paths}
+        except Exception as e:
+            logger.debug("Can't compute content hashes for '%s': %s" %
+                         (full_path, e))
+            self.content_hashes = None
+
+    def _areContentHashesUnchanged(self):
+        prev_hashes = self.previous_content_hashes
+        if not prev_hashes or prev_hashes.keys() != self.content_hashes.keys():
+            return False
+        for p, hash_info in self.content_hashes.items():
+            if not is_same_content(hash_info, prev_hashes[p]):
+                return False
+        return True
+
     def _getNodeBaseDir(self, node):
         if node.level == 0:
             return self.base_dir
@@ -3,6 +3,7 @@ import os.path
 import time
 import logging
 from piecrust.app import PieCrust
+from piecrust.hashutil import uses_content_hash
 from piecrust.processing.base import PipelineContext
 from piecrust.processing.records import (
         FLAG_NONE, FLAG_PREPARED, FLAG_PROCESSED,
@@ -36,11 +37,13 @@ class ProcessingWorkerContext(object):
 
 
 class ProcessingWorkerJob(object):
-    def __init__(self, base_dir, mount_info, path, *, force=False):
+    def __init__(self, base_dir, mount_info, path, *, force=False,
+                 previous_content_hashes=None):
         self.base_dir = base_dir
         self.mount_info = mount_info
         self.path = path
         self.force = force
+        self.previous_content_hashes = previous_content_hashes
 
 
 class ProcessingWorkerResult(object):
@@ -49,6 +52,7 @@ class ProcessingWorkerResult(object):
         self.flags = FLAG_NONE
         self.proc_tree = None
         self.rel_outputs = None
+        self.content_hashes = None
         self.errors = None
 
 
@@ -63,9 +67,20 @@ class ProcessingWorker(IWorker):
         app.env.registerTimer("PipelineWorker_%d_Total" % self.wid)
         app.env.registerTimer("PipelineWorkerInit")
         app.env.registerTimer("JobReceive")
+        self.setupPipeline(app)
+        app.env.stepTimerSince("PipelineWorkerInit", self.work_start_time)
+
+    def setupPipeline(self, app):
+        """ Sets up the processors and runs the pre-processing step for
+            the given app. This is called by `initialize`, but also by
+            workers that host the asset pipeline alongside other jobs, and
+            already have an app ready.
+        """
         app.env.registerTimer('BuildProcessingTree')
         app.env.registerTimer('RunProcessingTree')
         self.app = app
+        self.use_content_hash = uses_content_hash(app)
+        self.is_pipeline_ended = False
 
         processors = app.plugin_loader.getProcessors()
         if self.ctx.enabled_processors:
@@ -92,8 +107,6 @@ class ProcessingWorker(IWorker):
         # patching the processors with some new ones.
         processors.sort(key=lambda p: p.priority)
 
-        app.env.stepTimerSince("PipelineWorkerInit", self.work_start_time)
-
     def process(self, job):
         result = ProcessingWorkerResult(job.path)
 
@@ -125,9 +138,12 @@ class ProcessingWorker(IWorker):
         try:
             with self.app.env.timerScope('RunProcessingTree'):
                 runner = ProcessingTreeRunner(
-                        job.base_dir, self.ctx.tmp_dir, self.ctx.out_dir)
+                        job.base_dir, self.ctx.tmp_dir, self.ctx.out_dir,
+                        use_content_hash=self.use_content_hash,
+                        previous_content_hashes=job.previous_content_hashes)
                 if runner.processSubTree(tree_root):
                     result.flags |= FLAG_PROCESSED
+                result.content_hashes = runner.content_hashes
         except ProcessingTreeError as ex:
             if isinstance(ex, ProcessorError):
                 ex = ex.__cause__
@@ -137,11 +153,7 @@ class ProcessingWorker(IWorker):
         return result
 
     def getReport(self):
-        # Invoke post-processors.
-        pipeline_ctx = PipelineContext(self.wid, self.app, self.ctx.out_dir,
-                                       self.ctx.tmp_dir, self.ctx.force)
-        for proc in self.processors:
-            proc.onPipelineEnd(pipeline_ctx)
+        self.endPipeline()
 
         self.app.env.stepTimerSince("PipelineWorker_%d_Total" % self.wid,
                                     self.work_start_time)
@@ -149,6 +161,17 @@ class ProcessingWorker(IWorker):
                 'type': 'timers',
                 'data': self.app.env._timers}
 
+    def endPipeline(self):
+        if self.is_pipeline_ended:
+            return
+        self.is_pipeline_ended = True
+
+        # Invoke post-processors.
+        pipeline_ctx = PipelineContext(self.wid, self.app, self.ctx.out_dir,
+                                       self.ctx.tmp_dir, self.ctx.force)
+        for proc in self.processors:
+            proc.onPipelineEnd(pipeline_ctx)
+
 
 def get_filtered_processors(processors, authorized_names):
     if not authorized_names or authorized_names == 'all':
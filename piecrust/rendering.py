@@ -31,6 +31,7 @@ class QualifiedPage(object):
         self.page = page
         self.route = route
         self.route_metadata = route_metadata
+        self.pagination_sequences = {}
 
     def getUri(self, sub_num=1):
         return self.route.getUri(self.route_metadata, sub_num=sub_num)
@@ -77,25 +78,47 @@ RENDER_PASSES = [PASS_FORMATTING, PASS_RENDERING]
 
 
 class RenderPassInfo(object):
+    """ Information about what a page used during a rendering pass.
+
+        The `used_templates` attribute is a set of template names, or
+        `None` if the template engine(s) used during the pass can't tell
+        what templates they loaded.
+    """
     def __init__(self):
         self.used_source_names = set()
         self.used_taxonomy_terms = set()
+        self.used_templates = set()
         self.used_pagination = False
         self.pagination_has_more = False
         self.used_assets = False
 
+    def addUsedTemplate(self, name):
+        if self.used_templates is not None:
+            self.used_templates.add(name)
+
+    def addUsedTemplates(self, other):
+        if self.used_templates is None or other.used_templates is None:
+            self.used_templates = None
+        else:
+            self.used_templates |= other.used_templates
+
     def merge(self, other):
         self.used_source_names |= other.used_source_names
         self.used_taxonomy_terms |= other.used_taxonomy_terms
+        self.addUsedTemplates(other)
         self.used_pagination = self.used_pagination or other.used_pagination
         self.pagination_has_more = (self.pagination_has_more or
                                     other.pagination_has_more)
         self.used_assets = self.used_assets or other.used_assets
 
     def _toJson(self):
+        used_templates = None
+        if self.used_templates is not None:
+            used_templates = list(self.used_templates)
         data = {
                 'used_source_names': list(self.used_source_names),
                 'used_taxonomy_terms': list(self.used_taxonomy_terms),
+                'used_templates': used_templates,
                 'used_pagination': self.used_pagination,
                 'pagination_has_more': self.pagination_has_more,
                 'used_assets': self.used_assets}
@@ -111,6 +134,11 @@ class RenderPassInfo(object):
             if isinstance(terms, list):
                 terms = tuple(terms)
             rpi.used_taxonomy_terms.add((i[0], i[1], terms))
+        used_templates = data.get('used_templates')
+        if used_templates is not None:
+            rpi.used_templates = set(used_templates)
+        else:
+            rpi.used_templates = None
         rpi.used_pagination = data['used_pagination']
         rpi.pagination_has_more = data['pagination_has_more']
         rpi.used_assets = data['used_assets']
@@ -198,8 +226,27 @@ class HasTaxonomyTermsFilterClause(SettingFilterClause):
         self._taxonomy = taxonomy
         self._slugifier = slugifier
         self._is_combination = isinstance(self.value, tuple)
+        self._index_matches = {}
+
+    def getSignature(self):
+        return (type(self).__name__, self._taxonomy.name, self.value,
+                self._slugifier)
+
+    def getIndexMatches(self, fil, index):
+        if not index.isIndexed(self.name):
+            return None
+        return index.getTaxonomyTermEntries(
+                self._taxonomy, self.value, self._slugifier)
 
     def pageMatches(self, fil, page):
+        # Use the page's source index if we can, so we don't have to get
+        # and slugify the terms of each page.
+        matches = self._getIndexMatchSet(page.source)
+        if matches is not None:
+            entry = page.source.getPageIndex().getEntry(page.rel_path)
+            if entry is not None:
+                return entry in matches
+
         if self._taxonomy.is_multiple:
             # Multiple taxonomy, i.e. it supports multiple terms, like tags.
             page_values = fil.value_accessor(page, self.name)
@@ -228,6 +275,18 @@ class HasTaxonomyTermsFilterClause(SettingFilterClause):
             page_value = self._slugifier(page_value)
         return page_value == self.value
 
+    def _getIndexMatchSet(self, source):
+        try:
+            return self._index_matches[source.name]
+        except KeyError:
+            pass
+
+        matches = self.getIndexMatches(None, source.getPageIndex())
+        if matches is not None:
+            matches = set(matches)
+        self._index_matches[source.name] = matches
+        return matches
+
 
 def render_page(ctx):
     eis = ctx.app.env.exec_info_stack
@@ -342,11 +401,18 @@ def _do_render_page_segments(page, page_data):
     format_name = page.config.get('format')
 
     engine = get_template_engine(app, engine_name)
+    pass_info = cpi.render_ctx.render_passes.get(PASS_FORMATTING)
+    if not engine.TRACKS_USED_TEMPLATES:
+        pass_info.used_templates = None
 
     formatted_segments = {}
     for seg_name, seg in page.raw_content.items():
         seg_text = ''
         for seg_part in seg.parts:
+            if seg_part.formatted is not None:
+                seg_text += seg_part.formatted
+                continue
+
             part_format = seg_part.fmt or format_name
             try:
                 with app.env.timerScope(engine.__class__.__name__):
@@ -367,7 +433,6 @@ def _do_render_page_segments(page, page_data):
                 content_abstract = seg_text[:offset]
                 formatted_segments['content.abstract'] = content_abstract
 
-    pass_info = cpi.render_ctx.render_passes.get(PASS_FORMATTING)
     res = {
             'segments': formatted_segments,
             'pass_info': pass_info._toJson()}
@@ -392,6 +457,9 @@ def _do_render_layout(layout_name, page, layout_data):
     _, engine_name = os.path.splitext(full_names[0])
     engine_name = engine_name.lstrip('.')
     engine = get_template_engine(page.app, engine_name)
+    pass_info = cpi.render_ctx.render_passes.get(PASS_RENDERING)
+    if not engine.TRACKS_USED_TEMPLATES:
+        pass_info.used_templates = None
 
     try:
         output = engine.renderFile(full_names, layout_data)
@@ -400,7 +468,6 @@ def _do_render_layout(layout_name, page, layout_data):
         msg += "Looked for: %s" % ', '.join(full_names)
         raise Exception(msg) from ex
 
-    pass_info = cpi.render_ctx.render_passes.get(PASS_RENDERING)
     res = {'content': output, 'pass_info': pass_info._toJson()}
     return res
 
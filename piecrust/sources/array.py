@@ -1,4 +1,4 @@
-from piecrust.sources.base import PageSource
+from piecrust.sources.base import PageSource, build_pages
 from piecrust.sources.mixins import SimplePaginationSourceMixin
 from piecrust.sources.pageref import PageRef
 
@@ -38,6 +38,17 @@ class ArraySource(PageSource, SimplePaginationSourceMixin):
     def page_count(self):
         return len(self.inner_source)
 
+    def getPages(self):
+        # These pages were already built, so there's no need for an index.
+        return build_pages(self.app, self.getPageFactories())
+
+    def getPagesMatching(self, pagination_filter):
+        return self.getPages()
+
+    def getPagesByDate(self, reverse=False):
+        return sorted(self.getPages(), key=lambda p: p.datetime,
+                      reverse=reverse)
+
     def getPageFactories(self):
         for p in self.inner_source:
             yield CachedPageFactory(p)
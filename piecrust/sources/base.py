@@ -3,6 +3,7 @@ import logging
 from werkzeug.utils import cached_property
 from piecrust.configuration import ConfigurationError
 from piecrust.page import Page
+from piecrust.sources.pageindex import load_page_index
 
 
 REALM_USER = 0
@@ -74,6 +75,9 @@ class PageSource(object):
         self.config = config or {}
         self.config.setdefault('realm', REALM_USER)
         self._factories = None
+        self._page_index = None
+        self.sorted_items_cache = {}
+        self.listing_cache = {}
         self._provider_type = None
 
     def __getattr__(self, name):
@@ -93,7 +97,13 @@ class PageSource(object):
         return self.app.root_dir
 
     def getPages(self):
-        return build_pages(self.app, self.getPageFactories())
+        return self.getPageIndex().getPages()
+
+    def getPagesMatching(self, pagination_filter):
+        return self.getPageIndex().getPagesMatching(pagination_filter)
+
+    def getPagesByDate(self, reverse=False):
+        return self.getPageIndex().getPagesByDate(reverse)
 
     def getPage(self, metadata):
         factory = self.findPageFactory(metadata, MODE_PARSING)
@@ -109,6 +119,11 @@ class PageSource(object):
     def buildPageFactories(self):
         raise NotImplementedError()
 
+    def getPageIndex(self):
+        if self._page_index is None:
+            self._page_index = load_page_index(self)
+        return self._page_index
+
     def resolveRef(self, ref_path):
         """ Returns the full path and source metadata given a source
             (relative) path, like a ref-spec.
@@ -1,6 +1,7 @@
 import os.path
 import logging
 from piecrust import osutil
+from piecrust.assetindex import is_assets_dirname
 from piecrust.sources.base import (
         PageFactory, PageSource, InvalidFileSystemEndpointError,
         MODE_CREATING)
@@ -32,6 +33,8 @@ class DefaultPageSource(PageSource, IListableSource, IPreparingSource,
         self.supported_extensions = list(
                 app.config.get('site/auto_formats').keys())
         self.default_auto_format = app.config.get('site/default_auto_format')
+        self._page_dirs = []
+        self._listing_tree = None
 
     def buildPageFactories(self):
         logger.debug("Scanning for pages in: %s" % self.fs_endpoint_path)
@@ -41,9 +44,28 @@ class DefaultPageSource(PageSource, IListableSource, IPreparingSource,
             raise InvalidFileSystemEndpointError(self.name,
                                                  self.fs_endpoint_path)
 
+        asset_index = self.app.env.asset_index
+        self._page_dirs = []
         for dirpath, dirnames, filenames in osutil.walk(self.fs_endpoint_path):
+            # Asset folders are walked too, but only to record their files
+            # in the asset index.
+            if is_assets_dirname(dirpath) and dirpath != self.fs_endpoint_path:
+                asset_index.addAssetsDirectory(dirpath, filenames)
+                dirnames[:] = []
+                continue
+
+            asset_index.addScannedDirectory(dirpath, dirnames)
             rel_dirpath = os.path.relpath(dirpath, self.fs_endpoint_path)
-            dirnames[:] = list(filter(filter_page_dirname, dirnames))
+            dirnames[:] = [d for d in dirnames
+                           if filter_page_dirname(d) or
+                           (is_assets_dirname(d) and d[0] != '.')]
+
+            # Remember the page directories, even those without any pages,
+            # for `listPath`.
+            for d in dirnames:
+                if filter_page_dirname(d):
+                    rel_subdir = os.path.normpath(os.path.join(rel_dirpath, d))
+                    self._page_dirs.append(rel_subdir.replace('\\', '/'))
             for f in sorted(filter(filter_page_filename, filenames)):
                 fac_path = f
                 if rel_dirpath != '.':
@@ -94,31 +116,42 @@ class DefaultPageSource(PageSource, IListableSource, IPreparingSource,
         return None
 
     def listPath(self, rel_path):
-        rel_path = rel_path.lstrip('\\/')
-        path = os.path.join(self.fs_endpoint_path, rel_path)
-        names = sorted(osutil.listdir(path))
-        items = []
-        for name in names:
-            if os.path.isdir(os.path.join(path, name)):
-                if filter_page_dirname(name):
-                    rel_subdir = os.path.join(rel_path, name)
-                    items.append((True, name, rel_subdir))
-            else:
-                if filter_page_filename(name):
-                    slug = self._makeSlug(os.path.join(rel_path, name))
-                    metadata = {'slug': slug}
-
-                    fac_path = name
-                    if rel_path != '.':
-                        fac_path = os.path.join(rel_path, name)
-                    fac_path = fac_path.replace('\\', '/')
-
-                    self._populateMetadata(fac_path, metadata)
-                    fac = PageFactory(self, fac_path, metadata)
-
-                    name, _ = os.path.splitext(name)
-                    items.append((False, name, fac))
-        return items
+        rel_path = rel_path.strip('\\/')
+        if rel_path == '.':
+            rel_path = ''
+        return list(self._getListingTree().get(rel_path, []))
+
+    def _getListingTree(self):
+        # The directory listings are built once from the page factories,
+        # and the directories we found while scanning for them, instead of
+        # listing the file-system each time a page needs its siblings or
+        # children.
+        if self._listing_tree is not None:
+            return self._listing_tree
+
+        tree = {'': []}
+        factories = self.getPageFactories()
+        for dir_path in self._page_dirs:
+            self._addListingDir(tree, dir_path)
+        for fac in factories:
+            dir_path, filename = os.path.split(fac.rel_path)
+            name, _ = os.path.splitext(filename)
+            self._addListingDir(tree, dir_path)
+            tree[dir_path].append((filename, (False, name, fac)))
+
+        self._listing_tree = {}
+        for dir_path, items in tree.items():
+            items.sort(key=lambda i: i[0])
+            self._listing_tree[dir_path] = [i for _, i in items]
+        return self._listing_tree
+
+    def _addListingDir(self, tree, dir_path):
+        if dir_path in tree:
+            return
+        tree[dir_path] = []
+        parent_path, name = os.path.split(dir_path)
+        self._addListingDir(tree, parent_path)
+        tree[parent_path].append((name, (True, name, dir_path)))
 
     def getDirpath(self, rel_path):
         return os.path.dirname(rel_path)
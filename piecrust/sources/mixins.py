@@ -1,7 +1,9 @@
 import os
 import os.path
 import logging
-from piecrust.data.filters import PaginationFilter, page_value_accessor
+from piecrust.data.filters import get_config_filter, page_value_accessor
+from piecrust.data.iterators import (
+        get_iterator_signature, sort_iterator_items)
 from piecrust.data.paginationdata import PaginationData
 from piecrust.sources.base import PageFactory
 from piecrust.sources.interfaces import IPaginationSource, IListableSource
@@ -22,6 +24,15 @@ class SourceFactoryIterator(object):
     def __iter__(self):
         return self.source.getPages()
 
+    def iterMatching(self, pagination_filter):
+        return self.source.getPagesMatching(pagination_filter)
+
+    def iterByDate(self, reverse=False):
+        return self.source.getPagesByDate(reverse)
+
+    def getSignature(self):
+        return ('all',)
+
 
 class SourceFactoryWithoutTaxonomiesIterator(object):
     def __init__(self, source):
@@ -31,8 +42,21 @@ class SourceFactoryWithoutTaxonomiesIterator(object):
         self.it = None
 
     def __iter__(self):
+        return self._iterPages(self.source.getPages())
+
+    def iterMatching(self, pagination_filter):
+        return self._iterPages(
+                self.source.getPagesMatching(pagination_filter))
+
+    def iterByDate(self, reverse=False):
+        return self._iterPages(self.source.getPagesByDate(reverse))
+
+    def getSignature(self):
+        return ('no_taxonomies',)
+
+    def _iterPages(self, pages):
         self._cacheTaxonomyPages()
-        for p in self.source.getPages():
+        for p in pages:
             if p.rel_path in self._taxonomy_pages:
                 continue
             yield p
@@ -58,8 +82,23 @@ class DateSortIterator(object):
         self.reverse = reverse
 
     def __iter__(self):
-        return iter(sorted(self.it,
-                           key=lambda x: x.datetime, reverse=self.reverse))
+        return iter(sort_iterator_items(self.it, 'datetime',
+                                        reverse=self.reverse,
+                                        sort_func=self._sort))
+
+    def _sort(self, it):
+        # Source iterators can sort their pages using the date column of
+        # the source's page index.
+        iter_by_date = getattr(it, 'iterByDate', None)
+        if iter_by_date is not None:
+            return list(iter_by_date(self.reverse))
+        return sorted(it, key=lambda x: x.datetime, reverse=self.reverse)
+
+    def getSignature(self):
+        inner_sig = get_iterator_signature(self.it)
+        if inner_sig is None:
+            return None
+        return ('datetime', self.reverse, inner_sig)
 
 
 class PaginationDataBuilderIterator(object):
@@ -98,9 +137,7 @@ class SimplePaginationSourceMixin(IPaginationSource):
         if conf == 'none' or conf == 'nil' or conf == '':
             conf = None
         if conf is not None:
-            f = PaginationFilter(value_accessor=page_value_accessor)
-            f.addClausesFromConfig(conf)
-            return f
+            return get_config_filter(conf, page_value_accessor)
         return None
 
     def getSettingAccessor(self):
@@ -0,0 +1,299 @@
+import os.path
+import sys
+import time
+import array
+import logging
+import datetime
+from piecrust.fastpickle import pickle, unpickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+logger = logging.getLogger(__name__)
+
+
+PAGE_INDEX_VERSION = 2
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def get_indexed_setting_names(app):
+    """ Returns the names of the page settings that are stored in the
+        page indexes: all the taxonomy settings, plus whatever the site
+        configuration asks for.
+    """
+    names = set(app.config.get('site/indexed_settings') or [])
+    for tax in app.taxonomies:
+        names.add(tax.setting_name)
+    return sorted(names)
+
+
+def make_index_entry(page, setting_names):
+    """ Returns what a page index stores about the given page, in a form
+        that can be sent between processes.
+    """
+    values = {}
+    for name in setting_names:
+        val = page.config.get(name)
+        if val is not None:
+            values[name] = val
+    return (page.rel_path, page.datetime, page.source_metadata.get('slug'),
+            values)
+
+
+def _to_timestamp(dt):
+    # Store naive date/times as microseconds so that they come back exactly
+    # the same, without any time zone conversion.
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _from_timestamp(ts):
+    return _EPOCH + datetime.timedelta(microseconds=ts)
+
+
+def _intern_value(val):
+    # Terms like tags and categories are repeated across many pages, so
+    # we make all pages share the same strings.
+    if isinstance(val, str):
+        return sys.intern(val)
+    if isinstance(val, list):
+        return [_intern_value(v) for v in val]
+    return val
+
+
+class PageIndexEntry(object):
+    """ A page in a page index. It only points to the index's columns.
+    """
+    __slots__ = ['index', 'position']
+
+    def __init__(self, index, position):
+        self.index = index
+        self.position = position
+
+    @property
+    def rel_path(self):
+        return self.index.rel_paths[self.position]
+
+    @property
+    def datetime(self):
+        return _from_timestamp(self.index.timestamps[self.position])
+
+    @property
+    def slug(self):
+        return self.index.slugs[self.position]
+
+    @property
+    def factory(self):
+        return self.index.factories[self.position]
+
+    @property
+    def values(self):
+        values = {}
+        for name, column in self.index.columns.items():
+            val = column[self.position]
+            if val is not None:
+                values[name] = val
+        return values
+
+    def getValue(self, name):
+        return self.index.columns[name][self.position]
+
+    def buildPage(self):
+        page = self.factory.buildPage()
+        page.datetime = self.datetime
+        return page
+
+
+class PageIndex(object):
+    """ The dates, slugs and indexed settings of all the pages in a source,
+        so that listings, archives and filters don't need to load every
+        page's configuration.
+
+        Everything is stored in columns, with one item per page, instead of
+        in one object per page.
+    """
+    def __init__(self, source, setting_names, rel_paths, timestamps, slugs,
+                 columns):
+        self.source = source
+        self.setting_names = setting_names
+        self.rel_paths = rel_paths
+        self.timestamps = timestamps
+        self.slugs = slugs
+        self.columns = columns
+        self.factories = None
+        self.entries = [PageIndexEntry(self, i)
+                        for i in range(len(rel_paths))]
+        self._positions = {p: i for i, p in enumerate(rel_paths)}
+        self._date_orders = {}
+        self._term_indexes = {}
+
+    def isIndexed(self, setting_name):
+        return setting_name in self.columns
+
+    def getEntry(self, rel_path):
+        pos = self._positions.get(rel_path)
+        if pos is None:
+            return None
+        return self.entries[pos]
+
+    def getPages(self):
+        for entry in self.entries:
+            yield entry.buildPage()
+
+    def getPagesByDate(self, reverse=False):
+        for pos in self.getDateOrder(reverse):
+            yield self.entries[pos].buildPage()
+
+    def getPagesMatching(self, pagination_filter):
+        """ Returns the pages that may match the given filter. This is all
+            the pages, unless the filter can narrow them down with this
+            index.
+        """
+        entries = pagination_filter.getIndexMatches(self)
+        if entries is None:
+            entries = self.entries
+        for entry in entries:
+            yield entry.buildPage()
+
+    def getDateOrder(self, reverse=False):
+        """ Returns the positions of the pages sorted by date. Pages with
+            the same date stay in the order of the source.
+        """
+        order = self._date_orders.get(reverse)
+        if order is None:
+            order = self.sortByDate(range(len(self.rel_paths)), reverse)
+            self._date_orders[reverse] = order
+        return order
+
+    def sortByDate(self, positions, reverse=False):
+        timestamps = self.timestamps
+        if numpy is not None:
+            positions = numpy.fromiter(positions, dtype=numpy.int64)
+            keys = numpy.frombuffer(timestamps, dtype=numpy.int64)[positions]
+            if reverse:
+                keys = -keys
+            return positions[numpy.argsort(keys, kind='mergesort')].tolist()
+        return sorted(positions, key=timestamps.__getitem__, reverse=reverse)
+
+    def getTaxonomyTermEntries(self, taxonomy, term, slugifier=None):
+        """ Returns the entries of the pages that have the given taxonomy
+            term, most recent first. If `term` is a tuple, the pages must
+            have all of those terms. If a `slugifier` is given, it's used on
+            the pages' terms before comparing them.
+        """
+        term_index = self._getTermIndex(taxonomy, slugifier)
+        if not isinstance(term, tuple):
+            return [self.entries[p] for p in term_index.get(term, [])]
+
+        if not taxonomy.is_multiple or not term:
+            return []
+        term_positions = [term_index.get(t, []) for t in term]
+        smallest = min(term_positions, key=len)
+        others = [set(p) for p in term_positions if p is not smallest]
+        return [self.entries[p] for p in smallest
+                if all([p in o for o in others])]
+
+    def _getTermIndex(self, taxonomy, slugifier):
+        key = (taxonomy.name, slugifier)
+        term_index = self._term_indexes.get(key)
+        if term_index is not None:
+            return term_index
+
+        term_index = {}
+        column = self.columns.get(taxonomy.setting_name, [])
+        for pos, values in enumerate(column):
+            if values is None:
+                continue
+            if taxonomy.is_multiple:
+                if not isinstance(values, list):
+                    continue
+            elif isinstance(values, (list, dict)):
+                continue
+            else:
+                values = [values]
+
+            if slugifier is not None:
+                values = map(slugifier, values)
+            for val in set(values):
+                term_index.setdefault(val, []).append(pos)
+
+        for term, positions in term_index.items():
+            term_index[term] = self.sortByDate(positions, reverse=True)
+        self._term_indexes[key] = term_index
+        return term_index
+
+
+def _get_cache_key(source):
+    return 'index:%s' % source.name
+
+
+def load_page_index(source):
+    """ Loads the page index for the given source from the cache, or builds
+        it by loading all the source's pages if the cache isn't valid.
+    """
+    app = source.app
+    setting_names = get_indexed_setting_names(app)
+    factories = source.getPageFactories()
+
+    cache = app.cache.getPackedCache('pages')
+    cache_key = _get_cache_key(source)
+    mtimes = [os.path.getmtime(f.path) for f in factories]
+    if cache.isValid(cache_key, mtimes):
+        data = unpickle(cache.read(cache_key).encode('utf8'))
+        if (data['version'] == PAGE_INDEX_VERSION and
+                data['settings'] == setting_names and
+                data['rel_paths'] == [f.rel_path for f in factories]):
+            logger.debug("Loaded page index for source: %s" % source.name)
+            return _make_page_index(
+                    source, setting_names, data['rel_paths'],
+                    data['timestamps'], data['slugs'], data['columns'])
+
+    logger.debug("Building page index for source: %s" % source.name)
+    build_time = time.time()
+    entries = [make_index_entry(f.buildPage(), setting_names)
+               for f in factories]
+    return save_page_index(source, entries, build_time)
+
+
+def save_page_index(source, entries, build_time):
+    """ Writes the given index entries to the cache, and returns the index
+        made from them. `build_time` must be earlier than when the pages
+        were loaded, so that the index is invalidated if any of them
+        changes afterwards.
+    """
+    setting_names = get_indexed_setting_names(source.app)
+    rel_paths = [e[0] for e in entries]
+    timestamps = [_to_timestamp(e[1]) for e in entries]
+    slugs = [e[2] for e in entries]
+    columns = {}
+    for name in setting_names:
+        columns[name] = [e[3].get(name) for e in entries]
+
+    data = {
+            'version': PAGE_INDEX_VERSION,
+            'settings': setting_names,
+            'rel_paths': rel_paths,
+            'timestamps': timestamps,
+            'slugs': slugs,
+            'columns': columns}
+    cache = source.app.cache.getPackedCache('pages')
+    cache.write(_get_cache_key(source), pickle(data).decode('utf8'),
+                build_time)
+    return _make_page_index(source, setting_names, rel_paths, timestamps,
+                            slugs, columns)
+
+
+def _make_page_index(source, setting_names, rel_paths, timestamps, slugs,
+                     columns):
+    index = PageIndex(
+            source, setting_names,
+            rel_paths,
+            array.array('q', timestamps),
+            [_intern_value(s) for s in slugs],
+            {n: [_intern_value(v) for v in c] for n, c in columns.items()})
+    index.factories = source.getPageFactories()
+    return index
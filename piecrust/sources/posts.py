@@ -183,7 +183,9 @@ class FlatPostsSource(PostsSource):
             return
         logger.debug("Scanning for posts (flat) in: %s" % self.fs_endpoint_path)
         pattern = re.compile(r'(\d{4})-(\d{2})-(\d{2})_(.*)\.(\w+)$')
-        _, __, filenames = next(osutil.walk(self.fs_endpoint_path))
+        _, dirnames, filenames = next(osutil.walk(self.fs_endpoint_path))
+        self.app.env.asset_index.addScannedDirectory(self.fs_endpoint_path,
+                                                     dirnames)
         for f in filenames:
             match = pattern.match(f)
             if match is None:
@@ -222,7 +224,8 @@ class ShallowPostsSource(PostsSource):
             year = int(yd)
             year_dir = os.path.join(self.fs_endpoint_path, yd)
 
-            _, __, filenames = next(osutil.walk(year_dir))
+            _, dirnames, filenames = next(osutil.walk(year_dir))
+            self.app.env.asset_index.addScannedDirectory(year_dir, dirnames)
             for f in filenames:
                 match = file_pattern.match(f)
                 if match is None:
@@ -264,7 +267,9 @@ class HierarchyPostsSource(PostsSource):
                 month = int(md)
                 month_dir = os.path.join(year_dir, md)
 
-                _, __, filenames = next(osutil.walk(month_dir))
+                _, dirnames, filenames = next(osutil.walk(month_dir))
+                self.app.env.asset_index.addScannedDirectory(month_dir,
+                                                             dirnames)
                 for f in filenames:
                     match = file_pattern.match(f)
                     if match is None:
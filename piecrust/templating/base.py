@@ -24,9 +24,21 @@ class TemplatingError(Exception):
 class TemplateEngine(object):
     EXTENSIONS = []
 
+    # Engines that report the templates they load to the current rendering
+    # pass should set this to `True`. Pages rendered with other engines will
+    # be re-baked whenever any template changes.
+    TRACKS_USED_TEMPLATES = False
+
     def initialize(self, app):
         self.app = app
 
+    def needsRender(self, txt):
+        """ Returns whether the given page contents have any markup for
+            this engine. Parts of pages that don't are formatted when the
+            page is loaded, and never go through the engine.
+        """
+        return True
+
     def renderSegmentPart(self, path, seg_part, data):
         raise NotImplementedError()
 
@@ -1,11 +1,15 @@
+import os
 import re
 import time
+import hashlib
 import os.path
 import logging
 import threading
 import email.utils
 import strict_rfc3339
+import repoze.lru
 from jinja2 import Environment, FileSystemLoader, TemplateNotFound
+from jinja2.bccache import FileSystemBytecodeCache
 from jinja2.exceptions import TemplateSyntaxError
 from jinja2.ext import Extension, Markup
 from jinja2.lexer import Token, describe_token
@@ -26,25 +30,31 @@ from piecrust.uriutil import multi_replace, split_sub_uri
 logger = logging.getLogger(__name__)
 
 
+SEGMENT_PARTS_CACHE_SIZE = 64
+
+
 class JinjaTemplateEngine(TemplateEngine):
     # Name `twig` is for backwards compatibility with PieCrust 1.x.
     ENGINE_NAMES = ['jinja', 'jinja2', 'j2', 'twig']
     EXTENSIONS = ['html', 'jinja', 'jinja2', 'j2', 'twig']
+    TRACKS_USED_TEMPLATES = True
 
     def __init__(self):
         self.env = None
 
+    def needsRender(self, txt):
+        return _string_needs_render(txt)
+
     def renderSegmentPart(self, path, seg_part, data):
         self._ensureLoaded()
 
         if not _string_needs_render(seg_part.content):
             return seg_part.content
 
-        part_path = _make_segment_part_path(path, seg_part.offset)
-        self.env.loader.segment_parts_cache[part_path] = (
-                path, seg_part.content)
+        part_name = _make_segment_part_name(seg_part.content)
+        self.env.loader.segment_parts_cache.put(part_name, seg_part.content)
         try:
-            tpl = self.env.get_template(part_path)
+            tpl = self.env.get_template(part_name)
         except TemplateSyntaxError as tse:
             raise self._getTemplatingError(tse, filename=path)
         except TemplateNotFound:
@@ -74,7 +84,9 @@ class JinjaTemplateEngine(TemplateEngine):
             except TemplateSyntaxError as tse:
                 raise self._getTemplatingError(tse)
             except TemplateNotFound:
-                pass
+                # Remember we looked for this template, because if it gets
+                # created later, it will be used instead of the next one.
+                self.env.addUsedTemplate(p)
 
         if tpl is None:
             raise TemplateNotFoundError()
@@ -131,46 +143,82 @@ class JinjaTemplateEngine(TemplateEngine):
         logger.debug("Creating Jinja environment with folders: %s" %
                      self.app.templates_dirs)
         loader = PieCrustLoader(self.app.templates_dirs)
+        bytecode_cache = None
+        if self.app.cache.enabled:
+            bytecode_cache = PieCrustBytecodeCache(
+                    self.app, self.app.cache.getCache('templates').base_dir)
         self.env = PieCrustEnvironment(
                 self.app,
                 loader=loader,
-                extensions=extensions)
+                extensions=extensions,
+                bytecode_cache=bytecode_cache)
 
 
 def _string_needs_render(txt):
     index = txt.find('{')
     while index >= 0:
-        ch = txt[index + 1]
+        ch = txt[index + 1:index + 2]
         if ch == '{' or ch == '%':
             return True
         index = txt.find('{', index + 1)
     return False
 
 
-def _make_segment_part_path(path, start):
-    return '$part=%s:%d' % (path, start)
+def _make_segment_part_name(content):
+    # Segment parts are named after their contents, so that identical parts
+    # in different pages are only compiled once.
+    content_hash = hashlib.md5(content.encode('utf8')).hexdigest()
+    return '$part=%s' % content_hash
 
 
 class PieCrustLoader(FileSystemLoader):
     def __init__(self, searchpath, encoding='utf-8'):
         super(PieCrustLoader, self).__init__(searchpath, encoding)
-        self.segment_parts_cache = {}
+        # Compiled parts are kept by the Jinja environment, so we only
+        # need to remember the last few parts' contents.
+        self.segment_parts_cache = repoze.lru.LRUCache(
+                SEGMENT_PARTS_CACHE_SIZE)
 
     def get_source(self, environment, template):
         if template.startswith('$part='):
-            filename, seg_part = self.segment_parts_cache[template]
+            seg_part = self.segment_parts_cache.get(template)
+            if seg_part is None:
+                raise TemplateNotFound(template)
+            # A part's name changes with its contents, so it never needs
+            # to be reloaded.
+            return seg_part, None, lambda: True
 
-            mtime = os.path.getmtime(filename)
+        return super(PieCrustLoader, self).get_source(environment, template)
 
-            def uptodate():
-                try:
-                    return os.path.getmtime(filename) == mtime
-                except OSError:
-                    return False
 
-            return seg_part, filename, uptodate
+class PieCrustBytecodeCache(FileSystemBytecodeCache):
+    """ Stores compiled templates in the website's cache, so that bake
+        workers and later bakes don't need to compile them again. Jinja
+        checks each cached template against a hash of its source.
+    """
+    def __init__(self, app, directory):
+        super(PieCrustBytecodeCache, self).__init__(directory, '%s.cache')
+        self.app = app
+        app.env.registerCounter('JinjaBytecodeCacheHit',
+                                raise_if_registered=False)
+        app.env.registerCounter('JinjaBytecodeCacheMiss',
+                                raise_if_registered=False)
+
+    def load_bytecode(self, bucket):
+        super(PieCrustBytecodeCache, self).load_bytecode(bucket)
+        if bucket.code is not None:
+            self.app.env.stepCounter('JinjaBytecodeCacheHit')
+        else:
+            self.app.env.stepCounter('JinjaBytecodeCacheMiss')
 
-        return super(PieCrustLoader, self).get_source(environment, template)
+    def dump_bytecode(self, bucket):
+        # Other workers may be reading the same template, so we write it
+        # to a temporary file first.
+        path = self._get_cache_filename(bucket)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as fp:
+            bucket.write_bytecode(fp)
+        os.replace(tmp_path, path)
 
 
 class PieCrustEnvironment(Environment):
@@ -246,6 +294,21 @@ class PieCrustEnvironment(Environment):
                                 "existing function or template data." %
                                 name)
 
+    def get_template(self, name, parent=None, globals=None):
+        tpl = super(PieCrustEnvironment, self).get_template(
+                name, parent, globals)
+        if not tpl.name.startswith('$part='):
+            self.addUsedTemplate(tpl.name)
+        return tpl
+
+    def addUsedTemplate(self, name):
+        cpi = self.app.env.exec_info_stack.current_page_info
+        if cpi is None or cpi.render_ctx is None:
+            return
+        pass_info = cpi.render_ctx.current_pass_info
+        if pass_info is not None:
+            pass_info.addUsedTemplate(name)
+
     def _paginate(self, value, items_per_page=5):
         cpi = self.app.env.exec_info_stack.current_page_info
         if cpi is None or cpi.page is None or cpi.render_ctx is None:
@@ -474,24 +537,37 @@ class PieCrustCacheExtension(Extension):
         # try to load the block from the cache
         # if there is no fragment in the cache, render it and store
         # it in the cache.
-        pair = self.environment.piecrust_cache.get(key)
-        if pair is not None:
-            rdr_pass.used_source_names.update(pair[1])
-            return pair[0]
+        entry = self.environment.piecrust_cache.get(key)
+        if entry is not None:
+            self._addUsed(rdr_pass, entry)
+            return entry[0]
 
         with self._lock:
-            pair = self.environment.piecrust_cache.get(key)
-            if pair is not None:
-                rdr_pass.used_source_names.update(pair[1])
-                return pair[0]
+            entry = self.environment.piecrust_cache.get(key)
+            if entry is not None:
+                self._addUsed(rdr_pass, entry)
+                return entry[0]
 
             prev_used = rdr_pass.used_source_names.copy()
+            prev_templates = rdr_pass.used_templates
+            if prev_templates is not None:
+                prev_templates = prev_templates.copy()
             rv = caller()
             after_used = rdr_pass.used_source_names.copy()
             used_delta = after_used.difference(prev_used)
-            self.environment.piecrust_cache[key] = (rv, used_delta)
+            templates_delta = set()
+            if prev_templates is not None:
+                templates_delta = rdr_pass.used_templates.difference(
+                        prev_templates)
+            self.environment.piecrust_cache[key] = (
+                    rv, used_delta, templates_delta)
             return rv
 
+    def _addUsed(self, rdr_pass, entry):
+        rdr_pass.used_source_names.update(entry[1])
+        for t in entry[2]:
+            rdr_pass.addUsedTemplate(t)
+
 
 class PieCrustSpacelessExtension(HtmlCompressor):
     """ A re-implementation of `SelectiveHtmlCompressor` so that we can
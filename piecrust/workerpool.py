@@ -5,7 +5,7 @@ import logging
 import itertools
 import threading
 import multiprocessing
-from piecrust.fastpickle import pickle, unpickle
+from piecrust.fastpickle import get_codec
 
 
 logger = logging.getLogger(__name__)
@@ -25,6 +25,7 @@ class IWorker(object):
 TASK_JOB = 0
 TASK_BATCH = 1
 TASK_END = 2
+TASK_BROADCAST = 3
 
 
 def worker_func(params):
@@ -92,6 +93,21 @@ def _real_worker_func(params):
             put(rep)
             break
 
+        if task_type == TASK_BROADCAST:
+            try:
+                res = (task_type, True, wid, w.process(task_data))
+            except Exception as e:
+                if params.wrap_exception:
+                    e = multiprocessing.ExceptionWithTraceback(
+                            e, e.__traceback__)
+                res = (task_type, False, wid, (task_data, e))
+            put(res)
+
+            # Wait for all the other workers to get their own copy of this
+            # job, so we don't pick up another one.
+            params.barrier.wait()
+            continue
+
         if task_type == TASK_JOB:
             task_data = (task_data,)
 
@@ -102,7 +118,7 @@ def _real_worker_func(params):
                 if params.wrap_exception:
                     e = multiprocessing.ExceptionWithTraceback(
                             e, e.__traceback__)
-                res = (TASK_JOB, False, wid, e)
+                res = (TASK_JOB, False, wid, (t, e))
             put(res)
 
             completed += 1
@@ -111,11 +127,12 @@ def _real_worker_func(params):
 
 
 class _WorkerParams(object):
-    def __init__(self, wid, inqueue, outqueue, worker_class, initargs=(),
-                 wrap_exception=False, is_profiling=False):
+    def __init__(self, wid, inqueue, outqueue, barrier, worker_class,
+                 initargs=(), wrap_exception=False, is_profiling=False):
         self.wid = wid
         self.inqueue = inqueue
         self.outqueue = outqueue
+        self.barrier = barrier
         self.worker_class = worker_class
         self.initargs = initargs
         self.wrap_exception = wrap_exception
@@ -125,13 +142,14 @@ class _WorkerParams(object):
 class WorkerPool(object):
     def __init__(self, worker_class, initargs=(),
                  worker_count=None, batch_size=None,
-                 wrap_exception=False):
+                 wrap_exception=False, codec='binary',
+                 max_pending_jobs=None):
         worker_count = worker_count or os.cpu_count() or 1
 
         use_fastqueue = True
         if use_fastqueue:
-            self._task_queue = FastQueue()
-            self._result_queue = FastQueue()
+            self._task_queue = FastQueue(codec=codec)
+            self._result_queue = FastQueue(codec=codec)
             self._quick_put = self._task_queue.put
             self._quick_get = self._result_queue.get
         else:
@@ -141,6 +159,7 @@ class WorkerPool(object):
             self._quick_get = self._result_queue._reader.recv
 
         self._batch_size = batch_size
+        self._max_pending_jobs = max_pending_jobs or (8 * worker_count)
         self._callback = None
         self._error_callback = None
         self._listener = None
@@ -150,9 +169,10 @@ class WorkerPool(object):
                 'profile.py', 'cProfile.py']
 
         self._pool = []
+        self._barrier = multiprocessing.Barrier(worker_count)
         for i in range(worker_count):
             worker_params = _WorkerParams(
-                    i, self._task_queue, self._result_queue,
+                    i, self._task_queue, self._result_queue, self._barrier,
                     worker_class, initargs,
                     wrap_exception=wrap_exception,
                     is_profiling=is_profiling)
@@ -175,20 +195,25 @@ class WorkerPool(object):
         self._callback = callback
         self._error_callback = error_callback
 
-    def queueJobs(self, jobs, handler=None, chunk_size=None):
-        if self._closed:
-            raise Exception("This worker pool has been closed.")
-        if self._listener is not None:
-            raise Exception("A previous job queue has not finished yet.")
+    def queueJobs(self, jobs, handler=None, chunk_size=None, costs=None):
+        """ Queues the given jobs and returns an `AsyncResult` to wait on.
 
-        if any([not p.is_alive() for p in self._pool]):
-            raise Exception("Some workers have prematurely exited.")
+            If `jobs` doesn't have a length (like a generator), jobs are
+            pulled from it as the workers make room for them, instead of
+            all being created up-front. This call then only returns once
+            the last job has been queued, and `costs` can't be used -- the
+            jobs should be produced in the order they need to run.
+        """
+        if not hasattr(jobs, '__len__'):
+            if costs is not None:
+                raise Exception("Can't use job costs with lazy jobs.")
+            return self._queueLazyJobs(jobs, handler)
+
+        self._checkCanQueue()
 
         if handler is not None:
             self.setHandler(handler)
 
-        if not hasattr(jobs, '__len__'):
-            jobs = list(jobs)
         job_count = len(jobs)
 
         res = AsyncResult(self, job_count)
@@ -197,14 +222,72 @@ class WorkerPool(object):
             return res
 
         self._listener = res
+        self._putJobs(jobs, chunk_size, costs)
+        return res
+
+    def openJobStream(self, handler=None, error_handler=None):
+        """ Returns a `JobStream` to which jobs can be added over time,
+            for instance when the results of earlier jobs come in.
+
+            `error_handler` is called with the job that failed and the
+            exception it raised.
+        """
+        self._checkCanQueue()
+        self.setHandler(handler, error_handler)
+
+        res = JobStream(self)
+        self._listener = res
+        return res
 
+    def broadcastJob(self, job, handler=None):
+        """ Runs the given job once on each worker, and returns an
+            `AsyncResult` to wait on.
+        """
+        self._checkCanQueue()
+
+        if handler is not None:
+            self.setHandler(handler)
+
+        res = AsyncResult(self, len(self._pool))
+        self._listener = res
+        for w in self._pool:
+            self._quick_put((TASK_BROADCAST, job))
+        return res
+
+    def _queueLazyJobs(self, jobs, handler):
+        res = self.openJobStream(handler)
+        res.max_pending = self._max_pending_jobs
+        try:
+            for job in jobs:
+                res.addJobs([job])
+        finally:
+            res.close()
+        return res
+
+    def _checkCanQueue(self):
+        if self._closed:
+            raise Exception("This worker pool has been closed.")
+        if self._listener is not None:
+            raise Exception("A previous job queue has not finished yet.")
+
+        if any([not p.is_alive() for p in self._pool]):
+            raise Exception("Some workers have prematurely exited.")
+
+    def _putJobs(self, jobs, chunk_size=None, costs=None):
         if chunk_size is None:
             chunk_size = self._batch_size
         if chunk_size is None:
-            chunk_size = max(1, job_count // 50)
-            logger.debug("Using chunk size of %d" % chunk_size)
-
-        if chunk_size is None or chunk_size == 1:
+            # Hand out big batches first, and then smaller and smaller ones
+            # as we run out of jobs, so that all the workers finish around
+            # the same time.
+            batches = make_guided_batches(jobs, len(self._pool), costs)
+            logger.debug("Using %d guided batches" % len(batches))
+            for batch in batches:
+                if len(batch) == 1:
+                    self._quick_put((TASK_JOB, batch[0]))
+                else:
+                    self._quick_put((TASK_BATCH, batch))
+        elif chunk_size == 1:
             for job in jobs:
                 self._quick_put((TASK_JOB, job))
         else:
@@ -215,8 +298,6 @@ class WorkerPool(object):
                     break
                 self._quick_put((TASK_BATCH, batch))
 
-        return res
-
     def close(self):
         if self._listener is not None:
             raise Exception("A previous job queue has not finished yet.")
@@ -264,15 +345,71 @@ class WorkerPool(object):
                 elif not success:
                     if pool._error_callback:
                         pool._error_callback(data)
+                    elif task_type in (TASK_JOB, TASK_BROADCAST):
+                        logger.error(data[1])
                     else:
                         logger.error(data)
             except Exception as ex:
                 logger.exception(ex)
 
-            if task_type == TASK_JOB:
+            if task_type in (TASK_JOB, TASK_BROADCAST):
                 pool._listener._onTaskDone()
 
 
+def make_guided_batches(jobs, worker_count, costs=None):
+    """ Splits the given jobs into batches that get smaller and smaller,
+        each one being worth about half of the remaining work divided by
+        the number of workers.
+
+        If `costs` is given, it should have one value per job (or `None`
+        when the cost of a job is unknown), and the most expensive jobs
+        will be scheduled first.
+    """
+    jobs = list(jobs)
+    if costs is None:
+        costs = [1] * len(jobs)
+    else:
+        jobs, costs = order_by_cost(jobs, costs)
+
+    divisor = 2 * max(1, worker_count)
+    remaining = sum(costs)
+    target = remaining / divisor
+
+    batches = []
+    cur_batch = []
+    cur_cost = 0
+    for job, cost in zip(jobs, costs):
+        cur_batch.append(job)
+        cur_cost += cost
+        if cur_cost >= target:
+            batches.append(tuple(cur_batch))
+            remaining -= cur_cost
+            target = remaining / divisor
+            cur_batch = []
+            cur_cost = 0
+    if cur_batch:
+        batches.append(tuple(cur_batch))
+    return batches
+
+
+def order_by_cost(items, costs):
+    """ Sorts the given items from the most to the least expensive, and
+        returns them along with their sorted costs. Unknown (`None`) costs
+        are replaced by the average of the known ones.
+    """
+    if len(costs) != len(items):
+        raise Exception("Got %d job costs for %d jobs." %
+                        (len(costs), len(items)))
+    known_costs = [c for c in costs if c is not None]
+    default_cost = 1
+    if known_costs:
+        default_cost = sum(known_costs) / len(known_costs)
+    costs = [c if c is not None else default_cost for c in costs]
+    order = sorted(range(len(items)), key=lambda i: costs[i],
+                   reverse=True)
+    return [items[i] for i in order], [costs[i] for i in order]
+
+
 class AsyncResult(object):
     def __init__(self, pool, count):
         self._pool = pool
@@ -288,9 +425,65 @@ class AsyncResult(object):
     def _onTaskDone(self):
         self._count -= 1
         if self._count == 0:
-            self._pool.setHandler(None)
-            self._pool._listener = None
-            self._event.set()
+            self._finish()
+
+    def _finish(self):
+        self._pool.setHandler(None)
+        self._pool._listener = None
+        self._event.set()
+
+
+class JobStream(AsyncResult):
+    """ A job queue that stays open until `close` is called, so that more
+        jobs can be added with `addJobs` while the previous ones are still
+        running. `wait` returns once the stream is closed and all its jobs
+        are done.
+
+        If `max_pending` is set, `addJobs` blocks until there are fewer
+        than that many jobs queued or running.
+    """
+    def __init__(self, pool):
+        super(JobStream, self).__init__(pool, 0)
+        self.max_pending = None
+        self._lock = threading.Condition()
+        self._is_closed = False
+
+    def addJobs(self, jobs, costs=None):
+        if self._is_closed:
+            raise Exception("This job stream has been closed.")
+        jobs = list(jobs)
+        if not jobs:
+            return
+
+        if self.max_pending is None:
+            with self._lock:
+                self._count += len(jobs)
+            self._pool._putJobs(jobs, costs=costs)
+            return
+
+        if costs is not None:
+            jobs, costs = order_by_cost(jobs, costs)
+        for job in jobs:
+            with self._lock:
+                while self._count >= self.max_pending:
+                    self._lock.wait()
+                self._count += 1
+            self._pool._quick_put((TASK_JOB, job))
+
+    def close(self):
+        with self._lock:
+            self._is_closed = True
+            is_done = (self._count == 0)
+        if is_done:
+            self._finish()
+
+    def _onTaskDone(self):
+        with self._lock:
+            self._count -= 1
+            is_done = (self._is_closed and self._count == 0)
+            self._lock.notify()
+        if is_done:
+            self._finish()
 
 
 class _ReportHandler(object):
@@ -322,19 +515,22 @@ class _ReportHandler(object):
 
 
 class FastQueue(object):
-    def __init__(self, compress=False):
+    def __init__(self, compress=False, codec='binary'):
         self._reader, self._writer = multiprocessing.Pipe(duplex=False)
         self._rlock = multiprocessing.Lock()
         self._wlock = multiprocessing.Lock()
         self._compress = compress
+        self._codec = codec
+        self._pickle, self._unpickle = get_codec(codec)
 
     def __getstate__(self):
         return (self._reader, self._writer, self._rlock, self._wlock,
-                self._compress)
+                self._compress, self._codec)
 
     def __setstate__(self, state):
         (self._reader, self._writer, self._rlock, self._wlock,
-            self._compress) = state
+            self._compress, self._codec) = state
+        self._pickle, self._unpickle = get_codec(self._codec)
 
     def get(self):
         with self._rlock:
@@ -343,11 +539,11 @@ class FastQueue(object):
             data = zlib.decompress(raw)
         else:
             data = raw
-        obj = unpickle(data)
+        obj = self._unpickle(data)
         return obj
 
     def put(self, obj):
-        data = pickle(obj)
+        data = self._pickle(obj)
         if self._compress:
             raw = zlib.compress(data)
         else:
@@ -5,6 +5,7 @@ import pytest
 from piecrust.baking.baker import Baker
 from piecrust.baking.single import PageBaker
 from piecrust.baking.records import BakeRecord
+from piecrust.processing.base import Processor
 from .mockutil import get_mock_app, mock_fs, mock_fs_scope
 
 
@@ -100,3 +101,289 @@ def test_record_version_change():
         finally:
             BakeRecord.RECORD_VERSION -= 1
 
+
+
+def test_bake_with_assets():
+    from piecrust.processing.pipeline import ProcessorPipeline
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'layout': 'none', 'format': 'none'}, 'a foo page')
+            .withPage('pages/_index.md', {'layout': 'none', 'format': 'none'}, "something")
+            .withAsset('assets/something.txt', 'some text'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        pipeline = ProcessorPipeline(app, out_dir)
+        pipeline.enabled_processors = ['copy']
+        baker = Baker(app, out_dir, processor_pipeline=pipeline)
+        record = baker.bake()
+        assert record.success
+        assert baker.processor_record.success
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure == {
+                'foo.html': 'a foo page',
+                'index.html': 'something',
+                'something.txt': 'some text'}
+
+
+def test_bake_modified_template():
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'layout': 'foo', 'format': 'none'}, 'FOO')
+            .withPage('pages/bar.md', {'layout': 'bar', 'format': 'none'}, 'BAR')
+            .withFile('kitchen/templates/foo.html', 'foo: {{content}}')
+            .withFile('kitchen/templates/bar.html', 'bar: {{content}}'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        baker = Baker(app, out_dir)
+        baker.bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['foo.html'] == 'foo: FOO'
+        assert structure['bar.html'] == 'bar: BAR'
+        foo_mtime = os.path.getmtime(fs.path('kitchen/_counter/foo.html'))
+        time.sleep(1)
+
+        with open(fs.path('kitchen/templates/bar.html'), 'w') as fp:
+            fp.write('new bar: {{content}}')
+        app = fs.getApp()
+        baker = Baker(app, out_dir)
+        baker.bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['foo.html'] == 'foo: FOO'
+        assert structure['bar.html'] == 'new bar: BAR'
+        assert foo_mtime == os.path.getmtime(
+                fs.path('kitchen/_counter/foo.html'))
+
+
+class _PipelineEndProcessor(Processor):
+    PROCESSOR_NAME = 'pipeline_end'
+
+    def onPipelineEnd(self, ctx):
+        with open(os.path.join(ctx.out_dir, 'ends.txt'), 'a') as fp:
+            if ctx.is_pipeline_process:
+                fp.write('main\n')
+            else:
+                fp.write('worker\n')
+
+
+def test_bake_with_assets_pipeline_end_order():
+    from piecrust.processing.pipeline import ProcessorPipeline
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'layout': 'none', 'format': 'none'}, 'a foo page')
+            .withAsset('assets/something.txt', 'some text'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        app.config.set('baker/workers', 2)
+        pipeline = ProcessorPipeline(app, out_dir)
+        pipeline.enabled_processors = ['copy']
+        pipeline.additional_processors_factories = [_PipelineEndProcessor]
+        baker = Baker(app, out_dir, processor_pipeline=pipeline)
+        baker.bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['ends.txt'] == 'worker\nworker\nmain\n'
+
+
+def test_bake_with_content_hash_change_detection(tmpdir, monkeypatch):
+    import piecrust.page
+    from piecrust.baking.worker import RenderFirstSubJobHandler
+    from piecrust.processing.pipeline import ProcessorPipeline
+
+    # The workers are forked from this process, so they log their work
+    # to a file.
+    calls_path = str(tmpdir.join('calls.txt'))
+
+    def _log_calls(name, func):
+        def _wrapper(*args, **kwargs):
+            with open(calls_path, 'a') as fp:
+                fp.write(name + '\n')
+            return func(*args, **kwargs)
+        return _wrapper
+
+    def _get_calls():
+        if not os.path.isfile(calls_path):
+            return []
+        with open(calls_path, 'r') as fp:
+            calls = fp.read().split()
+        os.remove(calls_path)
+        return calls
+
+    monkeypatch.setattr(
+            piecrust.page, 'parse_config_header',
+            _log_calls('load', piecrust.page.parse_config_header))
+    monkeypatch.setattr(
+            piecrust.page, 'parse_segments',
+            _log_calls('load_segments', piecrust.page.parse_segments))
+    monkeypatch.setattr(
+            RenderFirstSubJobHandler, 'handleJob',
+            _log_calls('render_first', RenderFirstSubJobHandler.handleJob))
+
+    fs = (mock_fs()
+            .withConfig({'baker': {'change_detection': 'hash'}})
+            .withPage('pages/foo.md', {'layout': 'none', 'format': 'none'}, 'FOO')
+            .withPage('pages/_index.md', {'layout': 'none', 'format': 'none'}, "something")
+            .withAsset('assets/something.txt', 'some text'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        pipeline = ProcessorPipeline(app, out_dir)
+        pipeline.enabled_processors = ['copy']
+        baker = Baker(app, out_dir, processor_pipeline=pipeline)
+        baker.bake()
+        assert 'render_first' in _get_calls()
+        txt_mtime = os.path.getmtime(
+                fs.path('kitchen/_counter/something.txt'))
+        time.sleep(1)
+
+        # Touch the files without changing them. Nothing should get
+        # loaded or rendered again.
+        os.utime(fs.path('kitchen/pages/foo.md'))
+        os.utime(fs.path('kitchen/assets/something.txt'))
+        app = fs.getApp()
+        pipeline = ProcessorPipeline(app, out_dir)
+        pipeline.enabled_processors = ['copy']
+        baker = Baker(app, out_dir, processor_pipeline=pipeline)
+        record = baker.bake()
+        assert _get_calls() == []
+        assert not any([e.was_any_sub_baked for e in record.entries])
+        assert txt_mtime == os.path.getmtime(
+                fs.path('kitchen/_counter/something.txt'))
+
+        # Now actually change them.
+        with open(fs.path('kitchen/pages/foo.md'), 'w') as fp:
+            fp.write("---\nlayout: none\nformat: none\n---\nNEW FOO")
+        with open(fs.path('kitchen/assets/something.txt'), 'w') as fp:
+            fp.write('new text')
+        app = fs.getApp()
+        pipeline = ProcessorPipeline(app, out_dir)
+        pipeline.enabled_processors = ['copy']
+        baker = Baker(app, out_dir, processor_pipeline=pipeline)
+        baker.bake()
+        assert sorted(set(_get_calls())) == [
+                'load', 'load_segments', 'render_first']
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['foo.html'] == 'NEW FOO'
+        assert structure['something.txt'] == 'new text'
+
+
+def test_bake_theme_page_overriden():
+    fs = (mock_fs()
+            .withPage('pages/_index.md', {'layout': 'none', 'format': 'none'}, 'USER INDEX'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        baker = Baker(app, out_dir)
+        record = baker.bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == 'USER INDEX'
+        overriden = [e for e in record.entries if e.was_overriden]
+        assert len(overriden) == 1
+        assert overriden[0].source_name == 'theme_pages'
+        assert not os.path.exists(baker._override_index_path)
+
+
+def test_bake_timers_show_counters(caplog):
+    import logging
+    from piecrust.commands.builtin.baking import _merge_timers, _show_timers
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'layout': 'foo', 'format': 'none'}, 'FOO')
+            .withFile('kitchen/templates/foo.html', 'foo: {{content}}'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        baker = Baker(app, out_dir)
+        record = baker.bake()
+        assert record.success
+
+        timers = {}
+        _merge_timers(record.timers, timers)
+        assert timers['JinjaBytecodeCacheMiss'] > 0
+
+        with caplog.at_level(logging.INFO):
+            _show_timers(timers)
+        assert 'JinjaBytecodeCacheMiss' in caplog.text
+        assert 'JinjaBytecodeCacheHit' in caplog.text
+
+
+def test_bake_job_reports_routing_errors():
+    from piecrust.baking.worker import (
+            BakeWorkerContext, BakeJobHandler, save_factory)
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'layout': 'none', 'format': 'none'}, 'a foo page'))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        ctx = BakeWorkerContext(fs.path('kitchen'), None,
+                                fs.path('kitchen/_counter'))
+        ctx.app = app
+        handler = BakeJobHandler(ctx)
+
+        def _no_route(*args, **kwargs):
+            raise Exception("No route here.")
+
+        app.getRoute = _no_route
+        fac = list(app.getSource('pages').getPageFactories())[0]
+        result = handler.handleJob({
+                'factory_info': save_factory(fac),
+                'taxonomy_info': None,
+                'dirty_source_names': set(),
+                'override_index': 0})
+        assert result['errors'] == ["No route here."]
+        assert result['sub_entries'] == []
+
+
+def test_bake_job_crash(monkeypatch):
+    from piecrust.baking.worker import RenderFirstSubJobHandler
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'layout': 'none', 'format': 'none'}, 'a foo page')
+            .withPage('pages/bar.md', {'layout': 'none', 'format': 'none'}, 'a bar page'))
+    with mock_fs_scope(fs):
+        # The workers are forked from this process, so they get this too.
+        orig_handle_job = RenderFirstSubJobHandler.handleJob
+
+        def _handle_job(self, job):
+            if job['rel_path'] == 'foo.md':
+                raise Exception("Worker crashed.")
+            return orig_handle_job(self, job)
+
+        monkeypatch.setattr(RenderFirstSubJobHandler, 'handleJob',
+                            _handle_job)
+
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        app.config.set('baker/workers', 1)
+        baker = Baker(app, out_dir)
+        record = baker.bake()
+        assert not record.success
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['bar.html'] == 'a bar page'
+        assert 'foo.html' not in structure
+
+        entry = [e for e in record.entries
+                 if e.path == fs.path('kitchen/pages/foo.md')][0]
+        assert entry.errors == ["Worker crashed."]
+
+
+def test_bake_modified_template_in_listed_page():
+    fs = (mock_fs()
+            .withPage('posts/2015-03-01_post1.md', {'layout': 'none', 'format': 'none'},
+                      "{% include 'snippet.html' %}")
+            .withPage('pages/_index.md', {'layout': 'none', 'format': 'none'},
+                      "{% for p in pagination.posts %}{{p.content}}{% endfor %}")
+            .withFile('kitchen/templates/snippet.html', 'SNIPPET-V1'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('kitchen/_counter')
+        app = fs.getApp()
+        baker = Baker(app, out_dir)
+        baker.bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == 'SNIPPET-V1'
+        assert structure['2015']['03']['01']['post1.html'] == 'SNIPPET-V1'
+        time.sleep(1)
+
+        with open(fs.path('kitchen/templates/snippet.html'), 'w') as fp:
+            fp.write('SNIPPET-V2')
+        app = fs.getApp()
+        baker = Baker(app, out_dir)
+        baker.bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == 'SNIPPET-V2'
+        assert structure['2015']['03']['01']['post1.html'] == 'SNIPPET-V2'
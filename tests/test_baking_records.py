@@ -0,0 +1,100 @@
+import os
+import sys
+import os.path
+import subprocess
+from piecrust.baking.records import (
+        BakeRecord, BakeRecordEntry, BakeRecordIndex, SubPageBakeInfo,
+        TaxonomyInfo, _get_transition_key)
+from .mockutil import mock_fs, mock_fs_scope
+
+
+def _make_record():
+    record = BakeRecord()
+    record.out_dir = '/out'
+    for i in range(3):
+        e = BakeRecordEntry('pages', '/pages/%d.md' % i)
+        e.subs.append(SubPageBakeInfo('/%d' % i, '/out/%d.html' % i))
+        record.addEntry(e)
+    e = BakeRecordEntry('posts', '/pages/_tag.md',
+                        TaxonomyInfo('tags', 'posts', 'foo'))
+    record.addEntry(e)
+    return record
+
+
+def test_save_and_load_record():
+    fs = mock_fs()
+    with mock_fs_scope(fs):
+        path = os.path.join(fs.path('kitchen/_cache'), 'test.record')
+        _make_record().save(path)
+
+        record = BakeRecord.load(path)
+        assert record.out_dir == '/out'
+        assert [e.path for e in record.entries] == [
+                '/pages/0.md', '/pages/1.md', '/pages/2.md', '/pages/_tag.md']
+        assert record.entries[1].subs[0].out_uri == '/1'
+        assert record.entries[3].taxonomy_info.term == 'foo'
+
+        record.entries.pop(0)
+        record.entries[0].subs[0].out_uri = '/one'
+        record.save(path)
+
+        record = BakeRecord.load(path)
+        assert [e.path for e in record.entries] == [
+                '/pages/1.md', '/pages/2.md', '/pages/_tag.md']
+        assert record.entries[0].subs[0].out_uri == '/one'
+
+
+def test_record_index():
+    fs = mock_fs()
+    with mock_fs_scope(fs):
+        path = os.path.join(fs.path('kitchen/_cache'), 'test.record')
+        _make_record().save(path)
+
+        index = BakeRecordIndex(path)
+        try:
+            e = index.get(_get_transition_key('/pages/2.md'))
+            assert e.subs[0].out_path == '/out/2.html'
+            e = index.get(_get_transition_key(
+                '/pages/_tag.md', TaxonomyInfo('tags', 'posts', 'foo')))
+            assert e.source_name == 'posts'
+            assert index.get(_get_transition_key('/pages/_tag.md')) is None
+        finally:
+            index.close()
+
+
+def test_replace_old_record_file():
+    fs = mock_fs()
+    with mock_fs_scope(fs):
+        path = os.path.join(fs.path('kitchen/_cache'), 'test.record')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fp:
+            fp.write(b'not a database, just an old pickled record')
+
+        _make_record().save(path)
+        record = BakeRecord.load(path)
+        assert len(record.entries) == 4
+
+
+def test_entry_digest_is_stable():
+    # The digests must not depend on the order of sets, which changes
+    # with the hash seed of each process.
+    code = (
+        "from piecrust.baking.records import *\n"
+        "from piecrust.baking.records import _get_entry_digest\n"
+        "from piecrust.rendering import RenderPassInfo\n"
+        "e = BakeRecordEntry('pages', '/pages/foo.md')\n"
+        "sub = SubPageBakeInfo('/foo', '/out/foo.html')\n"
+        "rpi = RenderPassInfo()\n"
+        "rpi.used_source_names = set('source%d' % i for i in range(20))\n"
+        "rpi.used_templates = set('tpl%d.html' % i for i in range(20))\n"
+        "sub.render_info = {0: rpi}\n"
+        "e.subs.append(sub)\n"
+        "print(_get_entry_digest(e))\n")
+    root_dir = os.path.dirname(os.path.dirname(__file__))
+    digests = set()
+    for seed in ['1', '2', '3']:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        out = subprocess.check_output([sys.executable, '-c', code],
+                                      cwd=root_dir, env=env)
+        digests.add(out.strip())
+    assert len(digests) == 1
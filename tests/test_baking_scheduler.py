@@ -0,0 +1,115 @@
+import pytest
+from piecrust.baking.scheduler import BakeScheduler, WaitFor
+
+
+class _MockStream(object):
+    def __init__(self, pool):
+        self.pool = pool
+
+    def addJobs(self, jobs, costs=None):
+        self.pool.batches.append(list(jobs))
+        for job in jobs:
+            if job in self.pool.failing:
+                self.pool.error_handler((job, Exception("Failed: " + job)))
+            else:
+                self.pool.handler({'path': job})
+
+    def close(self):
+        pass
+
+    def wait(self):
+        pass
+
+
+class _MockPool(object):
+    def __init__(self):
+        self.batches = []
+        self.failing = []
+        self.handler = None
+        self.error_handler = None
+
+    def openJobStream(self, handler=None, error_handler=None):
+        self.handler = handler
+        self.error_handler = error_handler
+        return _MockStream(self)
+
+
+def _make_scheduler():
+    pool = _MockPool()
+    scheduler = BakeScheduler(pool, lambda res: res['path'], lambda job: job)
+    return pool, scheduler
+
+
+def _add_job(scheduler, name, deps=None, handled=None):
+    scheduler.addJob(name, lambda: name,
+                     lambda res: handled.append(res['path']),
+                     deps=deps, result_key=name)
+
+
+def test_scheduler_runs_jobs_when_ready():
+    pool, scheduler = _make_scheduler()
+    handled = []
+    _add_job(scheduler, 'load_a', handled=handled)
+    _add_job(scheduler, 'load_b', handled=handled)
+    _add_job(scheduler, 'bake_a', deps=['load_a', 'load_b'],
+             handled=handled)
+    _add_job(scheduler, 'bake_b', deps=['load_b'], handled=handled)
+    scheduler.run()
+    assert pool.batches[0] == ['load_a', 'load_b']
+    assert handled.index('bake_a') > handled.index('load_a')
+    assert handled.index('bake_a') > handled.index('load_b')
+    assert handled.index('bake_b') > handled.index('load_b')
+    assert len(handled) == 4
+
+
+def test_scheduler_skips_empty_jobs():
+    pool, scheduler = _make_scheduler()
+    handled = []
+    _add_job(scheduler, 'load_a', handled=handled)
+    scheduler.addJob('all_loaded', deps=['load_a'])
+    _add_job(scheduler, 'bake_a', deps=['all_loaded'], handled=handled)
+    scheduler.run()
+    assert handled == ['load_a', 'bake_a']
+    assert scheduler.isDone('all_loaded')
+
+
+def test_scheduler_wait_for():
+    pool, scheduler = _make_scheduler()
+    handled = []
+
+    def _make_bake_job():
+        if not scheduler.isDone('load_b'):
+            return WaitFor(['load_b'])
+        return 'bake_a'
+
+    _add_job(scheduler, 'load_a', handled=handled)
+    _add_job(scheduler, 'load_b', deps=['load_a'], handled=handled)
+    scheduler.addJob('bake_a', _make_bake_job,
+                     lambda res: handled.append(res['path']),
+                     deps=['load_a'], result_key='bake_a')
+    scheduler.run()
+    assert handled == ['load_a', 'load_b', 'bake_a']
+
+
+def test_scheduler_unknown_dependency():
+    pool, scheduler = _make_scheduler()
+    scheduler.addJob('bake_a', deps=['load_a'])
+    with pytest.raises(Exception):
+        scheduler.run()
+
+
+def test_scheduler_failed_job():
+    pool, scheduler = _make_scheduler()
+    pool.failing = ['load_a']
+    handled = []
+    errors = []
+    scheduler.addJob('load_a', lambda: 'load_a',
+                     lambda res: handled.append(res['path']),
+                     error_handler=lambda ex: errors.append(str(ex)),
+                     result_key='load_a')
+    _add_job(scheduler, 'load_b', handled=handled)
+    _add_job(scheduler, 'bake_a', deps=['load_a'], handled=handled)
+    scheduler.run()
+    assert errors == ["Failed: load_a"]
+    assert handled == ['load_b', 'bake_a']
+    assert scheduler.isDone('load_a')
@@ -0,0 +1,38 @@
+import os.path
+from piecrust.cache import ExtensibleCache, PackedCache
+from .mockutil import mock_fs, mock_fs_scope
+
+
+def test_packed_cache():
+    fs = mock_fs()
+    with mock_fs_scope(fs):
+        path = os.path.join(fs.path('kitchen'), 'test.db')
+        cache = PackedCache(path)
+        assert not cache.has('foo')
+        assert not cache.isValid('foo', 10)
+
+        cache.write('foo', 'FOO', 10)
+        assert cache.has('foo')
+        assert cache.isValid('foo', 10)
+        assert not cache.isValid('foo', 11)
+        assert cache.read('foo') == 'FOO'
+
+        # Another instance, like in another process, should see it too,
+        # and the first one should see what the second one writes.
+        other = PackedCache(path)
+        assert other.isValid('foo', 10)
+        assert other.read('foo') == 'FOO'
+        other.write('bar', 'BAR', 20)
+        assert cache.isValid('bar', 20)
+        assert cache.read('bar') == 'BAR'
+        other.close()
+        cache.close()
+
+
+def test_clear_packed_cache():
+    fs = mock_fs()
+    with mock_fs_scope(fs):
+        cache = ExtensibleCache(fs.path('kitchen/_cache'))
+        cache.getPackedCache('pages').write('foo', 'FOO', 10)
+        cache.clearCache('pages')
+        assert not cache.getPackedCache('pages').has('foo')
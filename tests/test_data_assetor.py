@@ -73,6 +73,27 @@ def test_multiple_assets_with_same_name():
             assetor['one']
 
 
+def test_assets_from_source_scan():
+    fs = (mock_fs()
+            .withPage('pages/foo/bar')
+            .withPage('pages/foo/baz')
+            .withPageAsset('pages/foo/bar', 'one.txt', 'one'))
+    with mock_fs_scope(fs):
+        app = fs.getApp(cache=False)
+        app.getSource('pages').getPageFactories()
+        index = app.env.asset_index
+        assert index.getAssets(fs.path('/kitchen/pages/foo/bar-assets')) == [
+                'one.txt']
+        assert index.getAssets(fs.path('/kitchen/pages/foo/baz-assets')) == []
+
+        # Asset folders the sources didn't see are listed when needed.
+        fs.withPageAsset('pages/other', 'two.txt', 'two')
+        assert index.getAssets(fs.path('/kitchen/pages/other-assets')) == []
+        index = fs.getApp(cache=False).env.asset_index
+        assert index.getAssets(fs.path('/kitchen/pages/other-assets')) == [
+                'two.txt']
+
+
 @pytest.mark.parametrize('url_format, pretty_urls, uri, expected', [
         ('%uri%', True, '/foo', '/foo/'),
         ('%uri%', True, '/foo.ext', '/foo.ext/'),
@@ -0,0 +1,39 @@
+import pytest
+from piecrust.data.filters import PaginationFilter, get_config_filter
+
+
+class _Item(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+_items = [
+        _Item(name='a', tags=['foo', 'bar'], cat='one'),
+        _Item(name='b', tags=['bar'], cat='two'),
+        _Item(name='c', tags='foo', cat='one'),
+        _Item(name='d', cat='three')]
+
+
+@pytest.mark.parametrize('config, expected', [
+        ({}, ['a', 'b', 'c', 'd']),
+        ({'has_tags': 'foo'}, ['a']),
+        ({'has_tags': ['foo', 'bar']}, ['a']),
+        ({'is_cat': 'one'}, ['a', 'c']),
+        ({'not': {'is_cat': 'one'}}, ['b', 'd']),
+        ({'or': [{'has_tags': 'bar'}, {'is_cat': 'three'}]},
+            ['a', 'b', 'd']),
+        ({'and': [{'has_tags': 'bar'}, {'is_cat': 'two'}]}, ['b'])
+        ])
+def test_filter(config, expected):
+    fil = PaginationFilter()
+    fil.addClausesFromConfig(config)
+    assert [i.name for i in _items if fil.pageMatches(i)] == expected
+
+
+def test_config_filter_is_cached():
+    fil = get_config_filter({'or': [{'has_tags': 'bar'}, {'is_cat': 'one'}]})
+    fil2 = get_config_filter({'or': [{'is_cat': 'one'}, {'has_tags': 'bar'}]})
+    assert fil is not fil2
+    fil3 = get_config_filter({'or': [{'has_tags': 'bar'}, {'is_cat': 'one'}]})
+    assert fil is fil3
+    assert [i.name for i in _items if fil3.pageMatches(i)] == ['a', 'b', 'c']
@@ -1,6 +1,7 @@
 import mock
 from piecrust.data.iterators import PageIterator
 from piecrust.page import Page, PageConfiguration
+from .mockutil import mock_fs, mock_fs_scope
 
 
 def test_skip():
@@ -86,3 +87,48 @@ def test_magic_filter():
     assert len(it) == 3
     assert list(it) == [TestItem(3), TestItem(3), TestItem(3)]
 
+
+
+def test_slice_shares_sequence():
+    items = [mock.MagicMock() for _ in range(12)]
+    cache = {}
+    it = PageIterator(items, offset=3, limit=4, sequence_cache=cache)
+    assert list(it) == items[3:7]
+    assert cache['sequence'].items == items
+
+    # Another iterator should re-use the cached items instead of listing
+    # its source again.
+    it = PageIterator([], current_page=items[8], offset=8, limit=4,
+                      sequence_cache=cache)
+    assert it.total_count == 12
+    assert list(it) == items[8:12]
+    assert it._pagination_slicer.prev_page is items[7]
+    assert it._pagination_slicer.next_page is items[9]
+
+
+def test_sorts_are_cached_on_source():
+    fs = (mock_fs()
+          .withPage('posts/2015-03-01_foo.md', {'title': 'Foo'})
+          .withPage('posts/2015-04-02_bar.md', {'title': 'Bar'})
+          .withPage('posts/2015-05-03_baz.md', {'title': 'Baz'}))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        source = app.getSource('posts')
+
+        it = PageIterator(source)
+        assert [p.title for p in it] == ['Baz', 'Bar', 'Foo']
+        assert len(source.sorted_items_cache) == 1
+        it = PageIterator(source)
+        it.limit(2)
+        assert [p.title for p in it] == ['Baz', 'Bar']
+        assert len(source.sorted_items_cache) == 1
+
+        it = PageIterator(source)
+        it.sort('title')
+        assert [p.title for p in it] == ['Bar', 'Baz', 'Foo']
+        assert len(source.sorted_items_cache) == 2
+        it = PageIterator(source)
+        it.is_title('Foo')
+        it.sort('title')
+        assert [p.title for p in it] == ['Foo']
+        assert len(source.sorted_items_cache) == 3
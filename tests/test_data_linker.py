@@ -97,3 +97,44 @@ def test_recursive_linker_iteration(fs_fac, page_path, expected):
             assert a.url == e[0]
             assert a.is_self == e[1]
 
+
+def test_linker_listings_are_shared():
+    fs = (mock_fs()
+          .withPage('pages/foo')
+          .withPage('pages/something')
+          .withPage('pages/something/else')
+          .withPage('pages/something/deeper/good'))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        src = app.getSource('pages')
+        assert [(d, n) for d, n, _ in src.listPath('')] == [
+                (False, 'foo'), (True, 'something'), (False, 'something')]
+        assert [(d, n) for d, n, _ in src.listPath('something')] == [
+                (True, 'deeper'), (False, 'else')]
+
+        linker = Linker(src, 'something', root_page_path='something/else.md')
+        assert [p.name for p in linker.pages] == ['else']
+        assert linker.parent.name == 'something'
+        assert sorted(src.listing_cache.keys()) == ['', 'something']
+
+        other = Linker(src, 'something/deeper',
+                       root_page_path='something/deeper/good.md')
+        assert [p.name for p in other.pages] == ['good']
+        assert (src.listing_cache['something'][1][2] is
+                src.getPageFactories()[2])
+
+
+def test_list_path_includes_directories_without_pages():
+    fs = (mock_fs()
+          .withPage('pages/foo')
+          .withFile('kitchen/pages/emptydir/.keep', '')
+          .withFile('kitchen/pages/emptydir/sub/.keep', '')
+          .withFile('kitchen/pages/.hidden/.keep', '')
+          .withFile('kitchen/pages/foo-assets/img.jpg', ''))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        src = app.getSource('pages')
+        assert [(d, n) for d, n, _ in src.listPath('')] == [
+                (True, 'emptydir'), (False, 'foo')]
+        assert [(d, n) for d, n, _ in src.listPath('emptydir')] == [
+                (True, 'sub')]
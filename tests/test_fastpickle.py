@@ -1,6 +1,6 @@
 import datetime
 import pytest
-from piecrust.fastpickle import pickle, unpickle
+from piecrust.fastpickle import pickle, unpickle, get_codec
 
 
 class Foo(object):
@@ -37,7 +37,9 @@ def test_pickle_unpickle(obj, expected):
     assert actual == expected
 
 
-def test_objects():
+@pytest.mark.parametrize('codec', ['json', 'binary'])
+def test_objects(codec):
+    pickle, unpickle = get_codec(codec)
     f = Foo('foo')
     f.bars.append(Bar(1))
     f.bars.append(Bar(2))
@@ -51,3 +53,36 @@ def test_objects():
     for i in range(2):
         assert f.bars[i].value == o.bars[i].value
 
+
+def test_binary_registered_classes():
+    from piecrust.baking.records import SubPageBakeInfo, TaxonomyInfo
+    from piecrust.rendering import RenderPassInfo
+    pickle, unpickle = get_codec('binary')
+
+    sub = SubPageBakeInfo('/foo', '/out/foo.html')
+    sub.render_info = {0: RenderPassInfo()}
+    sub.render_info[0].used_source_names.add('posts')
+    res = {'sub_entries': [sub],
+           'taxonomy_info': TaxonomyInfo('tags', 'posts', 'foo'),
+           'date': datetime.date(2015, 5, 21)}
+
+    data = pickle(res)
+    assert b'SubPageBakeInfo' not in data
+    actual = unpickle(data)
+    assert actual['date'] == datetime.date(2015, 5, 21)
+    assert actual['taxonomy_info'].term == 'foo'
+    assert actual['sub_entries'][0].out_uri == '/foo'
+    assert actual['sub_entries'][0].render_info[0].used_source_names == \
+        set(['posts'])
+
+
+def test_binary_codec_leaves_other_pickles_alone():
+    import pickle as stdpickle
+    from piecrust.baking.records import TaxonomyInfo
+    pickle, unpickle = get_codec('binary')
+    unpickle(pickle(TaxonomyInfo('tags', 'posts', 'foo')))
+
+    # Other pickles must still be readable by processes that never
+    # imported our codec.
+    data = stdpickle.dumps(datetime.date(2015, 5, 21), protocol=4)
+    assert b'datetime' in data
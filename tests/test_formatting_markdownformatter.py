@@ -0,0 +1,41 @@
+from mock import MagicMock
+from piecrust.formatting.markdownformatter import MarkdownFormatter
+from .mockutil import mock_fs, mock_fs_scope
+
+
+def _get_formatter(app):
+    for fmt in app.plugin_loader.getFormatters():
+        if isinstance(fmt, MarkdownFormatter):
+            fmt._ensureInitialized()
+            return fmt
+
+
+def test_formatted_text_is_cached():
+    fs = mock_fs()
+    with mock_fs_scope(fs):
+        fmt = _get_formatter(fs.getApp())
+        assert fmt.render('markdown', 'Some *text*') == (
+                '<p>Some <em>text</em></p>')
+        config_hash = fmt._config_hash
+
+        # Another app gets it from the cache.
+        fmt = _get_formatter(fs.getApp())
+        fmt._formatter = MagicMock()
+        assert fmt.render('markdown', 'Some *text*') == (
+                '<p>Some <em>text</em></p>')
+        assert not fmt._formatter.render.called
+
+        # Changing the formatter's configuration changes the cache keys.
+        fs.withConfig({'markdown': {'extensions': ['extra']}})
+        fmt = _get_formatter(fs.getApp())
+        assert fmt._config_hash != config_hash
+
+
+def test_cmark_falls_back_to_python_markdown():
+    fs = mock_fs().withConfig({'markdown': {'engine': 'cmark',
+                                            'extensions': ['extra']}})
+    with mock_fs_scope(fs):
+        fmt = _get_formatter(fs.getApp())
+        assert fmt._formatter.ENGINE_NAME == 'python-markdown'
+        assert fmt.render('markdown', 'Some *text*') == (
+                '<p>Some <em>text</em></p>')
@@ -1,5 +1,6 @@
 import pytest
-from piecrust.page import parse_segments
+from piecrust.page import parse_segments, get_segment_names
+from .mockutil import mock_fs, mock_fs_scope, get_simple_page
 
 
 
@@ -70,3 +71,57 @@ def test_parse_segments(text, expected):
                 assert actual[key].parts[i].content == part[0]
                 assert actual[key].parts[i].fmt == part[1]
 
+
+
+@pytest.mark.parametrize('text, expected', [
+        test_parse_segments_data1,
+        test_parse_segments_data2,
+        test_parse_segments_data3,
+        test_parse_segments_data4,
+        test_parse_segments_data5,
+        test_parse_segments_data6,
+    ])
+def test_get_segment_names(text, expected):
+    assert get_segment_names(text) == list(expected.keys())
+
+
+def test_load_page_config_without_content():
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'title': 'Foo'}, 'Some contents'))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        page = get_simple_page(app, 'foo.md')
+        assert page.config.get('title') == 'Foo'
+        assert page.config.get('segments') == ['content']
+        assert page._raw_content is None
+        assert page.raw_content['content'].parts[0].content == (
+                'Some contents')
+
+        # Load it again, from the cache this time.
+        app = fs.getApp()
+        page = get_simple_page(app, 'foo.md')
+        assert page.config.get('title') == 'Foo'
+        assert page._raw_content is None
+        assert page.raw_content['content'].parts[0].content == (
+                'Some contents')
+
+
+def test_load_page_formats_static_parts():
+    contents = ("Some *static* text\n"
+                "<--textile-->\n"
+                "Some {{foo}} text\n")
+    fs = (mock_fs()
+            .withPage('pages/foo.md', {'title': 'Foo'}, contents))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        page = get_simple_page(app, 'foo.md')
+        parts = page.raw_content['content'].parts
+        assert parts[0].formatted == '<p>Some <em>static</em> text</p>'
+        assert parts[1].formatted is None
+
+        # The formatted parts are cached too.
+        app = fs.getApp()
+        page = get_simple_page(app, 'foo.md')
+        parts = page.raw_content['content'].parts
+        assert parts[0].formatted == '<p>Some <em>static</em> text</p>'
+        assert parts[1].formatted is None
@@ -0,0 +1,108 @@
+import datetime
+from piecrust.sources.pageindex import load_page_index
+from .mockutil import mock_fs, mock_fs_scope
+
+
+def _get_fs():
+    return (mock_fs()
+            .withConfig({'site': {'indexed_settings': ['title']}})
+            .withPage('posts/2015-03-01_foo.md',
+                      {'title': 'Foo', 'tags': ['a', 'b']})
+            .withPage('posts/2015-04-02_bar.md',
+                      {'title': 'Bar', 'category': 'stuff', 'other': 1}))
+
+
+def test_page_index():
+    fs = _get_fs()
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        index = app.getSource('posts').getPageIndex()
+        assert index.setting_names == ['category', 'tags', 'title']
+        assert index.isIndexed('tags')
+        assert not index.isIndexed('other')
+
+        entries = sorted(index.entries, key=lambda e: e.rel_path)
+        assert [e.rel_path for e in entries] == [
+                '2015-03-01_foo.md', '2015-04-02_bar.md']
+        assert entries[0].datetime == datetime.datetime(2015, 3, 1)
+        assert entries[0].slug == 'foo'
+        assert entries[0].values == {'title': 'Foo', 'tags': ['a', 'b']}
+        assert entries[1].values == {'title': 'Bar', 'category': 'stuff'}
+        assert index.getEntry('2015-04-02_bar.md') is entries[1]
+
+        page = entries[1].buildPage()
+        assert page.rel_path == '2015-04-02_bar.md'
+        assert page.datetime == datetime.datetime(2015, 4, 2)
+
+
+def test_page_index_is_cached():
+    fs = _get_fs()
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        index = load_page_index(app.getSource('posts'))
+        assert len(index.entries) == 2
+
+        # A new app should get the index from the cache.
+        cache = app.cache.getPackedCache('pages')
+        assert cache.has('index:posts')
+        cache_time = cache.getCacheTime('index:posts')
+        app = fs.getApp()
+        index = load_page_index(app.getSource('posts'))
+        assert len(index.entries) == 2
+        cache = app.cache.getPackedCache('pages')
+        assert cache.getCacheTime('index:posts') == cache_time
+
+        # Adding a page invalidates the index.
+        fs.withPage('posts/2015-05-03_baz.md', {'title': 'Baz'})
+        app = fs.getApp()
+        index = load_page_index(app.getSource('posts'))
+        assert sorted([e.rel_path for e in index.entries]) == [
+                '2015-03-01_foo.md', '2015-04-02_bar.md',
+                '2015-05-03_baz.md']
+
+
+def test_page_index_taxonomy_terms():
+    fs = (mock_fs()
+          .withPage('posts/2015-03-01_foo.md', {'tags': ['Foo Bar', 'b']})
+          .withPage('posts/2015-04-02_bar.md', {'tags': ['b', 'c']})
+          .withPage('posts/2015-05-03_baz.md', {'tags': 'b',
+                                                'category': 'stuff'}))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        index = app.getSource('posts').getPageIndex()
+        tags = app.getTaxonomy('tags')
+
+        def _get_paths(term, slugifier=None):
+            return [e.rel_path for e in index.getTaxonomyTermEntries(
+                    tags, term, slugifier)]
+
+        assert _get_paths('b') == ['2015-04-02_bar.md', '2015-03-01_foo.md']
+        assert _get_paths('Foo Bar') == ['2015-03-01_foo.md']
+        assert _get_paths('foo-bar') == []
+        assert _get_paths('foo-bar', lambda t: t.lower().replace(' ', '-')) \
+            == ['2015-03-01_foo.md']
+        assert _get_paths(('b', 'c')) == ['2015-04-02_bar.md']
+        assert _get_paths(('b', 'nope')) == []
+
+        categories = app.getTaxonomy('categories')
+        entries = index.getTaxonomyTermEntries(categories, 'stuff')
+        assert [e.rel_path for e in entries] == ['2015-05-03_baz.md']
+
+
+def test_page_index_date_order():
+    fs = (mock_fs()
+          .withPage('posts/2015-04-02_bar.md')
+          .withPage('posts/2015-03-01_foo.md')
+          .withPage('posts/2015-05-03_baz.md')
+          .withPage('posts/2015-03-01_other.md'))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        index = app.getSource('posts').getPageIndex()
+        by_date = [index.rel_paths[p] for p in index.getDateOrder()]
+        assert by_date[0] in ['2015-03-01_foo.md', '2015-03-01_other.md']
+        assert by_date[2:] == ['2015-04-02_bar.md', '2015-05-03_baz.md']
+
+        reverse = [p.rel_path for p in index.getPagesByDate(reverse=True)]
+        assert reverse[:2] == ['2015-05-03_baz.md', '2015-04-02_bar.md']
+        assert index.getEntry('2015-05-03_baz.md').datetime == \
+            datetime.datetime(2015, 5, 3)
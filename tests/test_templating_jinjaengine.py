@@ -68,3 +68,48 @@ def test_partial():
         output = render_simple_page(page, route, route_metadata)
         assert output == expected
 
+
+
+def test_bytecode_cache():
+    layout = "{{content}}\nFor site: {{foo}}\n"
+    fs = (mock_fs()
+            .withConfig(app_config)
+            .withAsset('templates/blah.jinja', layout)
+            .withPage('pages/foo', config={'layout': 'blah'},
+                      contents="This is {{foo}}"))
+    with mock_fs_scope(fs, open_patches=open_patches):
+        route_metadata = {'slug': 'foo'}
+        app = fs.getApp()
+        page = get_simple_page(app, 'foo.md')
+        route = app.getRoute('pages', None)
+        output = render_simple_page(page, route, route_metadata)
+        assert output == "This is bar\nFor site: bar"
+        assert app.env._timers['JinjaBytecodeCacheHit'] == 0
+        assert app.env._timers['JinjaBytecodeCacheMiss'] == 2
+
+        # Another app for the same website re-uses the compiled layout.
+        # The page's contents come from the rendered segments cache.
+        app = fs.getApp()
+        page = get_simple_page(app, 'foo.md')
+        route = app.getRoute('pages', None)
+        output = render_simple_page(page, route, route_metadata)
+        assert output == "This is bar\nFor site: bar"
+        assert app.env._timers['JinjaBytecodeCacheHit'] == 1
+        assert app.env._timers['JinjaBytecodeCacheMiss'] == 0
+
+
+def test_identical_segment_parts_are_compiled_once():
+    fs = (mock_fs()
+            .withConfig(app_config)
+            .withPage('pages/foo', config=page_config,
+                      contents="This is {{foo}}")
+            .withPage('pages/bar', config=page_config,
+                      contents="This is {{foo}}"))
+    with mock_fs_scope(fs, open_patches=open_patches):
+        app = fs.getApp()
+        route = app.getRoute('pages', None)
+        for name in ['foo', 'bar']:
+            page = get_simple_page(app, name + '.md')
+            output = render_simple_page(page, route, {'slug': name})
+            assert output == "This is bar"
+        assert app.env._timers['JinjaBytecodeCacheMiss'] == 1
@@ -0,0 +1,91 @@
+import pytest
+from piecrust.workerpool import (
+        IWorker, WorkerPool, make_guided_batches, order_by_cost)
+
+
+def _flatten(batches):
+    return [j for b in batches for j in b]
+
+
+@pytest.mark.parametrize('job_count, worker_count', [
+        (0, 4),
+        (1, 4),
+        (10, 1),
+        (100, 4),
+        (1000, 8)
+        ])
+def test_guided_batches(job_count, worker_count):
+    jobs = list(range(job_count))
+    batches = make_guided_batches(jobs, worker_count)
+    assert _flatten(batches) == jobs
+    sizes = [len(b) for b in batches]
+    assert sizes == sorted(sizes, reverse=True)
+    if job_count > 0:
+        assert sizes[-1] == 1
+
+
+def test_guided_batches_with_costs():
+    jobs = ['a', 'b', 'c', 'd', 'e', 'f']
+    costs = [1, 10, None, 2, 50, 1]
+    batches = make_guided_batches(jobs, 2, costs)
+    assert batches[0] == ('e',)
+    assert _flatten(batches) == ['e', 'c', 'b', 'd', 'a', 'f']
+
+
+def test_guided_batches_wrong_costs():
+    with pytest.raises(Exception):
+        make_guided_batches(['a', 'b'], 2, [1])
+
+
+def test_order_by_cost():
+    items, costs = order_by_cost(['a', 'b', 'c'], [1, None, 5])
+    assert items == ['c', 'b', 'a']
+    assert costs == [5, 3, 1]
+
+
+class _DoublingWorker(IWorker):
+    def initialize(self):
+        pass
+
+    def process(self, job):
+        return job * 2
+
+
+def test_queue_lazy_jobs():
+    produced = []
+
+    def _make_jobs():
+        for i in range(50):
+            produced.append(i)
+            yield i
+
+    results = []
+    pool = WorkerPool(_DoublingWorker, worker_count=2, max_pending_jobs=4)
+    try:
+        ar = pool.queueJobs(_make_jobs(), handler=results.append)
+        ar.wait(10)
+        assert ar.ready()
+    finally:
+        pool.close()
+    assert len(produced) == 50
+    assert sorted(results) == [i * 2 for i in range(50)]
+
+
+class _WorkerIdWorker(IWorker):
+    def initialize(self):
+        pass
+
+    def process(self, job):
+        return (job, self.wid)
+
+
+def test_broadcast_job():
+    results = []
+    pool = WorkerPool(_WorkerIdWorker, worker_count=3)
+    try:
+        ar = pool.broadcastJob('foo', handler=results.append)
+        ar.wait(10)
+        assert ar.ready()
+    finally:
+        pool.close()
+    assert sorted(results) == [('foo', 0), ('foo', 1), ('foo', 2)]
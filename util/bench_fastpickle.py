@@ -0,0 +1,172 @@
+import os
+import os.path
+import sys
+import time
+import random
+import hashlib
+import datetime
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from piecrust.fastpickle import get_codec  # NOQA
+
+
+def generate_payloads(count):
+    from piecrust.baking.records import SubPageBakeInfo, TaxonomyInfo
+    from piecrust.processing.worker import ProcessingWorkerResult
+    from piecrust.rendering import RenderPassInfo
+
+    payloads = []
+    for i in range(count):
+        config = {
+                'title': 'Post number %d' % i,
+                'date': datetime.date(2015, 1 + i % 12, 1 + i % 28),
+                'time': datetime.time(i % 24, i % 60, 0),
+                'tags': ['tag%d' % (i % 30), 'tag%d' % (i % 7)],
+                'category': 'cat%d' % (i % 5),
+                'layout': 'post',
+                'format': 'markdown'}
+        payloads.append({
+                'source_name': 'posts',
+                'path': '/site/posts/2015-01-01_post-number-%d.md' % i,
+                'config': config,
+                'index_entry': (
+                    '2015-01-01_post-number-%d.md' % i,
+                    datetime.datetime(2015, 1 + i % 12, 1 + i % 28,
+                                      i % 24, i % 60, 0),
+                    'post-number-%d' % i,
+                    {'tags': config['tags'],
+                     'category': config['category']}),
+                'content_hash_info': None,
+                'errors': None})
+
+        payloads.append({
+                'type': 2,
+                'job': {
+                    'factory_info': {
+                        'source_name': 'posts',
+                        'rel_path': '2015-01-01_post-number-%d.md' % i,
+                        'metadata': {'year': 2015, 'month': 1, 'day': 1,
+                                     'slug': 'post-number-%d' % i}},
+                    'taxonomy_info': None,
+                    'dirty_source_names': set(['posts', 'pages']),
+                    'content_hash_info': None,
+                    'override_index': 0}})
+
+        sub = SubPageBakeInfo('/2015/01/01/post-number-%d' % i,
+                              '/site/_counter/2015/01/01/post-number-%d.html' %
+                              i)
+        sub.flags = SubPageBakeInfo.FLAG_BAKED
+        rpi = RenderPassInfo()
+        rpi.used_source_names = set(['posts'])
+        rpi.used_taxonomy_terms = set([('posts', 'tags', 'tag1')])
+        sub.render_info = {0: rpi, 1: rpi}
+        payloads.append({
+                'path': '/site/posts/2015-01-01_post-number-%d.md' % i,
+                'taxonomy_info': TaxonomyInfo('tags', 'posts', 'tag%d' % i),
+                'sub_entries': [sub],
+                'overriden_by': None,
+                'errors': None,
+                'duration': random.random()})
+
+        res = ProcessingWorkerResult('/site/assets/img/%d.png' % i)
+        res.rel_outputs = ['img/%d.png' % i]
+        res.proc_tree = ('copy', [])
+        payloads.append(res)
+    return payloads
+
+
+def load_site_payloads(root_dir):
+    from piecrust.app import PieCrust
+    from piecrust.baking.records import BakeRecord
+    from piecrust.baking.worker import save_factory
+
+    app = PieCrust(root_dir)
+    payloads = []
+    for source in app.sources:
+        for fac in source.getPageFactories():
+            page = fac.buildPage()
+            payloads.append({
+                    'source_name': fac.source.name,
+                    'path': fac.path,
+                    'config': page.config.getAll(),
+                    'errors': None})
+            payloads.append({'type': 0, 'job': save_factory(fac)})
+
+    # Use the last bake record for results, if there's one.
+    out_dir = os.path.join(root_dir, '_counter')
+    record_name = hashlib.md5(out_dir.encode('utf8')).hexdigest() + '.record'
+    record_cache = app.cache.getCache('baker')
+    if record_cache.has(record_name):
+        record = BakeRecord.load(record_cache.getCachePath(record_name))
+        for entry in record.entries:
+            payloads.append({
+                    'path': entry.path,
+                    'taxonomy_info': entry.taxonomy_info,
+                    'sub_entries': entry.subs,
+                    'overriden_by': None,
+                    'errors': None,
+                    'duration': entry.bake_duration})
+    return payloads
+
+
+def bench_codec(name, payloads, iterations):
+    pickle, unpickle = get_codec(name)
+    size = sum([len(pickle(p)) for p in payloads])
+
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        datas = [pickle(p) for p in payloads]
+    pickle_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        for d in datas:
+            unpickle(d)
+    unpickle_time = time.perf_counter() - start_time
+
+    return size, pickle_time, unpickle_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            prog='bench_fastpickle',
+            description=("Compares the worker pickling codecs on typical "
+                         "bake payloads."))
+    parser.add_argument(
+            'root_dir',
+            nargs='?',
+            help="A website to load payloads from. If there's a previous "
+                 "bake record for its `_counter` directory, the bake "
+                 "results will be taken from it. Without a website, "
+                 "placeholder payloads are generated.")
+    parser.add_argument(
+            '-c', '--count',
+            help="The number of placeholder pages to generate.",
+            type=int,
+            default=500)
+    parser.add_argument(
+            '-n', '--iterations',
+            help="The number of times to pickle and unpickle everything.",
+            type=int,
+            default=10)
+
+    result = parser.parse_args()
+
+    if result.root_dir:
+        payloads = load_site_payloads(result.root_dir)
+    else:
+        payloads = generate_payloads(result.count)
+    print("Benchmarking %d payloads, %d times..." % (
+            len(payloads), result.iterations))
+
+    for name in ['json', 'binary']:
+        size, pickle_time, unpickle_time = bench_codec(
+                name, payloads, result.iterations)
+        print("%-8s %10d bytes  pickle: %7.3fs  unpickle: %7.3fs" % (
+                name, size, pickle_time, unpickle_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import os
+import os.path
+import re
+import sys
+import time
+import glob
+import argparse
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from piecrust.configuration import header_regex  # NOQA
+from piecrust.formatting.markdownformatter import (  # NOQA
+        MARKDOWN_ENGINES, create_markdown_engine)
+
+
+def load_fixture_texts(bakes_dir):
+    """ Returns the Markdown contents of all the pages in the bake test
+        fixtures.
+    """
+    texts = []
+    for path in sorted(glob.glob(os.path.join(bakes_dir, '*.yaml'))):
+        with open(path, 'r', encoding='utf8') as fp:
+            for spec in yaml.load_all(fp, Loader=yaml.SafeLoader):
+                if spec:
+                    _add_texts(texts, spec.get('in'))
+    return texts
+
+
+def _add_texts(texts, entries):
+    if not entries:
+        return
+    for name, contents in entries.items():
+        if isinstance(contents, dict):
+            _add_texts(texts, contents)
+        elif name.endswith('.md') and isinstance(contents, str):
+            # Skip the page's configuration header, if any.
+            m = header_regex.match(contents)
+            texts.append(contents[m.end():] if m else contents)
+
+
+def _normalize(html):
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+def bench_engine(engine, texts, iterations):
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        outputs = [engine.render(t) for t in texts]
+    return outputs, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            prog='bench_markdown',
+            description=("Compares the Markdown engines' outputs and speed "
+                         "on the pages of the bake test fixtures."))
+    parser.add_argument(
+            'bakes_dir',
+            nargs='?',
+            help="The directory with the bake test fixtures.",
+            default=os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                 'tests', 'bakes'))
+    parser.add_argument(
+            '-n', '--iterations',
+            help="The number of times to format everything.",
+            type=int,
+            default=100)
+    parser.add_argument(
+            '-e', '--extensions',
+            help="The Markdown extensions to enable.",
+            nargs='*',
+            default=[])
+
+    result = parser.parse_args()
+
+    texts = load_fixture_texts(result.bakes_dir)
+    print("Benchmarking %d texts, %d times..." % (
+            len(texts), result.iterations))
+
+    reference = None
+    for name in MARKDOWN_ENGINES:
+        engine = create_markdown_engine(name, result.extensions, {})
+        if engine.ENGINE_NAME != name:
+            print("%-16s not installed, or doesn't support these "
+                  "extensions." % name)
+            continue
+
+        outputs, duration = bench_engine(engine, texts, result.iterations)
+        if reference is None:
+            reference = outputs
+        same = sum([1 for a, b in zip(reference, outputs)
+                    if _normalize(a) == _normalize(b)])
+        print("%-16s %7.3fs  same output: %d/%d" % (
+                name, duration, same, len(texts)))
+
+
+if __name__ == '__main__':
+    main()